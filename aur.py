@@ -0,0 +1,369 @@
+"""Параллельное обновление пакетов AUR.
+
+yay -Syu собирает пакеты AUR по одному. Здесь:
+- сторонние пакеты (как pacman -Qm) - установленные, которых нет ни в
+  одной базе репозиториев из /var/lib/pacman/sync;
+- сведения о них запрашиваются у AUR RPC пачками (multi-info), пачки
+  идут параллельно;
+- обновления группируются по PackageBase и упорядочиваются по
+  зависимостям: сборка ждет установки собранных в этом же плане пакетов,
+  от которых зависит;
+- зависимости замыкаются до сборки: недостающие пакеты репозиториев
+  ставятся заранее (pacman -S --asdeps), недостающие пакеты AUR
+  добавляются в план и ставятся как зависимости; makepkg --syncdeps
+  остается страховкой;
+- makepkg отказывается работать от root, поэтому если приложение
+  запущено через sudo или pkexec, загрузка и сборка идут от вызвавшего
+  пользователя (runuser);
+- независимые makepkg идут одновременно в пределах бюджета процессоров
+  и памяти, каждой сборке достается своя доля MAKEFLAGS=-jN;
+- исходники берутся из кэша yay (~/.cache/yay/<база>) и обновляются
+  git pull, поэтому yay и этот режим не качают их дважды.
+"""
+import json
+import os
+import urllib.parse
+import urllib.request
+
+import privileged
+from pkgdb import dep_name
+from scheduler import BUILD, NETWORK, PACMAN_DB, PKG_CACHE, Step
+from vercmp import vercmp
+
+AUR_RPC = "https://aur.archlinux.org/rpc/v5/info"
+AUR_GIT = "https://aur.archlinux.org"
+SYNC_DB_DIR = "/var/lib/pacman/sync"
+DEFAULT_TIMEOUT = 30
+# Длина адреса запроса multi-info и число одновременных запросов
+MAX_URL = 4000
+RPC_WORKERS = 4
+# Сколько памяти закладывать на одну сборку и минимум потоков make на нее
+MEM_PER_BUILD = 2 * 1024 ** 3
+MIN_JOBS = 2
+
+
+class AurError(Exception):
+    """AUR RPC вернул ошибку или план сборки невозможен"""
+
+
+class AurPackage:
+    """Пакет AUR по ответу RPC"""
+
+    __slots__ = ("name", "base", "version", "depends", "provides")
+
+    def __init__(self, name, base, version, depends, provides):
+        self.name = name
+        self.base = base
+        self.version = version
+        self.depends = depends
+        self.provides = provides
+
+    @classmethod
+    def from_rpc(cls, result):
+        depends = []
+        for key in ("Depends", "MakeDepends", "CheckDepends"):
+            depends.extend(dep_name(spec) for spec in result.get(key) or ())
+        return cls(
+            name=result["Name"],
+            base=result.get("PackageBase") or result["Name"],
+            version=result["Version"],
+            depends=depends,
+            provides=[dep_name(spec) for spec in result.get("Provides") or ()],
+        )
+
+
+class Build:
+    """Сборка одной PackageBase: какие установленные пакеты она обновляет"""
+
+    def __init__(self, base, version, packages, asdeps=False):
+        self.base = base
+        self.version = version
+        self.packages = packages
+        # Не обновление, а новая зависимость: ставится с --asdeps
+        self.asdeps = asdeps
+        # Базы из плана, которые надо собрать и установить раньше
+        self.after = set()
+        # Пакеты репозиториев, которые надо установить до сборки
+        self.repo_deps = set()
+
+
+def build_user():
+    """Пользователь для git и makepkg (pwd.struct_passwd) или None - текущий.
+
+    От root сборка идет от пользователя, получившего права через sudo
+    или pkexec; если его нет - AurError.
+    """
+    if os.geteuid() != 0:
+        return None
+    user = privileged.invoking_user()
+    if user is None:
+        raise AurError("makepkg не запускается от root: запустите программу от обычного пользователя")
+    return user
+
+
+def yay_cache_dir():
+    """Каталог сборок yay.
+
+    От root через sudo или pkexec "~" - домашний каталог root, поэтому
+    берется каталог вызвавшего пользователя (XDG_CACHE_HOME в этом
+    случае - переменная окружения root и не учитывается).
+    """
+    user = privileged.invoking_user()
+    if user is not None:
+        return os.path.join(user.pw_dir, ".cache", "yay")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "yay")
+
+
+def foreign_packages(installed, repos, cache, sync_dir=SYNC_DB_DIR):
+    """Установленные пакеты, которых нет в базах репозиториев.
+
+    cache - updates.SyncCache для разобранных баз. Возвращает
+    ({имя: pkgdb.Package}, {имя или provides: пакет репозитория},
+    [репозитории без файла базы]).
+    """
+    known = set()
+    provided = {}
+    missing = []
+    for repo in repos:
+        path = os.path.join(sync_dir, f"{repo}.db")
+        if not os.path.exists(path):
+            missing.append(repo)
+            continue
+        for name, package in cache.load(repo, path).items():
+            known.add(name)
+            # Первый репозиторий в pacman.conf главнее, как у pacman
+            for value in [name] + package.provides:
+                provided.setdefault(value, name)
+    foreign = {name: package for name, package in installed.items() if name not in known}
+    return foreign, provided, missing
+
+
+def _batches(names, rpc_url):
+    """Пачки имен, для которых адрес запроса не длиннее MAX_URL"""
+    batch, length = [], len(rpc_url) + 1
+    for name in names:
+        arg = len(urllib.parse.urlencode({"arg[]": name})) + 1
+        if batch and length + arg > MAX_URL:
+            yield batch
+            batch, length = [], len(rpc_url) + 1
+        batch.append(name)
+        length += arg
+    if batch:
+        yield batch
+
+
+def _query_batch(batch, rpc_url, timeout):
+    url = rpc_url + "?" + urllib.parse.urlencode([("arg[]", name) for name in batch])
+    request = urllib.request.Request(url, headers={"User-Agent": "manjaro_updater"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        data = json.loads(response.read().decode("utf-8"))
+    if data.get("type") == "error":
+        raise AurError(data.get("error") or "ошибка AUR RPC")
+    return [AurPackage.from_rpc(result) for result in data.get("results", [])]
+
+
+def query_info(names, rpc_url=AUR_RPC, timeout=DEFAULT_TIMEOUT, workers=RPC_WORKERS):
+    """Сведения AUR о пакетах names: {имя: AurPackage} (пакетов не из AUR в ответе нет)"""
+    from concurrent.futures import ThreadPoolExecutor
+    batches = list(_batches(sorted(names), rpc_url))
+    info = {}
+    if not batches:
+        return info
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        for packages in pool.map(lambda batch: _query_batch(batch, rpc_url, timeout), batches):
+            for package in packages:
+                info[package.name] = package
+    return info
+
+
+def plan_builds(foreign, info, ignored=(), installed=None, repo=None, query=query_info):
+    """Сборки обновлений в порядке зависимостей.
+
+    foreign - {имя: pkgdb.Package}, info - ответ query_info. Если задан
+    installed (имена и provides установленных пакетов, например
+    pkgdb.DependencyGraph.providers), план дополняется недостающими
+    зависимостями: пакеты из repo ({имя: пакет репозитория}) попадают в
+    Build.repo_deps, остальные ищутся в AUR функцией query. Зависимость,
+    которой нет нигде, - AurError. Возвращает
+    ([Build], [имена пакетов, которых нет в AUR]).
+    """
+    ignored = set(ignored)
+    info = dict(info)
+    builds = {}
+    for name, local in sorted(foreign.items()):
+        remote = info.get(name)
+        if remote is None or name in ignored or vercmp(remote.version, local.version) <= 0:
+            continue
+        build = builds.get(remote.base)
+        if build is None:
+            build = builds[remote.base] = Build(remote.base, remote.version, [])
+        build.packages.append(name)
+    if installed is not None:
+        _close_dependencies(builds, info, installed, repo or {}, query)
+    # Кто из плана что предоставляет
+    provider = {}
+    for package in info.values():
+        if package.base in builds:
+            for provided in [package.name] + package.provides:
+                provider.setdefault(provided, package.base)
+    for package in info.values():
+        build = builds.get(package.base)
+        if build is None:
+            continue
+        for dep in package.depends:
+            base = provider.get(dep)
+            if base is not None and base != build.base:
+                build.after.add(base)
+    unknown = sorted(name for name in foreign if name not in info)
+    return _ordered(builds), unknown
+
+
+def _close_dependencies(builds, info, installed, repo, query):
+    """Добавить в builds недостающие зависимости (info дополняется ответами AUR)"""
+    planned = set()
+    for package in info.values():
+        if package.base in builds:
+            planned.update([package.name] + package.provides)
+    pending = [package for package in info.values() if package.base in builds]
+    unresolved = set()
+    while pending:
+        wanted = {}
+        for package in pending:
+            for dep in package.depends:
+                if dep in installed or dep in planned:
+                    continue
+                if dep in repo:
+                    builds[package.base].repo_deps.add(repo[dep])
+                else:
+                    wanted.setdefault(dep, package.name)
+        found = query(sorted(wanted)) if wanted else {}
+        pending = []
+        for dep in sorted(wanted):
+            package = found.get(dep)
+            if package is None:
+                unresolved.add(f"{dep} (для {wanted[dep]})")
+                continue
+            info[package.name] = package
+            planned.update([package.name] + package.provides)
+            build = builds.get(package.base)
+            if build is None:
+                build = builds[package.base] = Build(package.base, package.version, [], asdeps=True)
+            build.packages.append(package.name)
+            pending.append(package)
+    if unresolved:
+        raise AurError("зависимости не найдены ни в репозиториях, ни в AUR: " + ", ".join(sorted(unresolved)))
+
+
+def _ordered(builds):
+    """Топологическая сортировка сборок; цикл - AurError"""
+    ordered, done, visiting = [], set(), set()
+
+    def visit(base, chain):
+        if base in done:
+            return
+        if base in visiting:
+            raise AurError("цикл зависимостей: " + " -> ".join(chain + [base]))
+        visiting.add(base)
+        for dep in sorted(builds[base].after):
+            visit(dep, chain + [base])
+        visiting.discard(base)
+        done.add(base)
+        ordered.append(builds[base])
+
+    for base in sorted(builds):
+        visit(base, [])
+    return ordered
+
+
+def mem_available():
+    """MemAvailable из /proc/meminfo в байтах или None"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def build_budget(count, cpus=None, memory=None):
+    """(сколько сборок одновременно, потоков make на сборку)"""
+    cpus = cpus or os.cpu_count() or 1
+    memory = mem_available() if memory is None else memory
+    parallel = max(1, cpus // MIN_JOBS)
+    if memory:
+        parallel = min(parallel, max(1, memory // MEM_PER_BUILD))
+    parallel = max(1, min(parallel, count))
+    return parallel, max(1, cpus // parallel)
+
+
+def fetch_command(base, directory, git_url=AUR_GIT, user=None):
+    """Обновить исходники в кэше yay или склонировать их"""
+    if os.path.isdir(os.path.join(directory, ".git")):
+        return privileged.as_user(["git", "-C", directory, "pull", "--ff-only"], user)
+    return privileged.as_user(["git", "clone", f"{git_url}/{base}.git", directory], user)
+
+
+def build_command(directory, jobs, user=None):
+    """makepkg в каталоге сборки; пакеты остаются там же (PKGDEST)"""
+    return privileged.as_user(["env", "-C", directory, f"PKGDEST={directory}", f"MAKEFLAGS=-j{jobs}",
+                               "makepkg", "-f", "--syncdeps", "--noconfirm"], user)
+
+
+def build_steps(builds, cache_dir, jobs, git_url=AUR_GIT, user=None):
+    """Шаги fetch/deps/build/install для StepScheduler.
+
+    user - от чьего имени загружать и собирать (build_user). Команда
+    install: без файлов - они известны только после сборки
+    (built_packages).
+    """
+    steps = []
+    for build in builds:
+        directory = os.path.join(cache_dir, build.base)
+        after = [f"fetch:{build.base}"] + [f"install:{dep}" for dep in sorted(build.after)]
+        steps.append(Step(f"fetch:{build.base}", fetch_command(build.base, directory, git_url, user),
+                          f"Загрузка исходников {build.base}"))
+        if build.repo_deps:
+            steps.append(Step(f"deps:{build.base}",
+                              ["sudo", "pacman", "-S", "--needed", "--asdeps", "--noconfirm"]
+                              + sorted(build.repo_deps),
+                              f"Зависимости {build.base} из репозиториев",
+                              resources={PACMAN_DB, PKG_CACHE, NETWORK}))
+            after.append(f"deps:{build.base}")
+        steps.append(Step(f"build:{build.base}", build_command(directory, jobs, user),
+                          f"Сборка {build.base} {build.version}", resources={BUILD}, after=after))
+        install = ["sudo", "pacman", "-U", "--noconfirm"] + (["--asdeps"] if build.asdeps else [])
+        steps.append(Step(f"install:{build.base}", install,
+                          f"Установка {', '.join(build.packages)}", resources={PACMAN_DB},
+                          after=[f"build:{build.base}"]))
+    return steps
+
+
+def built_packages(directory, names, since=0):
+    """Файлы пакетов names, собранные в directory не раньше since"""
+    from pkgcache import parse_filename
+    found = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            parsed = parse_filename(entry.name)
+            if parsed is None or parsed[0] not in names:
+                continue
+            mtime = entry.stat().st_mtime
+            # Пакет мог собраться в ту же секунду, что и начало сборки
+            if mtime + 1 < since:
+                continue
+            if parsed[0] not in found or mtime > found[parsed[0]][0]:
+                found[parsed[0]] = (mtime, entry.path)
+    return [path for _, path in sorted(found.values(), key=lambda item: item[1])]
+
+
+def format_build_times(times, wall):
+    """Строки отчета: время сборки каждой базы и выигрыш от параллельности"""
+    lines = [f"  {base:<40} {seconds:8.1f} с"
+             for base, seconds in sorted(times.items(), key=lambda item: -item[1])]
+    total = sum(times.values())
+    if wall > 0 and total:
+        lines.append(f"Сумма сборок: {total:.1f} с, заняло: {wall:.1f} с (x{total / wall:.1f})")
+    return lines
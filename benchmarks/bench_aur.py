@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Бенчмарк параллельного обновления AUR на локальной замене AUR.
+
+Поднимает HTTP-сервер с AUR RPC (info, multi-info) по заглушкам
+PKGBUILD, поддельный корень с локальной базой и базой core, заглушки
+git/makepkg/pacman, и выполняет yay_update в режиме aur_parallel с
+разным числом одновременных сборок. Каждый пятый пакет зависит от
+предыдущего, поэтому в плане есть и цепочки, и независимые сборки.
+
+    python3 benchmarks/bench_aur.py --packages 24 --parallel 1,4,0
+
+0 в --parallel - бюджет по умолчанию (процессоры и память).
+"""
+import argparse
+import functools
+import http.server
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_e2e import OutputMeter, install_stubs, write_desc  # noqa: E402
+
+TOOLS = ("pacman", "sudo", "git", "makepkg")
+REPO_PACKAGES = 50
+
+
+def build_fixture(path, count):
+    """Корень (локальная база, core.db, pacman.conf) и каталоги AUR с PKGBUILD.
+
+    Возвращает {имя: ответ RPC} для замены AUR.
+    """
+    local = os.path.join(path, "root/var/lib/pacman/local")
+    sync = os.path.join(path, "root/var/lib/pacman/sync")
+    aur_dir = os.path.join(path, "aur")
+    for directory in (local, sync, aur_dir, os.path.join(path, "root/etc")):
+        os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(path, "root/etc/pacman.conf"), "w") as f:
+        f.write("[options]\nArchitecture = auto\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n")
+
+    with tarfile.open(os.path.join(sync, "core.db"), "w:gz") as tar:
+        for i in range(REPO_PACKAGES):
+            name = f"repo-{i}"
+            os.makedirs(os.path.join(local, f"{name}-1.0-1"))
+            write_desc(os.path.join(local, f"{name}-1.0-1", "desc"),
+                       {"NAME": [name], "VERSION": ["1.0-1"], "REASON": [0], "SIZE": [4096]})
+            data = f"%NAME%\n{name}\n\n%VERSION%\n1.0-1\n\n".encode()
+            info = tarfile.TarInfo(f"{name}-1.0-1/desc")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    rpc = {}
+    for i in range(count):
+        name = f"aur-{i}"
+        depends = ["repo-0"] + ([f"aur-{i - 1}"] if i % 5 and i else [])
+        os.makedirs(os.path.join(local, f"{name}-1.0-1"))
+        write_desc(os.path.join(local, f"{name}-1.0-1", "desc"),
+                   {"NAME": [name], "VERSION": ["1.0-1"], "REASON": [0], "SIZE": [4096],
+                    "DEPENDS": depends})
+        base = os.path.join(aur_dir, f"{name}.git")
+        os.makedirs(base)
+        with open(os.path.join(base, "PKGBUILD"), "w") as f:
+            f.write(f"pkgname={name}\npkgver=1.1\npkgrel=1\n_buildtime={1 + i % 3}\n"
+                    f"depends=({' '.join(depends)})\n")
+        rpc[name] = {"Name": name, "PackageBase": name, "Version": "1.1-1", "Depends": depends}
+    # Пакет, которого нет в AUR
+    os.makedirs(os.path.join(local, "local-only-1.0-1"))
+    write_desc(os.path.join(local, "local-only-1.0-1", "desc"),
+               {"NAME": ["local-only"], "VERSION": ["1.0-1"], "REASON": [0], "SIZE": [4096]})
+    return rpc
+
+
+class RpcHandler(http.server.BaseHTTPRequestHandler):
+    """AUR RPC v5 info: ?arg[]=a&arg[]=b"""
+
+    packages = {}
+    requests = []
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        names = urllib.parse.parse_qs(url.query).get("arg[]", [])
+        self.requests.append(len(names))
+        results = [self.packages[name] for name in names if name in self.packages]
+        body = json.dumps({"version": 5, "type": "multiinfo", "resultcount": len(results),
+                           "results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_rpc(packages):
+    handler = type("Handler", (RpcHandler,), {"packages": packages, "requests": []})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler, f"http://127.0.0.1:{server.server_address[1]}/rpc/v5/info"
+
+
+def use_fixture(root, aur_dir, rpc_url):
+    """Направить aur, updates и pkgdb в поддельный корень и замену AUR"""
+    import aur
+    import pkgdb
+    import updates
+    aur.AUR_RPC = rpc_url
+    aur.AUR_GIT = aur_dir
+    aur.SYNC_DB_DIR = os.path.join(root, "var/lib/pacman/sync")
+    updates.PACMAN_CONF = os.path.join(root, "etc/pacman.conf")
+    pkgdb.load_graph = functools.partial(pkgdb.load_graph, root)
+
+
+def run_update(parallel, cache, default_budget):
+    """Выполнить yay_update в режиме aur_parallel, вернуть итог"""
+    import aur
+    from cli import CliManager
+
+    os.environ["XDG_CACHE_HOME"] = cache
+    if parallel:
+        cpus = os.cpu_count() or 1
+        aur.build_budget = lambda count: (min(parallel, count), max(1, cpus // parallel))
+    else:
+        aur.build_budget = default_budget
+
+    meter = OutputMeter()
+    manager = CliManager({"aur_parallel": True, "privileged_worker": False},
+                         assume_yes=True, stream=meter)
+    manager.start_pump()
+    try:
+        record = manager.run_one("yay_update")
+    finally:
+        manager.stop_pump()
+    steps = [entry for entry in manager.telemetry.load() if entry.get("kind") == "step"]
+    builds = {entry["step"][len("build:"):]: entry["wall_s"] for entry in steps
+              if entry["step"].startswith("build:")}
+    return {
+        "parallel": parallel or "auto",
+        "result": record["result"],
+        "status": record["status"],
+        "wall_s": record["duration_s"],
+        "builds": len(builds),
+        "build_sum_s": round(sum(builds.values()), 3),
+        "out_lines": meter.lines,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=int, default=24)
+    parser.add_argument("--parallel", default="1,4,0",
+                        help="числа одновременных сборок через запятую, 0 - по бюджету")
+    parser.add_argument("--build", type=float, default=0.2,
+                        help="секунд сборки на единицу _buildtime (FAKE_BUILD)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_aur.") as tmp:
+        packages = build_fixture(tmp, args.packages)
+        server, handler, rpc_url = start_rpc(packages)
+        install_stubs(os.path.join(tmp, "bin"), TOOLS)
+        os.environ["PATH"] = os.path.join(tmp, "bin") + os.pathsep + os.environ.get("PATH", "")
+        os.environ["FAKE_BUILD"] = str(args.build)
+        use_fixture(os.path.join(tmp, "root"), os.path.join(tmp, "aur"), rpc_url)
+        import aur
+        default_budget = aur.build_budget
+        try:
+            for parallel in (int(value) for value in args.parallel.split(",")):
+                handler.requests.clear()
+                cache = tempfile.mkdtemp(prefix="cache.", dir=tmp)
+                result = run_update(parallel, cache, default_budget)
+                result["rpc_requests"] = len(handler.requests)
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""Сквозной бенчмарк операций на заглушках pacman/yay/journalctl.
+
+Собирает во временном каталоге поддельный корень (локальная база pacman,
+кэш пакетов, /var/log, mirrorlist на локальное HTTP-зеркало) и кладет
+заглушки из fake_tools.py первыми в PATH. Каждая операция запускается в
+отдельном процессе без дисплея (пакетный режим) и в окне на виртуальном
+X-сервере (Xvfb, если DISPLAY не задан). Отчет - JSON: задержка операции,
+задержка цикла событий окна, поток вывода и пиковая память.
+
+    python3 benchmarks/bench_e2e.py [--scenario burst] [--modes headless,gui]
+                                    [--ops full_update,clean_logs] [--output report.json]
+    python3 benchmarks/bench_e2e.py --compare old.json new.json
+
+Ничего в системе не меняется: все привилегированные команды - заглушки.
+"""
+import argparse
+import functools
+import gzip
+import http.server
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO)
+
+from core import OPERATIONS  # noqa: E402
+
+TOOLS = ("pacman", "yay", "pacman-mirrors", "journalctl", "sudo", "xargs", "verb")
+MODES = ("headless", "gui")
+
+# Объем и скорость вывода заглушек (переменные FAKE_* в fake_tools.py)
+SCENARIOS = {
+    "burst": {"lines": 50000, "rate": 0, "progress": 20},
+    "progress": {"lines": 3000, "rate": 0, "progress": 400},
+    "trickle": {"lines": 300, "rate": 60, "progress": 10},
+}
+
+# Размер поддельного корня
+PACKAGES = 400
+FILES_PER_PACKAGE = 15
+CACHED_VERSIONS = 4
+LOG_GROUPS = 30
+
+# Период тика для замера задержки цикла событий, мс
+TICK_MS = 10
+
+
+def write_desc(path, sections):
+    with open(path, "w", encoding="utf-8") as f:
+        for key, values in sections.items():
+            f.write(f"%{key}%\n")
+            for value in values:
+                f.write(f"{value}\n")
+            f.write("\n")
+
+
+def build_root(root, mirror_url):
+    """Поддельный корень: база pacman, файлы пакетов, кэш, логи, mirrorlist"""
+    local = os.path.join(root, "var/lib/pacman/local")
+    cache = os.path.join(root, "var/cache/pacman/pkg")
+    logs = os.path.join(root, "var/log")
+    for path in (local, cache, logs, os.path.join(logs, "journal"), os.path.join(root, "etc/pacman.d")):
+        os.makedirs(path, exist_ok=True)
+
+    old = time.time() - 30 * 86400
+    for i in range(PACKAGES):
+        name = f"pkg-{i}"
+        version = f"1.{i % 5}-1"
+        pkgdir = os.path.join(local, f"{name}-{version}")
+        os.makedirs(pkgdir)
+        # Каждый десятый пакет - зависимость, от которой никто не зависит
+        reason = 1 if i % 10 == 9 else 0
+        depends = [f"pkg-{i + 1}"] if i % 10 < 8 and i + 1 < PACKAGES else []
+        write_desc(os.path.join(pkgdir, "desc"), {
+            "NAME": [name], "VERSION": [version], "REASON": [reason],
+            "SIZE": [FILES_PER_PACKAGE * 4096], "DEPENDS": depends,
+        })
+        files = [f"usr/share/{name}/"]
+        mtree = ["#mtree", "/set type=file uid=0 gid=0 mode=644"]
+        os.makedirs(os.path.join(root, "usr/share", name))
+        for j in range(FILES_PER_PACKAGE):
+            rel = f"usr/share/{name}/file-{j}"
+            with open(os.path.join(root, rel), "wb") as f:
+                f.write(b"x" * 4096)
+            files.append(rel)
+            mtree.append(f"./{rel} size=4096")
+        write_desc(os.path.join(pkgdir, "files"), {"FILES": files})
+        with gzip.open(os.path.join(pkgdir, "mtree"), "wt") as f:
+            f.write("\n".join(mtree) + "\n")
+        for k in range(CACHED_VERSIONS):
+            filename = f"{name}-1.{k}-1-x86_64.pkg.tar.zst"
+            with open(os.path.join(cache, filename), "wb") as f:
+                f.truncate(256 * 1024)
+
+    for i in range(LOG_GROUPS):
+        for k in range(6):
+            path = os.path.join(logs, f"service-{i}.log" + (f".{k}.gz" if k else ""))
+            with open(path, "wb") as f:
+                f.truncate(64 * 1024)
+            os.utime(path, (old + k * 86400, old + k * 86400))
+
+    with open(os.path.join(root, "etc/pacman.d/mirrorlist"), "w") as f:
+        f.write(f"Server = {mirror_url}/stable/$repo/$arch\n")
+    with open(os.path.join(root, "etc/pacman.conf"), "w") as f:
+        f.write("[options]\nArchitecture = auto\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n")
+    return root
+
+
+def build_mirror(path):
+    """Содержимое локального зеркала для ранжирования"""
+    arch = os.uname().machine
+    os.makedirs(os.path.join(path, "stable/core", arch), exist_ok=True)
+    with open(os.path.join(path, "stable/state"), "w") as f:
+        f.write(time.strftime("date=%Y-%m-%dT%H:%M:%SZ\n", time.gmtime()))
+    # База core: каждый третий пакет поддельного корня обновился
+    with tarfile.open(os.path.join(path, "stable/core", arch, "core.db"), "w:gz") as tar:
+        for i in range(PACKAGES):
+            version = f"1.{i % 5}-{2 if i % 3 == 0 else 1}"
+            desc = (f"%FILENAME%\npkg-{i}-{version}-{arch}.pkg.tar.zst\n\n%NAME%\npkg-{i}\n\n"
+                    f"%VERSION%\n{version}\n\n%CSIZE%\n{256 * 1024}\n\n%ISIZE%\n{FILES_PER_PACKAGE * 4096}\n\n")
+            data = (desc + "x" * 512).encode()
+            info = tarfile.TarInfo(f"pkg-{i}-{version}/desc")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_mirror(path):
+    """HTTP-сервер зеркала в фоновом потоке, вернуть (сервер, адрес)"""
+    handler = functools.partial(QuietHandler, directory=path)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def install_stubs(bin_dir, tools=TOOLS):
+    """Обертки заглушек, которые будут первыми в PATH"""
+    os.makedirs(bin_dir, exist_ok=True)
+    script = os.path.join(BENCH_DIR, "fake_tools.py")
+    for tool in tools:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w") as f:
+            f.write(f"#!/bin/sh\nexec {sys.executable} {script} {tool} \"$@\"\n")
+        os.chmod(path, 0o755)
+
+
+def start_xvfb():
+    """Запустить Xvfb на свободном дисплее, вернуть (процесс, DISPLAY) или (None, None)"""
+    xvfb = shutil.which("Xvfb")
+    if not xvfb:
+        return None, None
+    for number in range(90, 110):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            continue
+        process = subprocess.Popen([xvfb, f":{number}", "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                return process, f":{number}"
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        process.kill()
+    return None, None
+
+
+def use_fake_root(root):
+    """Направить чтение системных путей в поддельный корень"""
+    import core
+    import integrity
+    import logretention
+    import mirrors
+    import pkgcache
+    import pkgdb
+    import privileged
+    import updates
+    # Помощник ищет программы только в /usr/bin, поэтому заглушки запускаются
+    # через sudo из PATH, а действия помощника - через заглушку verb
+    core.DEFAULT_OPTIONS["privileged_worker"] = False
+    privileged.verb_command = lambda verb, *args, sudo=True: (
+        (["sudo"] if sudo else []) + ["verb", verb] + [str(arg) for arg in args])
+    mirrorlist = os.path.join(root, "etc/pacman.d/mirrorlist")
+    pkgdb.load_graph = functools.partial(pkgdb.load_graph, root)
+    integrity.check_integrity = functools.partial(integrity.check_integrity, root)
+    pkgcache.scan_cache = functools.partial(pkgcache.scan_cache, os.path.join(root, "var/cache/pacman/pkg"))
+    logretention.plan_retention = functools.partial(logretention.plan_retention, os.path.join(root, "var/log"))
+    mirrors.MIRRORLIST = mirrorlist
+    mirrors.read_mirrorlist = functools.partial(mirrors.read_mirrorlist, mirrorlist)
+    updates.PACMAN_CONF = os.path.join(root, "etc/pacman.conf")
+    updates.preview_updates = functools.partial(updates.preview_updates, conf=updates.PACMAN_CONF)
+
+
+class OutputMeter:
+    """Счетчик вывода, забранного интерфейсом из очереди"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+
+    def count(self, text):
+        if text:
+            self.bytes += len(text.encode("utf-8", "replace"))
+            self.lines += text.count("\n")
+        return text
+
+    def write(self, text):
+        self.count(text)
+
+    def flush(self):
+        pass
+
+
+def peak_memory():
+    return {
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def lag_stats(lags):
+    if not lags:
+        return None
+    lags = sorted(lags)
+    return {
+        "p50_ms": round(statistics.median(lags), 2),
+        "p95_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))], 2),
+        "max_ms": round(lags[-1], 2),
+    }
+
+
+def run_headless(operation):
+    from cli import CliManager
+    meter = OutputMeter()
+    manager = CliManager(assume_yes=True, stream=meter)
+    manager.start_pump()
+    try:
+        record = manager.run_one(operation)
+    finally:
+        manager.stop_pump()
+    return {
+        "latency_s": record["duration_s"],
+        "result": record["result"],
+        "status": record["status"],
+        "out_bytes": meter.bytes,
+        "out_lines": meter.lines,
+        "event_loop_lag": None,
+    }
+
+
+def run_gui(operation):
+    import tkinter as tk
+    from core import RESULT_FAILED
+    from gui import ManjaroUpdater
+
+    meter = OutputMeter()
+    finished = threading.Event()
+    final = {}
+
+    class BenchUpdater(ManjaroUpdater):
+        def confirm(self, title, message):
+            return True
+
+        def run_operation(self, name):
+            result = super().run_operation(name)
+            final["status"] = self.status
+            final["result"] = result
+            finished.set()
+            return result
+
+    root = tk.Tk()
+    app = BenchUpdater(root)
+    drain = app.output.drain
+    app.output.drain = lambda limit=None: meter.count(drain(limit) if limit else drain())
+    lags = []
+    timing = {}
+
+    def tick(expected):
+        now = time.perf_counter()
+        lags.append(max(0.0, (now - expected) * 1000))
+        if finished.is_set() and not app.output.pending():
+            timing["end"] = now
+            root.quit()
+            return
+        root.after(TICK_MS, tick, now + TICK_MS / 1000)
+
+    def begin():
+        timing["start"] = time.perf_counter()
+        app.start_operation(operation)
+        root.after(TICK_MS, tick, time.perf_counter() + TICK_MS / 1000)
+
+    root.after(100, begin)
+    root.mainloop()
+    app.output.close()
+    root.destroy()
+    text, _ = final.get("status", ("", "red"))
+    return {
+        "latency_s": round(timing["end"] - timing["start"], 3),
+        "result": final.get("result", RESULT_FAILED),
+        "status": text,
+        "out_bytes": meter.bytes,
+        "out_lines": meter.lines,
+        "event_loop_lag": lag_stats(lags),
+    }
+
+
+def child(mode, operation, root):
+    """Выполнить одну операцию в этом процессе и напечатать результат JSON"""
+    use_fake_root(root)
+    result = run_headless(operation) if mode == "headless" else run_gui(operation)
+    latency = result["latency_s"] or 1e-9
+    result["lines_per_s"] = round(result["out_lines"] / latency, 1)
+    result["bytes_per_s"] = round(result["out_bytes"] / latency, 1)
+    result.update(peak_memory())
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def run_child(mode, operation, env, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, operation, env["BENCH_ROOT"]]
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, timeout=timeout, cwd=REPO)
+    if proc.returncode != 0 or not proc.stdout.strip():
+        return {"error": f"код {proc.returncode}: {proc.stderr.strip()[-500:]}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_bench(args):
+    scenario = SCENARIOS[args.scenario]
+    operations = args.ops.split(",") if args.ops else list(OPERATIONS)
+    modes = args.modes.split(",")
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "scenario": dict(scenario, name=args.scenario),
+        "fixture": {"packages": PACKAGES, "files_per_package": FILES_PER_PACKAGE,
+                    "cached_versions": CACHED_VERSIONS, "log_groups": LOG_GROUPS},
+        "results": [],
+    }
+    xvfb = None
+    with tempfile.TemporaryDirectory(prefix="bench_e2e.") as tmp:
+        build_mirror(os.path.join(tmp, "mirror"))
+        server, mirror_url = start_mirror(os.path.join(tmp, "mirror"))
+        install_stubs(os.path.join(tmp, "bin"))
+        env = dict(os.environ,
+                   PATH=os.path.join(tmp, "bin") + os.pathsep + os.environ.get("PATH", ""),
+                   FAKE_LINES=str(scenario["lines"]),
+                   FAKE_RATE=str(scenario["rate"]),
+                   FAKE_PROGRESS=str(scenario["progress"]))
+        # Заглушки корень не меняют, поэтому он общий; кэши приложения - свои на прогон
+        root = build_root(os.path.join(tmp, "root"), mirror_url)
+        display = os.environ.get("DISPLAY")
+        if "gui" in modes and not display:
+            xvfb, display = start_xvfb()
+        try:
+            for mode in modes:
+                for operation in operations:
+                    for run in range(args.repeat):
+                        cache = tempfile.mkdtemp(prefix="cache.", dir=tmp)
+                        run_env = dict(env, BENCH_ROOT=root, XDG_CACHE_HOME=cache)
+                        entry = {"operation": operation, "mode": mode, "run": run}
+                        if mode == "gui" and not display:
+                            entry["skipped"] = "нет DISPLAY и Xvfb"
+                        else:
+                            if display:
+                                run_env["DISPLAY"] = display
+                            try:
+                                entry.update(run_child(mode, operation, run_env, args.timeout))
+                            except subprocess.TimeoutExpired:
+                                entry["error"] = f"превышено время ожидания {args.timeout} с"
+                        report["results"].append(entry)
+                        shutil.rmtree(cache, ignore_errors=True)
+                        sys.stderr.write(f"{mode:<8} {operation:<20} "
+                                         f"{entry.get('latency_s', entry.get('skipped') or entry.get('error'))}\n")
+        finally:
+            server.shutdown()
+            if xvfb is not None:
+                xvfb.terminate()
+    return report
+
+
+def compare(old_path, new_path):
+    """Сравнить два отчета по медиане задержки каждой операции"""
+    def medians(path):
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+        series = {}
+        for entry in report["results"]:
+            if "latency_s" in entry:
+                series.setdefault((entry["mode"], entry["operation"]), []).append(entry["latency_s"])
+        return {key: statistics.median(values) for key, values in series.items()}
+
+    old, new = medians(old_path), medians(new_path)
+    rows = []
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        change = after / before - 1 if before and after else None
+        rows.append({"mode": key[0], "operation": key[1], "old_s": before, "new_s": after,
+                     "change": None if change is None else round(change, 3)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="burst")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--ops", help="операции через запятую (по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="файл отчета (по умолчанию stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+    if args.compare:
+        for row in compare(*args.compare):
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    unknown = set((args.ops or "").split(",")) - set(OPERATIONS) - {""}
+    if unknown:
+        parser.error(f"неизвестные операции: {', '.join(sorted(unknown))}")
+    report = run_bench(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
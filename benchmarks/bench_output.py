@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Бенчмарк окна вывода: построчная вставка против конвейера с очередью.
+
+Проигрывает стенограмму из N строк (по умолчанию 100 000) из рабочего
+потока и печатает строк/с и пиковый RSS для каждого режима. Каждый режим
+запускается в отдельном процессе, чтобы RSS не смешивался.
+
+    python3 benchmarks/bench_output.py [--lines 100000] [--transcript FILE]
+
+Требуется дисплей (DISPLAY или xvfb-run).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("legacy", "pipeline")
+
+
+def make_transcript(count):
+    """Синтетический вывод pacman -Syu"""
+    lines = []
+    for i in range(count):
+        if i % 3 == 0:
+            lines.append(f"({i}/{count}) upgrading package-{i % 997} [###########---------] 55%\n")
+        elif i % 3 == 1:
+            lines.append(f"checking package-{i % 997}: /usr/lib/lib{i % 97}.so.{i % 7}\n")
+        else:
+            lines.append(f":: Running post-transaction hooks... ({i % 31}/31) Arming ConditionNeedsUpdate\n")
+    return lines
+
+
+def load_transcript(path, count):
+    if path:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.readlines()
+    return make_transcript(count)
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_mode(mode, lines):
+    """Прогнать стенограмму через окно в выбранном режиме"""
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from console import OutputPipeline, trim_text_widget
+
+    root = tk.Tk()
+    root.withdraw()
+    text = scrolledtext.ScrolledText(root)
+    text.pack()
+    done = threading.Event()
+
+    if mode == "legacy":
+        def append(chunk):
+            text.insert(tk.END, chunk)
+            text.see(tk.END)
+            root.update_idletasks()
+    else:
+        pipeline = OutputPipeline(log_path=os.devnull)
+        append = pipeline.put
+
+        def flush():
+            chunk = pipeline.drain()
+            if chunk:
+                text.insert(tk.END, chunk)
+                trim_text_widget(text, pipeline.max_lines)
+                text.see(tk.END)
+            if done.is_set() and not pipeline.pending():
+                root.quit()
+                return
+            root.after(1 if pipeline.pending() else 50, flush)
+        root.after(50, flush)
+
+    def worker():
+        for line in lines:
+            append(line)
+        done.set()
+        if mode == "legacy":
+            root.after(0, root.quit)
+
+    start = time.perf_counter()
+    threading.Thread(target=worker, daemon=True).start()
+    root.mainloop()
+    elapsed = time.perf_counter() - start
+    root.destroy()
+    return {
+        "mode": mode,
+        "lines": len(lines),
+        "seconds": round(elapsed, 3),
+        "lines_per_s": round(len(lines) / elapsed) if elapsed else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--transcript", help="файл с реальным выводом вместо синтетического")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        lines = load_transcript(args.transcript, args.lines)
+        print(json.dumps(run_mode(args.mode, lines)))
+        return 0
+
+    if not os.environ.get("DISPLAY"):
+        print("Нужен дисплей: запустите через xvfb-run", file=sys.stderr)
+        return 2
+
+    results = []
+    for mode in MODES:
+        cmd = [sys.executable, __file__, "--mode", mode, "--lines", str(args.lines)]
+        if args.transcript:
+            cmd += ["--transcript", args.transcript]
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+        results.append(json.loads(out.stdout))
+
+    for r in results:
+        print(f"{r['mode']:>8}: {r['lines_per_s']:>9} строк/с, {r['seconds']:>8} с, "
+              f"пиковый RSS {r['peak_rss_kb'] / 1024:.1f} МБ")
+    print(json.dumps(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Бенчмарк планировщика шагов на полной очистке системы.
+
+Шаги full_clean заменены заглушками с типичной длительностью (sleep и
+немного вывода). Сравнивается время последовательного выполнения, как
+было раньше, и выполнения через StepScheduler.
+
+    python3 benchmarks/bench_scheduler.py [--scale 1.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler  # noqa: E402
+from scheduler import Step, StepScheduler  # noqa: E402
+
+# Шаги full_clean: (имя, ресурсы, длительность в секундах)
+FULL_CLEAN = [
+    ("pkg-cache", {scheduler.PKG_CACHE}, 1.0),
+    ("yay-cache", {scheduler.YAY_CACHE}, 2.0),
+    ("orphans", {scheduler.PACMAN_DB}, 1.5),
+    ("journal", {scheduler.JOURNAL}, 0.8),
+    ("logs", {scheduler.LOGS}, 0.3),
+]
+
+
+def stub_steps(scale):
+    steps = []
+    for name, resources, seconds in FULL_CLEAN:
+        command = f"for i in 1 2 3 4 5; do echo {name} $i; sleep {seconds * scale / 5:.3f}; done"
+        steps.append(Step(name, command, name, resources))
+    return steps
+
+
+def run_step(step):
+    return subprocess.run(step.command, shell=True, stdout=subprocess.DEVNULL).returncode == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель длительности шагов")
+    args = parser.parse_args()
+    steps = stub_steps(args.scale)
+
+    start = time.perf_counter()
+    for step in steps:
+        run_step(step)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = StepScheduler(run_step).run(steps)
+    scheduled = time.perf_counter() - start
+    assert all(results.values())
+
+    print(f"последовательно: {sequential:.2f} с")
+    print(f"планировщик:     {scheduled:.2f} с (ускорение x{sequential / scheduled:.2f})")
+    print(json.dumps({"sequential_s": round(sequential, 3), "scheduled_s": round(scheduled, 3)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Бенчмарк набора отката на обычном временном каталоге.
+
+Создает кэш пакетов из --packages разреженных файлов размера --size
+(и подписей), строит снимок установленных версий и выполняет его шаги
+без sudo: время не должно зависеть от размера файлов. Затем «обновляет»
+часть пакетов, удаляет оригиналы из кэша (как очистка кэша) и проверяет,
+что план отката указывает на сохранившиеся файлы набора. Запускать от
+обычного пользователя: от root действия помощника работают только
+внутри privileged.SAFE_ROOTS.
+
+    python3 benchmarks/bench_snapshot.py --packages 1500 --size 1K,512M
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pkgcache  # noqa: E402
+import privileged  # noqa: E402
+import snapshot  # noqa: E402
+from scheduler import StepScheduler  # noqa: E402
+
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    return int(text[:-1]) * UNITS[text[-1]] if text[-1] in UNITS else int(text)
+
+
+def build_cache(path, count, size):
+    """Кэш с двумя версиями каждого пакета; установлена вторая"""
+    os.makedirs(path)
+    installed = {}
+    for i in range(count):
+        name = f"pkg-{i}"
+        for version in ("1.0-1", "1.1-1"):
+            filename = os.path.join(path, f"{name}-{version}-x86_64.pkg.tar.zst")
+            with open(filename, "wb") as f:
+                f.truncate(size)
+            with open(filename + ".sig", "wb") as f:
+                f.write(b"s" * 566)
+        installed[name] = ("1.1-1", i % 2)
+    return installed
+
+
+def run_steps(steps):
+    def run_step(step):
+        return subprocess.run(step.command, stdout=subprocess.DEVNULL).returncode == 0
+    results = StepScheduler(run_step).run(steps)
+    return all(results.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=int, default=1500)
+    parser.add_argument("--size", default="1K,512M", help="размеры файлов пакетов через запятую")
+    args = parser.parse_args()
+
+    for size in (parse_size(value) for value in args.size.split(",")):
+        with tempfile.TemporaryDirectory(prefix="bench_snapshot.") as tmp:
+            cache_dir = os.path.join(tmp, "pkg")
+            installed = build_cache(cache_dir, args.packages, size)
+            store = snapshot.SnapshotStore(os.path.join(tmp, "snapshots.json"))
+
+            start = time.perf_counter()
+            cache = pkgcache.scan_cache(cache_dir)
+            plan, sources = snapshot.plan_snapshot(installed, cache, "full_update",
+                                                   rollback_root=os.path.join(tmp, "rollback"))
+            plan_s = time.perf_counter() - start
+            file_list = privileged.write_file_list(sources, os.path.join(tmp, "snapshot.list"))
+            start = time.perf_counter()
+            ok = run_steps(snapshot.snapshot_steps(plan, file_list, sudo=False))
+            link_s = time.perf_counter() - start
+            store.add(plan)
+
+            # Обновление: половина пакетов сменила версию, пакет удален, пакет добавлен
+            after = {name: ("1.2-1" if i % 2 else version) for i, (name, (version, _)) in
+                     enumerate(sorted(installed.items()))}
+            del after["pkg-0"]
+            after["new-dep"] = "1.0-1"
+            # Очистка кэша удалила оригиналы
+            for path in sources:
+                os.unlink(path)
+            rollback = snapshot.plan_rollback(store.latest(), after)
+            steps = snapshot.rollback_steps(rollback, sudo=False)
+            survives = all(os.stat(path).st_nlink == 1 for path in rollback.files)
+            print(json.dumps({
+                "packages": args.packages,
+                "size": size,
+                "links_ok": ok,
+                "files": plan.file_count,
+                "plan_s": round(plan_s, 4),
+                "link_s": round(link_s, 4),
+                "rollback_packages": rollback.count,
+                "rollback_files_present": all(os.path.exists(path) for path in rollback.files),
+                "rollback_survives_prune": survives,
+                "rollback_dependencies": len(rollback.dependencies),
+                "added": rollback.added,
+                "rollback_command": steps[0].command[:3] if steps else None,
+            }), flush=True)
+
+            # Старые снимки сверх KEEP удаляются
+            expired = []
+            for i in range(snapshot.KEEP + 1):
+                extra, _ = snapshot.plan_snapshot({}, {}, rollback_root=os.path.join(tmp, "rollback"),
+                                                  now=time.time() + 60 * (i + 1))
+                os.makedirs(extra.rollback_dir)
+                expired += store.add(extra)
+            rollback_root = os.path.join(tmp, "rollback")
+            expire_list = privileged.write_file_list(snapshot.expired_dirs(expired, rollback_root),
+                                                     os.path.join(tmp, "expire.list"))
+            run_steps(snapshot.expire_steps(expired, expire_list, sudo=False, rollback_root=rollback_root))
+            print(json.dumps({"kept": len(store.load()),
+                              "expired_removed": not any(os.path.exists(s.rollback_dir) for s in expired)}),
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
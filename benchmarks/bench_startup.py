@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Бенчмарк холодного запуска в обоих режимах (python -X importtime).
+
+Для пакетного режима запускается manjaro_updater.py --list-operations,
+для графического - импорт модуля gui (создание окна требует дисплея).
+Печатает медиану времени запуска процесса, суммарное время импортов,
+самые дорогие импорты и проверяет, что пакетный режим не грузит tkinter.
+
+    python3 benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "cli": [os.path.join(REPO, "manjaro_updater.py"), "--list-operations"],
+    "gui": ["-c", f"import sys; sys.path.insert(0, {REPO!r}); import gui"],
+}
+
+
+def parse_importtime(stderr):
+    """Разобрать вывод -X importtime: ({модуль: собственное мкс}, сумма верхнего уровня мкс)"""
+    modules = {}
+    top_total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules[name.strip()] = int(self_us)
+        if depth == 0:
+            top_total += int(cumulative)
+    return modules, top_total
+
+
+def run_mode(mode, runs):
+    walls, totals = [], []
+    modules = {}
+    for _ in range(runs):
+        cmd = [sys.executable, "-X", "importtime"] + MODES[mode]
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              universal_newlines=True, cwd=REPO)
+        walls.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{mode}: код {proc.returncode}\n{proc.stderr[-2000:]}")
+        modules, total = parse_importtime(proc.stderr)
+        totals.append(total)
+    heaviest = sorted(modules.items(), key=lambda item: -item[1])[:5]
+    return {
+        "mode": mode,
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "imports_ms": round(statistics.median(totals) / 1000, 1),
+        "tkinter": "tkinter" in modules,
+        "heaviest": [{"module": name, "self_ms": round(us / 1000, 2)} for name, us in heaviest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    results = [run_mode(mode, args.runs) for mode in MODES]
+    for r in results:
+        print(f"{r['mode']:>4}: запуск {r['wall_ms']} мс, импорты {r['imports_ms']} мс, "
+              f"tkinter: {'да' if r['tkinter'] else 'нет'}")
+    print(json.dumps(results, ensure_ascii=False))
+    return 1 if results[0]["tkinter"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Бенчмарк анализа кэша сборок yay: полный обход и обход по снимку.
+
+Создает во временном каталоге кэш yay из --bases каталогов сборки
+(клон .git, дерево src/ из --dirs каталогов, собранные пакеты, журналы,
+архив исходников) и замеряет analyze() без снимка, повторно по снимку и
+после изменения части каталогов, с разным числом потоков.
+
+    python3 benchmarks/bench_yaycache.py --bases 200 --dirs 40 --workers 1,8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import yaycache  # noqa: E402
+
+FILES_PER_DIR = 8
+OLD = time.time() - 60 * 86400
+
+
+def build_cache(root, bases, dirs):
+    for i in range(bases):
+        base = os.path.join(root, f"aur-{i}")
+        os.makedirs(os.path.join(base, ".git/objects/pack"))
+        with open(os.path.join(base, ".SRCINFO"), "w") as f:
+            f.write(f"pkgbase = aur-{i}\n\tpkgver = 1.0\npkgname = aur-{i}\n")
+        with open(os.path.join(base, "PKGBUILD"), "w") as f:
+            f.write(f"pkgname=aur-{i}\n")
+        with open(os.path.join(base, ".git/objects/pack/pack.pack"), "wb") as f:
+            f.write(b"g" * 64 * 1024)
+        for version in ("1.0-1", "1.1-1"):
+            with open(os.path.join(base, f"aur-{i}-{version}-x86_64.pkg.tar.zst"), "wb") as f:
+                f.write(b"p" * 128 * 1024)
+        with open(os.path.join(base, f"aur-{i}-1.1-1-x86_64-build.log"), "w") as f:
+            f.write("log\n" * 100)
+        with open(os.path.join(base, f"aur-{i}-1.1.tar.gz"), "wb") as f:
+            f.write(b"s" * 32 * 1024)
+        for d in range(dirs):
+            path = os.path.join(base, "src", f"dir-{d // 8}", f"sub-{d}")
+            os.makedirs(path)
+            for j in range(FILES_PER_DIR):
+                with open(os.path.join(path, f"file-{j}.o"), "wb") as f:
+                    f.write(b"o" * 4096)
+        # Половина деревьев сборки старая
+        if i % 2:
+            os.utime(os.path.join(base, "src"), (OLD, OLD))
+            for top, subdirs, _ in os.walk(os.path.join(base, "src")):
+                for name in subdirs:
+                    os.utime(os.path.join(top, name), (OLD, OLD))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bases", type=int, default=200)
+    parser.add_argument("--dirs", type=int, default=40, help="каталогов в src/ на сборку")
+    parser.add_argument("--workers", default="1,8")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_yaycache.") as tmp:
+        root = os.path.join(tmp, "yay")
+        build_cache(root, args.bases, args.dirs)
+        installed = {f"aur-{i}": "1.1-1" for i in range(0, args.bases, 3)}
+        for workers in (int(value) for value in args.workers.split(",")):
+            snapshot = os.path.join(tmp, f"snapshot-{workers}.json")
+            cold, analysis = timed(lambda: yaycache.analyze(root, snapshot, workers))
+            warm, again = timed(lambda: yaycache.analyze(root, snapshot, workers))
+            # Новый файл в каждом десятом дереве сборки
+            for i in range(0, args.bases, 10):
+                with open(os.path.join(root, f"aur-{i}", "src", "dir-0", f"new-{workers}.o"), "wb") as f:
+                    f.write(b"n" * 4096)
+            changed, partial = timed(lambda: yaycache.analyze(root, snapshot, workers))
+            plan_time, plan = timed(lambda: yaycache.plan_prune(partial, installed))
+            print(json.dumps({
+                "workers": workers,
+                "dirs": len(analysis.dirs),
+                "cold_s": round(cold, 4),
+                "snapshot_s": round(warm, 4),
+                "snapshot_rescanned": again.rescanned,
+                "changed_s": round(changed, 4),
+                "changed_rescanned": partial.rescanned,
+                "plan_s": round(plan_time, 4),
+                "size": partial.size,
+                "reclaim": plan.total,
+                "same_size": again.size == analysis.size,
+            }), flush=True)
+        print("\n".join(plan.report(limit=3)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
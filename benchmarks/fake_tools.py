@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Поддельные pacman, yay, pacman-mirrors, journalctl, sudo, git и makepkg для бенчмарков.
+
+bench_e2e.py кладет в каталог в начале PATH обертки, которые вызывают
+этот файл с именем инструмента первым аргументом:
+
+    fake_tools.py pacman -Syu --noconfirm
+
+Объем и скорость вывода задаются переменными окружения:
+    FAKE_LINES     - строк в журнале обновления (pacman/yay -Syu)
+    FAKE_RATE      - строк в секунду, 0 - без ограничения
+    FAKE_PROGRESS  - кадров (через \\r) в каждой полосе прогресса
+    FAKE_BUILD     - секунд сборки makepkg на единицу _buildtime из PKGBUILD
+Как настоящий pacman, заглушки рисуют полосы через \\r и счетчики (n/m)
+только в терминале; если stdout не терминал, выводятся простые строки
+(" core downloading...", "checking package integrity...", "upgrading foo...").
+Ничего в системе не меняется: sudo выполняет команду без повышения прав,
+а xargs и verb (действия privileged.py, см. bench_e2e.use_fake_root)
+только сообщают, что сделали бы. git clone копирует локальный каталог,
+makepkg кладет в PKGDEST пустые файлы пакетов.
+"""
+import os
+import re
+import shutil
+import sys
+import time
+
+LINES = int(os.environ.get("FAKE_LINES", "2000"))
+RATE = float(os.environ.get("FAKE_RATE", "0"))
+PROGRESS = int(os.environ.get("FAKE_PROGRESS", "20"))
+BUILD = float(os.environ.get("FAKE_BUILD", "0.5"))
+
+REPOS = ("core", "extra", "multilib")
+
+
+class Writer:
+    """Вывод с ограничением скорости по строкам"""
+
+    def __init__(self, rate):
+        self.out = sys.stdout.buffer
+        # pacman вне терминала отключает полосы прогресса (noprogressbar)
+        self.tty = os.isatty(self.out.fileno())
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next = time.perf_counter()
+
+    def write(self, text):
+        self.out.write(text.encode("utf-8"))
+        if self.interval:
+            self.out.flush()
+            self.next += self.interval
+            delay = self.next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def line(self, text):
+        self.write(text + "\n")
+
+    def bar(self, label, frames=PROGRESS, width=30):
+        """Полоса прогресса, перерисовываемая через \\r"""
+        frames = max(frames, 1)
+        for frame in range(1, frames + 1):
+            done = width * frame // frames
+            self.write(f"\r {label:<40} [{'#' * done}{'-' * (width - done)}] {100 * frame // frames:3d}%")
+        self.write("\n")
+
+    def download(self, name, frames=PROGRESS):
+        """Загрузка файла: полоса в терминале, иначе строка, как у pacman"""
+        if self.tty:
+            self.bar(name, frames)
+        else:
+            self.line(f" {name} downloading...")
+
+    def step(self, label, text, frames=PROGRESS):
+        """Шаг проверки: полоса "(1/1) label" в терминале, иначе строка text"""
+        if self.tty:
+            self.bar(f"(1/1) {label}", frames)
+        else:
+            self.line(text)
+
+    def close(self):
+        self.out.flush()
+
+
+def sync_databases(out):
+    out.line(":: Synchronizing package databases...")
+    for repo in REPOS:
+        out.download(repo)
+
+
+def upgrade_log(out, count, prefix=""):
+    """Журнал обновления примерно из count строк"""
+    packages = max((count - 12) // 5, 1)
+    out.line(":: Starting full system upgrade...")
+    out.line("resolving dependencies...")
+    out.line("looking for conflicting packages...")
+    out.line("")
+    out.line(f"Packages ({packages}) " + " ".join(f"{prefix}pkg-{i}-1.0-1" for i in range(min(packages, 50))))
+    out.line("")
+    out.line(f"Total Download Size:   {packages * 2.5:.2f} MiB")
+    out.line(f"Total Installed Size:  {packages * 9.1:.2f} MiB")
+    out.line(":: Retrieving packages...")
+    # Фазы идут по порядку, как у pacman: загрузка, проверки, установка, хуки
+    for i in range(packages):
+        out.download(f"{prefix}pkg-{i}-1.0-1-x86_64", frames=max(PROGRESS // 4, 1))
+    for label, text in (("checking keys in keyring", "checking keyring..."),
+                        ("checking package integrity", "checking package integrity..."),
+                        ("loading package files", "loading package files..."),
+                        ("checking for file conflicts", "checking for file conflicts..."),
+                        ("checking available disk space", "checking available disk space...")):
+        out.step(label, text, frames=max(PROGRESS // 4, 1))
+    out.line(":: Processing package changes...")
+    for i in range(packages):
+        if out.tty:
+            out.line(f"({i + 1}/{packages}) upgrading {prefix}pkg-{i}")
+        else:
+            out.line(f"upgrading {prefix}pkg-{i}...")
+        out.line(f"  -> /usr/lib/{prefix}pkg-{i}/lib{i % 97}.so.{i % 7}")
+    out.line(":: Running post-transaction hooks...")
+    for i in range(packages):
+        out.line(f"({i + 1}/{packages + 1}) Updating {prefix}pkg-{i} cache...")
+    out.line(f"({packages + 1}/{packages + 1}) Arming ConditionNeedsUpdate...")
+
+
+def pacman(args, out):
+    flags = args[0] if args else ""
+    if flags.startswith("-S") and "p" in flags:
+        # -Sup --print-format: нечего скачивать
+        return 0
+    if flags.startswith("-S"):
+        if "y" in flags:
+            sync_databases(out)
+        if "u" in flags:
+            upgrade_log(out, LINES)
+        return 0
+    if flags.startswith("-U"):
+        for path in args[1:]:
+            if not path.startswith("-"):
+                out.line(f"(stub) installing {os.path.basename(path)}")
+        return 0
+    if flags.startswith("-R"):
+        names = [a for a in args[1:] if not a.startswith("-")]
+        out.line("checking dependencies...")
+        for name in names:
+            out.line(f"removing {name}...")
+        return 0
+    return 0
+
+
+def yay(args, out):
+    flags = args[0] if args else ""
+    if flags.startswith("-Sc"):
+        out.line(":: Do you want to remove all other AUR packages from cache? [Y/n]")
+        out.line("removing AUR packages from cache...")
+        return 0
+    sync_databases(out)
+    out.line(":: Searching AUR for updates...")
+    upgrade_log(out, LINES // 10, prefix="aur-")
+    return 0
+
+
+def pacman_mirrors(args, out):
+    out.line("::INFO Downloading mirrors from Manjaro")
+    for i in range(40):
+        out.line(f"::INFO Testing mirror {i}: https://mirror{i}.example.org/manjaro/ ... 0.{i:03d}")
+    out.line("::INFO Writing mirror list")
+    return 0
+
+
+def journalctl(args, out):
+    out.line("Vacuuming done, freed 0B of archived journals from /var/log/journal.")
+    return 0
+
+
+def xargs(args, out):
+    list_path = args[args.index("-a") + 1] if "-a" in args else None
+    count = 0
+    if list_path:
+        with open(list_path, "rb") as f:
+            count = sum(1 for item in f.read().split(b"\0") if item)
+    out.line(f"(stub) {' '.join(args[args.index('-a') + 2:] if list_path else args)}: {count} файлов")
+    return 0
+
+
+def verb(args, out):
+    out.line(f"(stub) privileged.py --verb {' '.join(args)}")
+    return 0
+
+
+def git(args, out):
+    if args[:1] == ["clone"]:
+        source, target = args[1], args[2]
+        out.line(f"Cloning into '{os.path.basename(target)}'...")
+        shutil.copytree(source, target)
+        os.makedirs(os.path.join(target, ".git"), exist_ok=True)
+        with open(os.path.join(target, ".git", "origin"), "w") as f:
+            f.write(source)
+        return 0
+    if args[:1] == ["-C"] and "pull" in args:
+        target = args[1]
+        with open(os.path.join(target, ".git", "origin")) as f:
+            source = f.read()
+        shutil.copy(os.path.join(source, "PKGBUILD"), os.path.join(target, "PKGBUILD"))
+        out.line("Already up to date.")
+        return 0
+    return 1
+
+
+def _pkgbuild_value(text, name):
+    match = re.search(rf"^{name}=\(?([^)\n]*)\)?$", text, re.M)
+    return match.group(1).replace("'", "").replace('"', "").split() if match else []
+
+
+def makepkg(args, out):
+    """Собрать пакеты из PKGBUILD в текущем каталоге за _buildtime * FAKE_BUILD секунд"""
+    with open("PKGBUILD") as f:
+        text = f.read()
+    names = _pkgbuild_value(text, "pkgname")
+    version = f"{_pkgbuild_value(text, 'pkgver')[0]}-{_pkgbuild_value(text, 'pkgrel')[0]}"
+    weight = float((_pkgbuild_value(text, "_buildtime") or ["1"])[0])
+    dest = os.environ.get("PKGDEST") or os.getcwd()
+    out.line(f"==> Making package: {names[0]} {version}")
+    out.line(f"==> MAKEFLAGS={os.environ.get('MAKEFLAGS', '')}")
+    time.sleep(weight * BUILD)
+    for name in names:
+        with open(os.path.join(dest, f"{name}-{version}-x86_64.pkg.tar.zst"), "wb") as f:
+            f.write(b"\0" * 1024)
+    out.line(f"==> Finished making: {names[0]} {version}")
+    return 0
+
+
+TOOLS = {
+    "pacman": pacman,
+    "yay": yay,
+    "pacman-mirrors": pacman_mirrors,
+    "journalctl": journalctl,
+    "xargs": xargs,
+    "verb": verb,
+    "git": git,
+    "makepkg": makepkg,
+}
+
+
+def main(argv):
+    tool, args = argv[0], argv[1:]
+    if tool == "sudo":
+        # Выполнить команду без повышения прав; она найдется среди заглушек в PATH
+        while args and args[0].startswith("-"):
+            args = args[1:]
+        os.execvp(args[0], args)
+    out = Writer(RATE)
+    try:
+        return TOOLS[tool](args, out)
+    finally:
+        out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
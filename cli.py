@@ -0,0 +1,195 @@
+"""Пакетный режим: операции без дисплея и без tkinter.
+
+Вывод команд идет в stderr (и в файл журнала), а в stdout по строке JSON
+на каждую операцию. Вопросы подтверждения получают неинтерактивный ответ:
+"нет" по умолчанию или "да" с ключом --yes.
+"""
+import json
+import sys
+import threading
+import time
+
+from core import (OPERATIONS, RESULT_CANCELLED, RESULT_DECLINED, RESULT_FAILED, RESULT_OK,
+                  SystemManager)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_DECLINED = 3
+EXIT_INTERRUPTED = 130
+
+# Код выхода по результату операции
+EXIT_CODES = {
+    RESULT_OK: EXIT_OK,
+    RESULT_FAILED: EXIT_FAILED,
+    RESULT_DECLINED: EXIT_DECLINED,
+    RESULT_CANCELLED: EXIT_DECLINED,
+}
+
+# Как часто переносить вывод из очереди в stderr, с
+PUMP_INTERVAL = 0.1
+
+
+class CliManager(SystemManager):
+    """Менеджер системы для командной строки"""
+
+    def __init__(self, options=None, assume_yes=False, stream=None):
+        super().__init__(options)
+        self.assume_yes = assume_yes
+        self.stream = stream
+        self.answers = []
+        self._pump_stop = threading.Event()
+        self._pump = None
+
+    def confirm(self, title, message):
+        """Ответить на вопрос без участия пользователя"""
+        answer = self.assume_yes
+        self.answers.append({"title": title, "answer": answer})
+        self.append_output(f"\n? {title}: {'да' if answer else 'нет'} (неинтерактивно)\n")
+        return answer
+
+    def start_pump(self):
+        """Запустить перенос вывода в поток stream"""
+        self._pump = threading.Thread(target=self._pump_loop, daemon=True)
+        self._pump.start()
+
+    def stop_pump(self):
+        self._pump_stop.set()
+        if self._pump is not None:
+            self._pump.join()
+        self.output.close()
+
+    def _pump_loop(self):
+        while not self._pump_stop.wait(PUMP_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        # Забрать очередь целиком: при остановке это последний перенос
+        text = self.output.drain()
+        while text:
+            if self.stream is not None:
+                self.stream.write(text)
+                self.stream.flush()
+            text = self.output.drain()
+
+    def run_one(self, name):
+        """Выполнить операцию и вернуть запись с ее итогом"""
+        self.status = ("", "blue")
+        self.answers = []
+        start = time.perf_counter()
+        result = self.run_operation(name)
+        return {
+            "operation": name,
+            "result": result,
+            "exit_code": EXIT_CODES[result],
+            "status": self.status[0],
+            "duration_s": round(time.perf_counter() - start, 3),
+            "confirmations": self.answers,
+        }
+
+
+def print_history(manager, package, out):
+    """Последние транзакции pacman или история пакета и версии для отката"""
+    try:
+        history = manager.load_history()
+    except OSError as e:
+        sys.stderr.write(f"Не удалось прочитать журнал pacman: {e}\n")
+        return EXIT_FAILED
+    if not package:
+        for transaction in history.recent():
+            out.write(json.dumps({
+                "start": transaction.start_ts,
+                "duration_s": transaction.duration,
+                "command": transaction.command,
+                "result": transaction.result,
+                "changes": transaction.count,
+                "sysupgrade": transaction.sysupgrade,
+            }, ensure_ascii=False) + "\n")
+        return EXIT_OK
+    last = history.last_change(package)
+    if last is not None:
+        transaction, change = last
+        out.write(json.dumps({"last_change": transaction.start_ts, "action": change.action,
+                              "old": change.old, "new": change.new}, ensure_ascii=False) + "\n")
+    for transaction, change in history.package_history(package):
+        out.write(json.dumps({"time": transaction.start_ts, "action": change.action,
+                              "old": change.old, "new": change.new,
+                              "command": transaction.command}, ensure_ascii=False) + "\n")
+    try:
+        candidates = manager.downgrade_candidates(package)
+    except OSError as e:
+        sys.stderr.write(f"Не удалось прочитать кэш пакетов: {e}\n")
+        return EXIT_FAILED
+    for cached, installed_at in candidates:
+        out.write(json.dumps({"downgrade": cached.version, "path": cached.path,
+                              "installed": installed_at}, ensure_ascii=False) + "\n")
+    return EXIT_OK
+
+
+def run_cli(args, out=None):
+    """Выполнить операции из args.cli и вернуть код выхода"""
+    out = out or sys.stdout
+    if args.list_operations:
+        for name, title in OPERATIONS.items():
+            out.write(json.dumps({"operation": name, "title": title}, ensure_ascii=False) + "\n")
+        return EXIT_OK
+    if args.stats:
+        for row in SystemManager().stats():
+            out.write(json.dumps(row.to_dict(), ensure_ascii=False) + "\n")
+        return EXIT_OK
+    if args.history is not None:
+        return print_history(SystemManager(), args.history, out)
+    unknown = [name for name in args.cli or () if name not in OPERATIONS]
+    if unknown:
+        sys.stderr.write(f"Неизвестные операции: {', '.join(unknown)}\n"
+                         f"Доступны: {', '.join(OPERATIONS)}\n")
+        return EXIT_USAGE
+
+    options = {
+        "deep_check": args.deep_check,
+        "prefetch": args.prefetch,
+        "prune_uninstalled": args.prune_uninstalled,
+        "aur_parallel": args.aur_parallel,
+        "snapshot": args.snapshot,
+        "privileged_worker": not args.no_helper,
+    }
+    manager = CliManager(options, assume_yes=args.yes,
+                         stream=None if args.quiet else sys.stderr)
+    manager.start_pump()
+    exit_code = EXIT_OK
+    current = None
+    try:
+        if args.run_queue:
+            def run_job(job):
+                nonlocal current, exit_code
+                current = job.operation
+                record = dict(manager.run_one(job.operation), job=job.id)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if record["exit_code"] != EXIT_OK:
+                    exit_code = exit_code or record["exit_code"]
+                    if not args.keep_going:
+                        # Остальные задания остаются в очереди
+                        manager.queue.set_paused(True)
+
+            if not manager.run_queue(run_job):
+                sys.stderr.write("Очередь уже выполняет другой процесс\n")
+                exit_code = EXIT_FAILED
+        for current in args.cli or ():
+            record = manager.run_one(current)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record["exit_code"] != EXIT_OK:
+                exit_code = exit_code or record["exit_code"]
+                if not args.keep_going:
+                    break
+    except KeyboardInterrupt:
+        manager.stop_process()
+        out.write(json.dumps({"operation": current, "result": "interrupted",
+                              "exit_code": EXIT_INTERRUPTED}, ensure_ascii=False) + "\n")
+        exit_code = EXIT_INTERRUPTED
+    finally:
+        manager.close_worker()
+        manager.stop_pump()
+    return exit_code
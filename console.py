@@ -0,0 +1,251 @@
+"""Потокобезопасный конвейер вывода команд"""
+import codecs
+import errno
+import os
+import queue
+import re
+import selectors
+import threading
+import time
+
+# Сколько строк хранить в окне вывода
+DEFAULT_MAX_LINES = 5000
+# Сколько фрагментов забирать из очереди за один тик
+DEFAULT_BATCH = 2000
+# Размер блока чтения вывода процесса
+READ_CHUNK = 64 * 1024
+
+# Проценты в конце полосы прогресса pacman/yay: "[####----]  45%"
+_PERCENT = re.compile(r"(\d{1,3})%\s*$")
+# Скорость передачи: "716.0 KiB/s", "1,2 MiB/s"
+_RATE = re.compile(r"(\d+(?:[.,]\d+)?\s*[KMGT]?i?B/s)")
+# Управляющие последовательности терминала (цвет, перемещение курсора)
+_CSI = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
+# Незавершенная последовательность в конце блока
+_CSI_TAIL = re.compile(r"\x1b(?:\[[0-9;?]*[ -/]*)?$")
+
+
+class OutputPipeline:
+    """Очередь вывода: рабочие потоки пишут, главный цикл забирает пачками.
+
+    Полный вывод сохраняется в файл журнала, в окне остается только
+    хвост из max_lines строк.
+    """
+
+    def __init__(self, log_path=None, max_lines=DEFAULT_MAX_LINES, batch=DEFAULT_BATCH):
+        self.queue = queue.SimpleQueue()
+        self.log_path = log_path
+        self.max_lines = max_lines
+        self.batch = batch
+        self.lines = 0
+        self._log = None
+        self._log_lock = threading.Lock()
+
+    def put(self, text):
+        """Добавить текст (можно вызывать из любого потока)"""
+        if text:
+            self.queue.put(text)
+
+    def drain(self, limit=None):
+        """Забрать накопленный текст одной строкой ('' если пусто)"""
+        limit = self.batch if limit is None else limit
+        chunks = []
+        try:
+            while len(chunks) < limit:
+                chunks.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not chunks:
+            return ""
+        text = "".join(chunks)
+        self.lines += text.count("\n")
+        self._write_log(text)
+        return text
+
+    def pending(self):
+        """Есть ли в очереди непоказанный текст"""
+        return not self.queue.empty()
+
+    def _write_log(self, text):
+        if not self.log_path:
+            return
+        with self._log_lock:
+            try:
+                if self._log is None:
+                    self._log = open(self.log_path, "a", encoding="utf-8")
+                    self._log.write(f"\n=== {time.strftime('%Y-%m-%d %H:%M:%S')} ===\n")
+                self._log.write(text)
+                self._log.flush()
+            except OSError:
+                # Журнал на диске не должен ломать вывод в окно
+                self.log_path = None
+
+    def close(self):
+        """Дописать очередь в журнал и закрыть файл"""
+        while self.drain():
+            pass
+        with self._log_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+def trim_text_widget(widget, max_lines):
+    """Оставить в текстовом виджете не более max_lines последних строк"""
+    total = int(widget.index("end-1c").split(".")[0])
+    excess = total - max_lines
+    if excess > 0:
+        widget.delete("1.0", f"{excess + 1}.0")
+
+
+def format_size(size):
+    """Размер в байтах в удобочитаемом виде"""
+    value = float(size)
+    for unit in ("Б", "КиБ", "МиБ", "ГиБ"):
+        if abs(value) < 1024 or unit == "ГиБ":
+            return f"{value:.0f} {unit}" if unit == "Б" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+class Progress:
+    """Последнее состояние полосы прогресса"""
+
+    __slots__ = ("label", "percent", "rate")
+
+    def __init__(self, label, percent, rate=None):
+        self.label = label
+        self.percent = percent
+        self.rate = rate
+
+    def __eq__(self, other):
+        return (isinstance(other, Progress) and
+                (self.label, self.percent, self.rate) == (other.label, other.percent, other.rate))
+
+    def __str__(self):
+        text = f"{self.label} {self.percent}%" if self.label else f"{self.percent}%"
+        return f"{text} ({self.rate})" if self.rate else text
+
+
+def parse_progress(line):
+    """Progress из строки полосы прогресса или None"""
+    match = _PERCENT.search(line)
+    if not match:
+        return None
+    percent = min(int(match.group(1)), 100)
+    rate = _RATE.search(line)
+    # Подпись - начало строки до первого двойного пробела
+    label = line.strip().split("  ", 1)[0].strip()
+    if label.startswith("[") or label.endswith("%"):
+        label = ""
+    return Progress(label, percent, rate.group(1).replace(",", ".") if rate else None)
+
+
+class TerminalFilter:
+    """Схлопывает перерисовки строк через \\r, как это делает терминал.
+
+    feed() возвращает только завершенные строки; промежуточные кадры
+    полосы прогресса не выводятся, а последний из них разбирается в
+    Progress и передается в on_progress.
+    """
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self.pending = ""
+        self.progress = None
+
+    def feed(self, text):
+        """Добавить декодированный текст, вернуть завершенные строки"""
+        text = self.pending + text
+        held = ""
+        # Цвет и перемещения курсора (вывод на псевдотерминале) не нужны;
+        # незавершенная последовательность ждет следующего блока
+        if "\x1b" in text:
+            text = _CSI.sub("", text)
+            partial = _CSI_TAIL.search(text)
+            if partial:
+                text, held = text[:partial.start()], text[partial.start():]
+        # \r в конце может оказаться началом \r\n из следующего блока
+        if text.endswith("\r"):
+            text, self.pending = text[:-1], "\r" + held
+        else:
+            self.pending = held
+        text = text.replace("\r\n", "\n")
+        *lines, tail = text.split("\n")
+        out = [line[line.rfind("\r") + 1:] for line in lines]
+        last_frame = out[-1] if out else None
+        if "\r" in tail:
+            frames = tail.split("\r")
+            # Последний целый кадр - перед последним \r
+            last_frame = frames[-2] or last_frame
+            tail = frames[-1]
+        self.pending = tail + self.pending
+        if last_frame is not None:
+            self._report(last_frame)
+        return "".join(line + "\n" for line in out)
+
+    def flush(self):
+        """Вернуть незавершенную строку в конце вывода"""
+        tail = _CSI_TAIL.sub("", self.pending).rstrip("\r")
+        self.pending = ""
+        tail = tail[tail.rfind("\r") + 1:]
+        return tail + "\n" if tail else ""
+
+    def _report(self, frame):
+        progress = parse_progress(frame)
+        if progress is not None and progress != self.progress:
+            self.progress = progress
+            if self.on_progress:
+                self.on_progress(progress)
+
+
+class OutputDecoder:
+    """Байты вывода -> завершенные строки: UTF-8 по частям и TerminalFilter"""
+
+    def __init__(self, on_text, on_progress=None):
+        self.on_text = on_text
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.terminal = TerminalFilter(on_progress)
+        self.bytes = 0
+
+    def feed(self, chunk):
+        self.bytes += len(chunk)
+        text = self.terminal.feed(self.decoder.decode(chunk))
+        if text:
+            self.on_text(text)
+
+    def close(self):
+        """Вывести остаток в конце вывода"""
+        text = self.terminal.feed(self.decoder.decode(b"", final=True)) + self.terminal.flush()
+        if text:
+            self.on_text(text)
+
+
+def read_output(stream, on_text, on_progress=None, should_stop=None, poll=0.2):
+    """Читать вывод процесса блоками и передавать завершенные строки в on_text.
+
+    stream - файл или дескриптор: канал или ведущая сторона псевдотерминала
+    (privileged.open_pty). Байты читаются через os.read под selectors и
+    декодируются OutputDecoder. should_stop() проверяется между блоками.
+    Возвращает число прочитанных байт.
+    """
+    output = OutputDecoder(on_text, on_progress)
+    fd = stream if isinstance(stream, int) else stream.fileno()
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+        while True:
+            if not selector.select(poll):
+                if should_stop and should_stop():
+                    break
+                continue
+            try:
+                chunk = os.read(fd, READ_CHUNK)
+            except OSError as e:
+                # Псевдотерминал без открытых подчиненных концов отвечает EIO
+                if e.errno != errno.EIO:
+                    raise
+                break
+            if not chunk:
+                break
+            output.feed(chunk)
+    output.close()
+    return output.bytes
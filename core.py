@@ -0,0 +1,962 @@
+"""Операции менеджера системы без привязки к интерфейсу.
+
+SystemManager выполняет все операции синхронно и сообщает о ходе работы
+через append_output, update_status и confirm. Графический интерфейс
+(gui.py) и пакетный режим (cli.py) переопределяют эти методы; tkinter
+здесь не импортируется.
+"""
+import subprocess
+import threading
+import os
+import signal
+import time
+
+import logretention
+import pkgcache
+import pkgdb
+import privileged
+import scheduler
+import telemetry
+import transaction
+from console import OutputDecoder, OutputPipeline, format_size, read_output
+from jobqueue import JobQueue
+from paths import cache_path
+from scheduler import Step, StepScheduler
+from telemetry import Telemetry, child_usage, wait_with_usage
+
+# integrity, mirrors, prefetch, updates, history, aur, yaycache и snapshot тянут за собой concurrent.futures, asyncio
+# и http.client, поэтому импортируются в методах: так быстрее запуск,
+# особенно в пакетном режиме.
+
+# Операции, доступные из интерфейса и командной строки, с описанием
+OPERATIONS = {
+    "update_mirrors": "Обновить зеркала",
+    "preview_updates": "Показать доступные обновления",
+    "full_update": "Полное обновление системы",
+    "yay_update": "Обновить пакеты AUR",
+    "check_dependencies": "Проверить зависимости",
+    "fix_dependencies": "Исправить зависимости",
+    "clean_packages": "Очистить кэш пакетов",
+    "clean_orphans": "Удалить остаточные пакеты",
+    "clean_logs": "Очистить логи",
+    "full_clean": "Полная очистка системы",
+    "rollback": "Откатить пакеты к последнему снимку",
+}
+
+# Результаты операций: по ним командная строка выбирает код выхода
+RESULT_OK = "ok"
+RESULT_FAILED = "failed"
+# Пользователь не подтвердил изменения
+RESULT_DECLINED = "declined"
+# Операцию остановили во время выполнения
+RESULT_CANCELLED = "cancelled"
+
+# Настройки операций по умолчанию
+DEFAULT_OPTIONS = {
+    "deep_check": False,
+    "prefetch": False,
+    "prune_uninstalled": False,
+    # Пакеты AUR собираются параллельно (aur.py), а не одним yay -Syu
+    "aur_parallel": False,
+    # Снимок (набор отката, на btrfs - и снимок корня) перед изменением пакетов
+    "snapshot": False,
+    # Команды sudo выполняются через один помощник на сеанс (privileged.py)
+    "privileged_worker": True,
+}
+
+
+class SystemManager:
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options or {})
+        # Процессы всех выполняющихся шагов (их может быть несколько)
+        self.processes = set()
+        self.process_lock = threading.Lock()
+        self.running = False
+        self.status = ("Готово", "blue")
+        # Последнее состояние полосы прогресса команды (console.Progress) или None
+        self.progress_state = None
+        # Состояние транзакции pacman (transaction.TransactionState) или None
+        self.transaction_state = None
+        self.current_operation = None
+        self.telemetry = Telemetry(cache_path("telemetry.jsonl"))
+        self._history = None
+        self._history_lock = threading.Lock()
+        self.worker = None
+        self._worker_failed = False
+        self._worker_lock = threading.Lock()
+        # Очередь операций (jobqueue.py) и выполняемое из нее задание
+        self.queue = JobQueue(cache_path("queue.json"))
+        self.current_job = None
+
+        # Вывод команд идет через очередь, интерфейс забирает его сам
+        self.output = OutputPipeline(log_path=cache_path("output.log"))
+
+    def append_output(self, text):
+        """Добавить текст в вывод (из любого потока)"""
+        self.output.put(text)
+
+    def update_status(self, text, color="blue"):
+        """Обновить статус операции"""
+        self.status = (text, color)
+
+    def update_progress(self, progress):
+        """Запомнить прогресс команды (None - прогресс неизвестен)"""
+        self.progress_state = progress
+
+    def update_transaction(self, state):
+        """Запомнить фазу и общий прогресс транзакции pacman (None - нет транзакции)"""
+        self.transaction_state = state
+
+    def confirm(self, title, message):
+        """Запросить подтверждение; по умолчанию - отказ"""
+        return False
+
+    def get_option(self, name):
+        """Значение настройки операции (из задания очереди, если оно выполняется)"""
+        job = self.current_job
+        if job is not None and name in job.options:
+            return job.options[name]
+        return self.options[name]
+
+    def operation_started(self):
+        """Вызывается перед началом операции"""
+        self.running = True
+
+    def operation_finished(self):
+        """Вызывается после завершения операции"""
+        self.running = False
+
+    def run_operation(self, name):
+        """Выполнить операцию по имени (синхронно) и вернуть ее результат (RESULT_*)"""
+        if name not in OPERATIONS:
+            raise ValueError(f"неизвестная операция: {name}")
+        self.current_operation = name
+        self.operation_started()
+        start = time.perf_counter()
+        result = RESULT_FAILED
+        try:
+            result = getattr(self, name)() or RESULT_FAILED
+        finally:
+            self.telemetry.record("operation", operation=name,
+                                  wall_s=round(time.perf_counter() - start, 3),
+                                  status=self.status[0], result=result)
+            self.current_operation = None
+            self.operation_finished()
+        return result
+
+    def enqueue(self, name):
+        """Поставить операцию в очередь со снимком текущих настроек"""
+        if name not in OPERATIONS:
+            raise ValueError(f"неизвестная операция: {name}")
+        options = {option: self.get_option(option) for option in DEFAULT_OPTIONS}
+        job, added, removed = self.queue.add(name, options)
+        if not added:
+            self.append_output(f"\nℹ {OPERATIONS[name]}: уже в очереди ({OPERATIONS[job.operation]})\n")
+        else:
+            for old in removed:
+                self.append_output(f"\nℹ {OPERATIONS[old.operation]}: снято, входит в {OPERATIONS[name]}\n")
+        return job
+
+    def run_queue(self, run=None):
+        """Выполнять задания очереди, пока она не опустеет или не встанет на паузу.
+
+        run(задание) выполняет одно задание, по умолчанию run_operation.
+        Возвращает False, если очередь уже выполняет другой процесс.
+        """
+        if not self.queue.claim_runner():
+            return False
+        try:
+            while True:
+                job = self.queue.next()
+                if job is None:
+                    break
+                self.current_job = job
+                try:
+                    if run is None:
+                        self.run_operation(job.operation)
+                    else:
+                        run(job)
+                except KeyboardInterrupt:
+                    # Задание остается в очереди и при следующем запуске выполнится первым
+                    self.queue.set_paused(True)
+                    raise
+                finally:
+                    self.current_job = None
+                self.queue.finish(job)
+        finally:
+            self.queue.release_runner()
+        return True
+
+    def expected_durations(self):
+        """Медианная длительность каждой операции по последним запускам, с"""
+        records = [entry for entry in self.telemetry.recent() if entry.get("kind") == "operation"]
+        return {row.operation: row.p50 for row in telemetry.summarize(records)}
+
+    def privileged_worker(self):
+        """Помощник с правами root (запускается при первой команде sudo) или None"""
+        if not self.get_option("privileged_worker"):
+            return None
+        with self._worker_lock:
+            if self.worker is not None and self.worker.alive:
+                return self.worker
+            if self._worker_failed:
+                return None
+            self.append_output("\n--- Запуск помощника с правами root ---\n")
+            try:
+                self.worker = privileged.PrivilegedWorker().start()
+            except (OSError, privileged.WorkerError) as e:
+                # Дальше каждая команда запускается через sudo как раньше
+                self._worker_failed = True
+                self.append_output(f"⚠ Помощник не запущен ({e}), команды пойдут через sudo\n")
+                return None
+            return self.worker
+
+    def close_worker(self):
+        """Завершить помощника с правами root"""
+        with self._worker_lock:
+            if self.worker is not None:
+                self.worker.close()
+                self.worker = None
+
+    def run_command(self, command, description, tag=None, step=None):
+        """Запустить команду (argv или строку оболочки) и показать вывод.
+
+        Команды с sudo выполняются помощником с правами root, если он
+        запущен. tag - метка шага, которой помечаются строки вывода при
+        параллельном выполнении нескольких шагов; step - имя шага для
+        телеметрии.
+        """
+        prefix = f"[{tag}] " if tag else ""
+        process = None
+        start = time.perf_counter()
+        out_lines = 0
+        # Фазы транзакции pacman и их скорости по прошлым запускам
+        tracker = transaction.TransactionTracker(self.telemetry.recent, self.update_transaction)
+
+        def on_text(text):
+            nonlocal out_lines
+            out_lines += text.count("\n")
+            tracker.feed_text(text)
+            if prefix:
+                text = "".join(f"{prefix}{line}\n" for line in text[:-1].split("\n"))
+            self.append_output(text)
+
+        def on_progress(progress):
+            self.update_progress(progress)
+            if progress is not None:
+                tracker.feed_progress(progress)
+
+        try:
+            self.append_output(f"\n--- {prefix}{description} ---\n")
+            self.update_status(f"Выполняется: {description}", "orange")
+
+            # Кадры полос прогресса не попадают в вывод, а становятся прогрессом
+            argv = privileged.privileged_argv(command)
+            worker = self.privileged_worker() if argv else None
+            if worker is not None:
+                output = OutputDecoder(on_text, on_progress)
+                result = worker.run(argv, output.feed)
+                output.close()
+                out_bytes = output.bytes
+                return_code = result.pop("code")
+                usage_fields = result
+            else:
+                # Вывод через псевдотерминал: в канал pacman не рисует полосы и (n/m)
+                master, slave = privileged.open_pty()
+                try:
+                    process = subprocess.Popen(
+                        command,
+                        shell=isinstance(command, str),
+                        stdout=slave,
+                        stderr=slave,
+                        preexec_fn=os.setsid
+                    )
+                except OSError:
+                    os.close(master)
+                    raise
+                finally:
+                    os.close(slave)
+                with self.process_lock:
+                    self.processes.add(process)
+                try:
+                    out_bytes = read_output(master, on_text, on_progress)
+                finally:
+                    os.close(master)
+                # wait4 дает rusage именно этого процесса, даже если шаги идут параллельно
+                usage = wait_with_usage(process)
+                return_code = process.returncode
+                usage_fields = child_usage(usage)
+
+            self.telemetry.record("step", operation=self.current_operation,
+                                  step=step or description,
+                                  wall_s=round(time.perf_counter() - start, 3),
+                                  exit_code=return_code, out_bytes=out_bytes,
+                                  out_lines=out_lines, **usage_fields)
+            timings = tracker.finish()
+            units = tracker.units()
+            for phase, seconds in timings.items():
+                self.telemetry.record("phase", operation=self.current_operation,
+                                      step=step or description, phase=phase,
+                                      wall_s=round(seconds, 3), units=units[phase])
+            if timings:
+                self.append_output(f"Фазы транзакции: {transaction.format_timings(timings)}\n")
+            if return_code == 0:
+                self.append_output(f"\n✓ {description} успешно завершено!\n")
+                self.update_status(f"✓ {description} завершено", "green")
+            else:
+                self.append_output(f"\n✗ {description} завершилось с ошибкой кода {return_code}\n")
+                self.update_status(f"✗ {description} не удалось", "red")
+            return return_code == 0
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка при выполнении {description}: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return False
+        finally:
+            self.update_progress(None)
+            if tracker.active:
+                tracker.finish()
+            self.update_transaction(None)
+            if process is not None:
+                with self.process_lock:
+                    self.processes.discard(process)
+
+    def run_steps(self, steps):
+        """Выполнить шаги операции, запуская неконфликтующие параллельно"""
+        tagged = len(steps) > 1
+
+        def run_step(step):
+            return self.run_command(step.command, step.description,
+                                    tag=step.name if tagged else None, step=step.name)
+
+        results = StepScheduler(run_step).run(steps, should_stop=lambda: not self.running)
+        return all(results.values())
+
+    def stats(self):
+        """Статистика длительности операций и шагов из истории телеметрии"""
+        return telemetry.summarize(self.telemetry.load())
+
+    def load_history(self):
+        """Индекс журнала pacman, дочитанный до конца файла"""
+        import history
+        with self._history_lock:
+            if self._history is None:
+                self._history = history.History(cache_file=cache_path("history.json"))
+            if self._history.update():
+                self._history.save()
+            return self._history
+
+    def downgrade_candidates(self, name):
+        """Версии пакета в кэше старше установленной: [(CachedPackage, когда была установлена)]"""
+        import history
+        graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+        package = graph.packages.get(name)
+        if package is None:
+            return []
+        cached = [p for (pkg_name, _), versions in pkgcache.scan_cache().items()
+                  if pkg_name == name for p in versions]
+        return history.downgrade_candidates(name, package.version, cached, self.load_history())
+
+    def find_broken_packages(self):
+        """Проверить целостность пакетов и вернуть описание проблем"""
+        import integrity
+        deep = self.get_option("deep_check")
+        reports = integrity.check_integrity(deep=deep, cache_file=cache_path("integrity.json"))
+        broken = [r for r in reports if not r.ok]
+        self.append_output(f"Проверено пакетов: {len(reports)}, с проблемами: {len(broken)}\n")
+        return integrity.format_problems(broken)
+
+    def find_orphans(self):
+        """Остаточные пакеты, включая ставшие остаточными рекурсивно"""
+        graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+        return graph.orphans()
+
+    def describe_orphans(self, orphans, limit=40):
+        """Список остаточных пакетов с размерами для диалога подтверждения"""
+        lines = [f"{p.name} {p.version} — {format_size(p.size)}" for p in orphans[:limit]]
+        if len(orphans) > limit:
+            lines.append(f"... и ещё {len(orphans) - limit}")
+        total = sum(p.size for p in orphans)
+        lines.append(f"\nВсего пакетов: {len(orphans)}, будет освобождено {format_size(total)}")
+        return "\n".join(lines)
+
+    def remove_orphans(self, orphans):
+        """Удалить остаточные пакеты одним вызовом pacman"""
+        step = self.orphans_step(orphans)
+        return self.run_command(step.command, step.description)
+
+    def orphans_step(self, orphans):
+        """Шаг удаления остаточных пакетов"""
+        return Step("orphans", ["sudo", "pacman", "-Rns", "--noconfirm"] + [p.name for p in orphans],
+                    "Удаление остаточных пакетов", resources={scheduler.PACMAN_DB})
+
+    def plan_cache_prune(self):
+        """Посчитать, что удалить из кэша пакетов, и показать отчет"""
+        self.append_output("\n--- Анализ кэша пакетов ---\n")
+        graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+        installed = {name: pkg.version for name, pkg in graph.packages.items()}
+        plan = pkgcache.plan_prune(pkgcache.scan_cache(), installed,
+                                   remove_uninstalled=self.get_option("prune_uninstalled"))
+        self.append_output("\n".join(plan.report()) + "\n")
+        return plan
+
+    def cache_prune_step(self, plan):
+        """Шаг удаления файлов из кэша по плану (одним вызовом) или None"""
+        if not plan.count:
+            return None
+        file_list = privileged.write_file_list(plan.files(), cache_path("prune.list"))
+        return Step("pkg-cache", privileged.bulk_remove_command(file_list),
+                    f"Очистка кэша пакетов (освободится {format_size(plan.total)})",
+                    resources={scheduler.PKG_CACHE})
+
+    def plan_yay_cache_prune(self):
+        """Проанализировать кэш сборок yay и посчитать, что удалить по политике"""
+        import aur
+        import yaycache
+        self.append_output("\n--- Анализ кэша сборок yay ---\n")
+        graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+        installed = {name: pkg.version for name, pkg in graph.packages.items()}
+        analysis = yaycache.analyze(aur.yay_cache_dir(), snapshot_file=cache_path("yaycache.json"))
+        plan = yaycache.plan_prune(analysis, installed)
+        self.append_output("\n".join(plan.report()) + "\n")
+        return plan
+
+    def yay_cache_step(self, plan):
+        """Шаг очистки кэша сборок yay по плану или None (кэш pacman чистит cache_prune_step)"""
+        import yaycache
+        if not plan.count:
+            return None
+        file_list = privileged.write_file_list(plan.files(), cache_path("yaycache.list"))
+        return Step("yay-cache", yaycache.remove_command(file_list, privileged.invoking_user()),
+                    f"Очистка кэша сборок yay (освободится {format_size(plan.total)})",
+                    resources={scheduler.YAY_CACHE})
+
+    def take_snapshot(self):
+        """Снимок перед изменением пакетов, если он включен.
+
+        Возвращает False, если снимок не удался и операцию продолжать нельзя.
+        """
+        if not self.get_option("snapshot"):
+            return True
+        import snapshot
+        self.append_output("\n--- Снимок перед изменениями ---\n")
+        graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+        installed = {name: (pkg.version, pkg.reason) for name, pkg in graph.packages.items()}
+        btrfs_dir = snapshot.BTRFS_DIR if snapshot.is_btrfs_subvolume("/") else None
+        plan, sources = snapshot.plan_snapshot(installed, pkgcache.scan_cache(), self.current_operation,
+                                               btrfs_dir=btrfs_dir)
+        file_list = privileged.write_file_list(sources, cache_path("snapshot.list"))
+        if not self.run_steps(snapshot.snapshot_steps(plan, file_list)):
+            self.append_output("\n✗ Не удалось создать снимок, изменения не выполняются\n")
+            self.update_status("✗ Снимок не создан", "red")
+            return False
+        expired = snapshot.SnapshotStore(cache_path("snapshots.json")).add(plan)
+        self.append_output(plan.describe() + "\n")
+        if expired:
+            dirs = snapshot.expired_dirs(expired)
+            if len(dirs) < len(expired):
+                self.append_output("⚠ В манифесте снимков есть пути вне каталога наборов отката, они не удаляются\n")
+            file_list = privileged.write_file_list(dirs, cache_path("snapshot-expire.list"))
+            # Старые снимки не мешают операции, даже если удалить их не вышло
+            self.run_steps(snapshot.expire_steps(expired, file_list))
+        return True
+
+    def log_cleanup_steps(self):
+        """Проанализировать логи и вернуть шаги их очистки"""
+        self.append_output("\n--- Анализ логов ---\n")
+        plan = logretention.plan_retention()
+        self.append_output("\n".join(plan.report()) + "\n")
+        steps = [
+            Step("journal", logretention.journal_vacuum_command(plan),
+                 f"Очистка журналов systemd (до {format_size(plan.journal_target)})",
+                 resources={scheduler.JOURNAL}),
+        ]
+        if plan.count:
+            file_list = privileged.write_file_list(plan.files(), cache_path("logs.list"))
+            steps.append(Step("logs", privileged.bulk_remove_command(file_list),
+                              f"Удаление старых файлов логов (освободится {format_size(plan.freed)})",
+                              resources={scheduler.LOGS}))
+        return steps
+
+    def rank_mirrors(self):
+        """Ранжировать зеркала из mirrorlist и вернуть путь к новому списку"""
+        import mirrors
+        self.append_output("\n--- Ранжирование зеркал ---\n")
+        self.update_status("Выполняется: Ранжирование зеркал", "orange")
+        servers = mirrors.read_mirrorlist()
+        if not servers:
+            raise RuntimeError(f"в {mirrors.MIRRORLIST} нет зеркал")
+        ranked, results, history = mirrors.rank_mirrors(servers, history_file=cache_path("mirrors.json"))
+        failed = sum(1 for r in results if not r.ok)
+        self.append_output(f"Опрошено зеркал: {len(results)} (недоступно: {failed}), "
+                           f"из истории: {len(servers) - len(results)}\n")
+        for server in ranked[:5]:
+            entry = history.mirrors.get(server, {})
+            if entry.get("throughput"):
+                self.append_output(f"  {server}: {entry['latency'] * 1000:.0f} мс, "
+                                   f"{format_size(entry['throughput'])}/с\n")
+        path = cache_path("mirrorlist.ranked")
+        mirrors.write_mirrorlist(path, ranked)
+        return path
+
+    def prefetch_packages(self):
+        """Заранее скачать обновления в кэш pacman параллельно с нескольких зеркал"""
+        import mirrors
+        import prefetch
+        if not self.run_command(["sudo", "pacman", "-Sy"], "Синхронизация баз пакетов"):
+            return
+        downloads = prefetch.resolve_downloads()
+        if not downloads:
+            self.append_output("Нечего предзагружать.\n")
+            return
+        history = mirrors.MirrorHistory(cache_path("mirrors.json"))
+        servers = sorted(mirrors.read_mirrorlist(), key=history.score)[:prefetch.DEFAULT_MIRRORS]
+        total = sum(d.size for d in downloads)
+        self.append_output(f"\n--- Предзагрузка {len(downloads)} пакетов ({format_size(total)}) "
+                           f"с {len(servers)} зеркал ---\n")
+        self.update_status("Выполняется: Предзагрузка пакетов", "orange")
+
+        def progress(stats, download):
+            mark = "✓" if download in stats.done else "✗"
+            self.append_output(f"  {mark} {download.filename} "
+                               f"({format_size(stats.throughput)}/с)\n")
+
+        staging = cache_path("prefetch")
+        stats = prefetch.prefetch(downloads, servers, staging, should_stop=lambda: not self.running,
+                                  progress=progress)
+        self.append_output(f"Скачано {format_size(stats.bytes)} за {stats.elapsed:.1f} с "
+                           f"({format_size(stats.throughput)}/с); уже в кэше: {len(stats.cached)}, "
+                           f"ошибок: {len(stats.failed)}\n")
+        for server, count in sorted(stats.per_mirror.items(), key=lambda item: -item[1]):
+            self.append_output(f"  {server}: {format_size(count)}\n")
+        # Кэш pacman принадлежит root: скачанное переносит помощник
+        staged = prefetch.staged_files(staging, downloads)
+        if staged:
+            file_list = privileged.write_file_list(staged, cache_path("prefetch.list"))
+            if self.run_command(privileged.verb_command("add-to-cache", file_list),
+                                f"Перенос {len(staged)} пакетов в кэш pacman", step="prefetch-cache"):
+                for path in staged:
+                    os.unlink(path)
+
+    def update_mirrors(self):
+        """Обновить зеркала"""
+        import mirrors
+        try:
+            ranked = self.rank_mirrors()
+            steps = [
+                Step("mirrorlist", privileged.verb_command("install-mirrorlist", ranked, mirrors.MIRRORLIST),
+                     "Установка списка зеркал", resources={scheduler.MIRRORLIST}),
+                Step("sync", ["sudo", "pacman", "-Syy"], "Синхронизация баз пакетов",
+                     resources={scheduler.PACMAN_DB, scheduler.NETWORK}, after=["mirrorlist"]),
+            ]
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Обновление зеркал успешно завершено!\n")
+                self.update_status("✓ Обновление зеркал завершено", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Обновление зеркал отменено\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def preview_updates(self):
+        """Показать, что обновится и сколько будет скачано, не меняя систему"""
+        import mirrors
+        import updates
+        try:
+            self.append_output("\n--- Проверка доступных обновлений ---\n")
+            self.update_status("Выполняется: Проверка обновлений", "orange")
+            history = mirrors.MirrorHistory(cache_path("mirrors.json"))
+            servers = sorted(mirrors.read_mirrorlist(), key=history.score)
+            graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+            preview = updates.preview_updates(graph.packages, cache_path("syncdb"), servers,
+                                              cache_file=cache_path("syncdb.json"))
+            self.append_output("\n".join(preview.report(format_size)) + "\n")
+            if preview.errors and not preview.updates:
+                self.update_status("✗ Не удалось получить базы репозиториев", "red")
+                return RESULT_FAILED
+            if preview.updates:
+                self.update_status(f"✓ Доступно обновлений: {len(preview.updates)} "
+                                   f"({format_size(preview.download_size)})", "green")
+            else:
+                self.update_status("✓ Система обновлена", "green")
+            return RESULT_OK
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def full_update(self):
+        """Полное обновление системы"""
+        try:
+            if self.get_option("prefetch"):
+                try:
+                    self.prefetch_packages()
+                except Exception as e:
+                    # Без предзагрузки pacman скачает пакеты сам
+                    self.append_output(f"\n⚠ Предзагрузка не удалась: {str(e)}\n")
+            if not self.take_snapshot():
+                return RESULT_FAILED
+            steps = [
+                Step("update", ["sudo", "pacman", "-Syu", "--noconfirm"], "Полное обновление системы",
+                     resources={scheduler.PACMAN_DB, scheduler.PKG_CACHE, scheduler.NETWORK}),
+            ]
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Полное обновление системы успешно завершено!\n")
+                self.update_status("✓ Полное обновление завершено", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Полное обновление отменено\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def yay_update(self):
+        """Обновление через yay"""
+        if self.get_option("aur_parallel"):
+            return self.aur_parallel_update()
+        try:
+            steps = [
+                Step("aur", ["yay", "-Syu", "--noconfirm"], "Обновление пакетов AUR",
+                     resources={scheduler.PACMAN_DB, scheduler.PKG_CACHE,
+                                scheduler.YAY_CACHE, scheduler.NETWORK}),
+            ]
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Обновление пакетов AUR успешно завершено!\n")
+                self.update_status("✓ Обновление AUR завершено", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Обновление AUR отменено\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def aur_parallel_update(self):
+        """Обновление пакетов AUR параллельными сборками (только AUR, без репозиториев)"""
+        import aur
+        import updates
+        try:
+            self.append_output("\n--- Поиск обновлений AUR ---\n")
+            graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+            repos, ignored = updates.read_pacman_conf(updates.PACMAN_CONF)
+            foreign, provided, missing = aur.foreign_packages(graph.packages, repos,
+                                                    updates.SyncCache(cache_path("localsync.json")),
+                                                    aur.SYNC_DB_DIR)
+            for repo in missing:
+                self.append_output(f"⚠ Нет базы репозитория {repo}, выполните обновление зеркал\n")
+            info = aur.query_info(foreign, aur.AUR_RPC)
+            builds, unknown = aur.plan_builds(foreign, info, ignored, graph.providers, provided,
+                                              lambda names: aur.query_info(names, aur.AUR_RPC))
+            self.append_output(f"Сторонних пакетов: {len(foreign)}, из них нет в AUR: {len(unknown)}\n")
+            if not builds:
+                self.append_output("✓ Пакеты AUR в актуальном состоянии.\n")
+                self.update_status("✓ Обновлений AUR нет", "green")
+                return RESULT_OK
+            parallel, jobs = aur.build_budget(len(builds))
+            self.append_output(f"Сборок: {len(builds)}, одновременно: {parallel}, MAKEFLAGS=-j{jobs}\n")
+            for build in builds:
+                after = f" (после {', '.join(sorted(build.after))})" if build.after else ""
+                deps = f", из репозиториев: {', '.join(sorted(build.repo_deps))}" if build.repo_deps else ""
+                new = " [новая зависимость]" if build.asdeps else ""
+                self.append_output(f"  {build.base} {build.version}{new}{after}{deps}\n")
+
+            user = aur.build_user()
+            cache_dir = aur.yay_cache_dir()
+            by_base = {build.base: build for build in builds}
+            started = {}
+            times = {}
+
+            def run_step(step):
+                kind, base = step.name.split(":", 1)
+                command = step.command
+                if kind == "install":
+                    directory = os.path.join(cache_dir, base)
+                    files = aur.built_packages(directory, set(by_base[base].packages), started[base])
+                    if not files:
+                        self.append_output(f"\n✗ [{step.name}] собранные пакеты не найдены в {directory}\n")
+                        return False
+                    command = command + files
+                start = time.perf_counter()
+                if kind == "build":
+                    started[base] = time.time()
+                ok = self.run_command(command, step.description, tag=step.name, step=step.name)
+                if kind == "build" and ok:
+                    times[base] = time.perf_counter() - start
+                return ok
+
+            start = time.perf_counter()
+            steps = aur.build_steps(builds, cache_dir, jobs, aur.AUR_GIT, user)
+            results = StepScheduler(run_step, limits={scheduler.BUILD: parallel}).run(
+                steps, should_stop=lambda: not self.running)
+            wall = time.perf_counter() - start
+            if times:
+                self.append_output("\nВремя сборки:\n")
+                for line in aur.format_build_times(times, wall):
+                    self.append_output(line + "\n")
+            failed = [build.base for build in builds if not results.get(f"install:{build.base}")]
+            if not self.running:
+                self.append_output("\n⚠ Обновление AUR отменено\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            if failed:
+                self.append_output(f"\n✗ Не обновлены: {', '.join(failed)}\n")
+                self.update_status(f"✗ Обновление AUR: ошибок {len(failed)}", "red")
+                return RESULT_FAILED
+            self.append_output("\n✓ Обновление пакетов AUR успешно завершено!\n")
+            self.update_status("✓ Обновление AUR завершено", "green")
+            return RESULT_OK
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def check_dependencies(self):
+        """Проверка зависимостей"""
+        try:
+            self.append_output("\n--- Проверка целостности пакетов ---\n")
+            broken = self.find_broken_packages()
+            if broken:
+                self.append_output(f"Обнаружены проблемы:\n{broken}\n")
+                self.update_status("✗ Обнаружены проблемы с пакетами", "red")
+                return RESULT_FAILED
+            self.append_output("✓ Нет проблем с целостностью пакетов.\n")
+            self.update_status("✓ Проверка зависимостей: всё в порядке", "green")
+            return RESULT_OK
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def fix_dependencies(self):
+        """Проверка и исправление реальных проблем с зависимостями"""
+        try:
+            self.append_output("\n--- Поиск проблем с пакетами ---\n")
+            
+            # Проверяем только реально сломанные файлы
+            broken_output = self.find_broken_packages()
+
+            if not broken_output:
+                self.append_output("✓ Нет проблем с пакетами — исправление не требуется.\n")
+                self.update_status("✓ Нет проблем с зависимостями", "green")
+                return RESULT_OK
+
+            self.append_output(f"Обнаружены проблемы:\n{broken_output}\n")
+            if not self.confirm("Подтверждение", "Обнаружены проблемы с пакетами. Выполнить обновление системы для исправления?"):
+                self.append_output("⚠ Исправление отменено пользователем.\n")
+                self.update_status("⚠ Отменено пользователем", "orange")
+                return RESULT_DECLINED
+
+            if not self.take_snapshot():
+                return RESULT_FAILED
+
+            # Шаг 1: Обновление системы
+            if not self.run_command(["sudo", "pacman", "-Syu", "--noconfirm"], "Обновление системы"):
+                self.append_output("✗ Не удалось обновить систему.\n")
+                self.update_status("✗ Обновление не удалось", "red")
+                return RESULT_FAILED
+
+            # Шаг 2: Повторная проверка
+            self.append_output("\n--- Повторная проверка после обновления ---\n")
+            result = RESULT_OK
+            if self.find_broken_packages():
+                self.append_output("⚠ Некоторые проблемы остались. Рекомендуется ручное вмешательство.\n")
+                self.update_status("⚠ Остались проблемы", "red")
+                result = RESULT_FAILED
+            else:
+                self.append_output("✓ Все проблемы с пакетами исправлены.\n")
+                self.update_status("✓ Зависимости исправлены", "green")
+
+            # Шаг 3: Удаление остаточных пакетов (по желанию)
+            orphans = self.find_orphans()
+            if orphans:
+                if self.confirm("Остаточные пакеты", f"Найдено {len(orphans)} остаточных пакетов. Удалить?\n\n{self.describe_orphans(orphans)}"):
+                    self.remove_orphans(orphans)
+                else:
+                    self.append_output("✓ Остаточные пакеты не удалены.\n")
+            else:
+                self.append_output("✓ Остаточных пакетов не найдено.\n")
+
+            self.append_output("\n✓ Проверка и исправление завершены.\n")
+            return result
+
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def clean_packages(self):
+        """Очистка кэша пакетов"""
+        try:
+            plan = self.plan_cache_prune()
+            yay_plan = self.plan_yay_cache_prune()
+            if (plan.count or yay_plan.count) and not self.confirm(
+                    "Подтверждение",
+                    f"Удалить {plan.count} файлов из кэша пакетов и освободить {format_size(plan.total)}?"
+                    f"\nКэш сборок yay: удаляется {yay_plan.count} элементов, "
+                    f"освободится {format_size(yay_plan.total)}"):
+                self.append_output("\n⚠ Очистка кэша отменена пользователем.\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_DECLINED
+            steps = [step for step in (self.cache_prune_step(plan), self.yay_cache_step(yay_plan)) if step]
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Очистка кэша пакетов завершена!\n")
+                self.update_status("✓ Очистка кэша завершена", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Очистка кэша отменена\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def clean_orphans(self):
+        """Удаление остаточных пакетов"""
+        try:
+            orphans = self.find_orphans()
+            if not orphans:
+                self.append_output("\n✓ Остаточных пакетов не найдено.\n")
+                self.update_status("✓ Нет остаточных пакетов", "green")
+                return RESULT_OK
+
+            if not self.confirm("Подтверждение", f"Удалить следующие остаточные пакеты?\n\n{self.describe_orphans(orphans)}"):
+                self.append_output("\n⚠ Удаление остаточных пакетов отменено пользователем.\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_DECLINED
+            return RESULT_OK if self.remove_orphans(orphans) else RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def clean_logs(self):
+        """Очистка логов"""
+        try:
+            steps = self.log_cleanup_steps()
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Очистка логов завершена!\n")
+                self.update_status("✓ Очистка логов завершена", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Очистка логов отменена\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def full_clean(self):
+        """Полная очистка системы"""
+        try:
+            orphans = self.find_orphans()
+            total = format_size(sum(p.size for p in orphans))
+            plan = self.plan_cache_prune()
+            yay_plan = self.plan_yay_cache_prune()
+            if not self.confirm("Подтверждение", "Выполнить полную очистку системы?\nБудет очищен кэш, логи и удалены остаточные пакеты."
+                                f"\n\nОстаточных пакетов: {len(orphans)} ({total})"
+                                f"\nФайлов в кэше пакетов: {plan.count} ({format_size(plan.total)})"
+                                f"\nКэш сборок yay: освободится {format_size(yay_plan.total)}"):
+                self.append_output("\n⚠ Полная очистка отменена пользователем.\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_DECLINED
+
+            if not self.take_snapshot():
+                return RESULT_FAILED
+            self.append_output("\n=== ПОЛНАЯ ОЧИСТКА СИСТЕМЫ ===\n")
+            steps = [self.cache_prune_step(plan), self.yay_cache_step(yay_plan)]
+            if orphans:
+                steps.append(self.orphans_step(orphans))
+            steps = [step for step in steps if step] + self.log_cleanup_steps()
+            success = self.run_steps(steps)
+            if success and self.running:
+                self.append_output("\n✓ Полная очистка системы завершена!\n")
+                self.update_status("✓ Полная очистка завершена", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Полная очистка отменена\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def rollback(self):
+        """Вернуть пакеты к набору последнего снимка"""
+        import snapshot
+        try:
+            self.append_output("\n--- Откат к снимку ---\n")
+            latest = snapshot.SnapshotStore(cache_path("snapshots.json")).latest()
+            if latest is None:
+                self.append_output("Снимков нет: включите снимок перед изменениями.\n")
+                self.update_status("⚠ Нет снимков для отката", "orange")
+                return RESULT_FAILED
+            graph = pkgdb.load_graph(cache_file=cache_path("depgraph.json"))
+            plan = snapshot.plan_rollback(latest, {name: pkg.version for name, pkg in graph.packages.items()})
+            report = "\n".join(plan.report())
+            self.append_output(report + "\n")
+            if not plan.count:
+                self.update_status("✓ Пакеты совпадают со снимком", "green")
+                return RESULT_OK
+            if not self.confirm("Подтверждение", f"Откатить пакеты к снимку?\n\n{report}"):
+                self.append_output("\n⚠ Откат отменен пользователем.\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_DECLINED
+            success = self.run_steps(snapshot.rollback_steps(plan))
+            if success and self.running:
+                self.append_output("\n✓ Откат к снимку завершен!\n")
+                self.update_status("✓ Откат завершен", "green")
+                return RESULT_OK
+            elif not self.running:
+                self.append_output("\n⚠ Откат отменен\n")
+                self.update_status("⚠ Отменено", "orange")
+                return RESULT_CANCELLED
+            return RESULT_FAILED
+        except Exception as e:
+            self.append_output(f"\n✗ Ошибка: {str(e)}\n")
+            self.update_status(f"✗ Ошибка: {str(e)}", "red")
+            return RESULT_FAILED
+
+    def stop_process(self):
+        """Остановить все выполняющиеся процессы"""
+        with self.process_lock:
+            processes = list(self.processes)
+        for process in processes:
+            try:
+                os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+            except Exception as e:
+                self.append_output(f"\n⚠ Не удалось остановить процесс: {e}\n")
+        worker = self.worker
+        if worker is not None and worker.jobs:
+            worker.cancel_all()
+            processes.append(worker)
+        if processes:
+            self.append_output("\n⚠ Процесс остановлен пользователем\n")
+            self.update_status("⚠ Остановлено пользователем", "red")
+        if self.current_job is not None:
+            # Следующие задания не начинаются сами после остановки
+            self.queue.set_paused(True)
+            self.append_output("\n⚠ Очередь приостановлена\n")
+        self.running = False
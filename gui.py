@@ -0,0 +1,465 @@
+"""Графический интерфейс менеджера системы на tkinter"""
+import tkinter as tk
+from tkinter import ttk, scrolledtext, messagebox
+import queue
+import threading
+import time
+
+from console import trim_text_widget
+from core import OPERATIONS, SystemManager
+from jobqueue import RUNNING, estimate, format_eta
+
+# Период опроса очереди вывода, мс
+OUTPUT_POLL_MS = 50
+# Период обновления списка очереди и оценок времени, мс
+QUEUE_POLL_MS = 1000
+
+class ManjaroUpdater(SystemManager):
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        self.root.title("Менеджер системы Manjaro")
+        self.root.geometry("1000x750")
+        self.root.resizable(True, True)
+        
+        # Создаем основной фрейм
+        main_frame = ttk.Frame(root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Заголовок
+        title_label = ttk.Label(main_frame, text="Менеджер системы Manjaro", 
+                               font=("Arial", 16, "bold"))
+        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 15))
+        
+        # Прогресс бар
+        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
+        self.progress.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # Кнопки - первая колонка
+        col1_frame = ttk.LabelFrame(main_frame, text="Обновление системы", padding="5")
+        col1_frame.grid(row=2, column=0, padx=(0, 5), sticky=(tk.N, tk.W, tk.E))
+        self.mirror_btn = ttk.Button(col1_frame, text="Обновить зеркала", 
+                                    command=lambda: self.start_operation("update_mirrors"), width=20)
+        self.mirror_btn.pack(pady=2)
+        self.preview_btn = ttk.Button(col1_frame, text="Показать обновления",
+                                     command=lambda: self.start_operation("preview_updates"), width=20)
+        self.preview_btn.pack(pady=2)
+        self.update_btn = ttk.Button(col1_frame, text="Полное обновление системы", 
+                                    command=lambda: self.start_operation("full_update"), width=20)
+        self.update_btn.pack(pady=2)
+        self.option_vars = {name: tk.BooleanVar(value=value)
+                            for name, value in self.options.items()}
+        ttk.Checkbutton(col1_frame, text="Предзагрузка с нескольких зеркал",
+                        variable=self.option_vars["prefetch"]).pack(pady=2)
+        ttk.Checkbutton(col1_frame, text="Снимок перед изменениями",
+                        variable=self.option_vars["snapshot"]).pack(pady=2)
+        self.rollback_btn = ttk.Button(col1_frame, text="Откатить к снимку",
+                                      command=lambda: self.start_operation("rollback"), width=20)
+        self.rollback_btn.pack(pady=2)
+        self.yay_update_btn = ttk.Button(col1_frame, text="Обновить пакеты AUR", 
+                                        command=lambda: self.start_operation("yay_update"), width=20)
+        self.yay_update_btn.pack(pady=2)
+        ttk.Checkbutton(col1_frame, text="Параллельная сборка AUR",
+                        variable=self.option_vars["aur_parallel"]).pack(pady=2)
+        
+        # Кнопки - вторая колонка
+        col2_frame = ttk.LabelFrame(main_frame, text="Поддержка системы", padding="5")
+        col2_frame.grid(row=2, column=1, padx=(5, 5), sticky=(tk.N, tk.W, tk.E))
+        self.check_deps_btn = ttk.Button(col2_frame, text="Проверить зависимости", 
+                                        command=lambda: self.start_operation("check_dependencies"), width=20)
+        self.check_deps_btn.pack(pady=2)
+        ttk.Checkbutton(col2_frame, text="Проверять SHA-256",
+                        variable=self.option_vars["deep_check"]).pack(pady=2)
+        self.fix_deps_btn = ttk.Button(col2_frame, text="Исправить зависимости", 
+                                      command=lambda: self.start_operation("fix_dependencies"), width=20)
+        self.fix_deps_btn.pack(pady=2)
+        self.clean_btn = ttk.Button(col2_frame, text="Очистить кэш пакетов", 
+                                   command=lambda: self.start_operation("clean_packages"), width=20)
+        self.clean_btn.pack(pady=2)
+        ttk.Checkbutton(col2_frame, text="Удалять неустановленные",
+                        variable=self.option_vars["prune_uninstalled"]).pack(pady=2)
+        
+        # Кнопки - третья колонка
+        col3_frame = ttk.LabelFrame(main_frame, text="Очистка системы", padding="5")
+        col3_frame.grid(row=2, column=2, padx=(5, 0), sticky=(tk.N, tk.W, tk.E))
+        self.clean_orphans_btn = ttk.Button(col3_frame, text="Удалить остаточные пакеты", 
+                                           command=lambda: self.start_operation("clean_orphans"), width=20)
+        self.clean_orphans_btn.pack(pady=2)
+        self.clean_logs_btn = ttk.Button(col3_frame, text="Очистить логи", 
+                                        command=lambda: self.start_operation("clean_logs"), width=20)
+        self.clean_logs_btn.pack(pady=2)
+        self.full_clean_btn = ttk.Button(col3_frame, text="Полная очистка системы", 
+                                        command=lambda: self.start_operation("full_clean"), width=20)
+        self.full_clean_btn.pack(pady=2)
+        self.stats_btn = ttk.Button(col3_frame, text="Статистика",
+                                   command=self.show_stats, width=20)
+        self.stats_btn.pack(pady=2)
+        self.history_btn = ttk.Button(col3_frame, text="История",
+                                     command=self.show_history, width=20)
+        self.history_btn.pack(pady=2)
+        
+        # Очередь операций
+        queue_frame = ttk.LabelFrame(main_frame, text="Очередь", padding="5")
+        queue_frame.grid(row=3, column=0, columnspan=3, pady=(10, 0), sticky=(tk.W, tk.E))
+        self.queue_list = tk.Listbox(queue_frame, height=4)
+        self.queue_list.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        queue_buttons = ttk.Frame(queue_frame)
+        queue_buttons.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(queue_buttons, text="Убрать", command=self.remove_queued, width=14).pack(pady=1)
+        ttk.Button(queue_buttons, text="Очистить", command=self.clear_queue, width=14).pack(pady=1)
+        self.pause_btn = ttk.Button(queue_buttons, text="Пауза", command=self.toggle_queue_pause, width=14)
+        self.pause_btn.pack(pady=1)
+
+        # Стоп кнопка
+        self.stop_btn = ttk.Button(main_frame, text="Остановить текущую операцию", 
+                                  command=self.stop_process, state=tk.DISABLED)
+        self.stop_btn.grid(row=4, column=0, columnspan=3, pady=(10, 10), sticky=(tk.W, tk.E))
+        
+        # Текстовое поле для вывода
+        self.output_text = scrolledtext.ScrolledText(main_frame, height=20, width=100)
+        self.output_text.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Статусная строка
+        self.status_label = ttk.Label(main_frame, text="Готово", foreground="blue")
+        self.status_label.grid(row=6, column=0, columnspan=3, pady=(10, 0))
+        
+        # Настройка растягивания
+        root.columnconfigure(0, weight=1)
+        root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.columnconfigure(2, weight=1)
+        main_frame.rowconfigure(5, weight=1)
+
+        # Окно забирает вывод, статус и прогресс по таймеру: виджеты Tk
+        # трогает только главный поток, рабочие потоки меняют состояние
+        # и ставят вызовы в main_calls
+        self.main_calls = queue.SimpleQueue()
+        self.shown_running = False
+        self.shown_state = None
+        self.root.after(OUTPUT_POLL_MS, self.flush_output)
+
+        # Очередь с прошлого запуска восстанавливается на паузе
+        self.queue_runner = None
+        self.queue_paused = False
+        self.queue_jobs = []
+        self.durations = self.expected_durations()
+        restored = self.queue.restore()
+        if restored:
+            jobs, paused = restored
+            self.append_output(f"\nℹ Восстановлена очередь: {len(jobs)} заданий (на паузе)\n")
+            if not paused:
+                self.root.after(0, self.ask_resume_queue, jobs)
+        self.root.after(0, self.refresh_queue)
+
+    def post(self, func, *args):
+        """Выполнить func в главном потоке при следующем опросе (из любого потока)"""
+        self.main_calls.put((func, args, None))
+
+    def call_in_main(self, func, *args):
+        """Выполнить func в главном потоке и дождаться результата"""
+        if threading.current_thread() is threading.main_thread():
+            return func(*args)
+        done = threading.Event()
+        result = []
+        self.main_calls.put((lambda: result.append(func(*args)), (), done))
+        done.wait()
+        return result[0]
+
+    def run_main_calls(self):
+        while True:
+            try:
+                func, args, done = self.main_calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(*args)
+            finally:
+                if done is not None:
+                    done.set()
+
+    def flush_output(self):
+        """Перенести накопленный вывод, статус и прогресс в окно пачкой"""
+        self.run_main_calls()
+        text = self.output.drain()
+        if text:
+            self.output_text.insert(tk.END, text)
+            trim_text_widget(self.output_text, self.output.max_lines)
+            self.output_text.see(tk.END)
+        self.show_state()
+        delay = 1 if self.output.pending() else OUTPUT_POLL_MS
+        self.root.after(delay, self.flush_output)
+
+    def show_state(self):
+        """Показать состояние операции: кнопку остановки, статус и прогресс.
+
+        Прогресс - общий по фазам транзакции, проценты команды или
+        анимация, если проценты неизвестны.
+        """
+        running = self.running
+        if running != self.shown_running:
+            self.stop_btn.config(state=tk.NORMAL if running else tk.DISABLED)
+            self.progress.stop()
+            self.progress.config(mode='indeterminate', value=0)
+            if running:
+                self.progress.start(10)
+            self.shown_running = running
+            self.shown_state = None
+        state = (self.status,
+                 self.progress_state if running else None,
+                 self.transaction_state if running else None)
+        if state == self.shown_state:
+            return
+        (text, color), progress, transaction = state
+        determinate = progress is not None or transaction is not None
+        if determinate != (str(self.progress.cget("mode")) == "determinate"):
+            self.progress.stop()
+            if determinate:
+                self.progress.config(mode='determinate', maximum=100)
+            else:
+                self.progress.config(mode='indeterminate', value=0)
+                self.progress.start(10)
+        if transaction is not None:
+            text = f"{text} — {transaction}"
+            if transaction.eta is not None:
+                at_least = "не меньше " if transaction.eta_partial else ""
+                text += f", осталось {at_least}{format_eta(transaction.eta)}"
+            self.progress.config(value=transaction.percent)
+        elif progress is not None:
+            text = f"{text} — {progress}"
+            self.progress.config(value=progress.percent)
+        self.status_label.config(text=text, foreground=color)
+        self.shown_state = state
+
+    def refresh_queue(self):
+        """Показать очередь с оценкой времени и запустить исполнителя, если нужно"""
+        jobs, paused = self.queue.snapshot()
+        self.queue_paused = paused
+        lines = []
+        position = 0
+        for job, finish_in in estimate(jobs, self.durations):
+            title = OPERATIONS.get(job.operation, job.operation)
+            if job.state == RUNNING:
+                lines.append(f"▶ {title} — осталось {format_eta(finish_in)}")
+            else:
+                position += 1
+                lines.append(f"{position}. {title} — завершится через {format_eta(finish_in)}")
+        if paused and jobs:
+            lines.append("⏸ Очередь приостановлена")
+        if list(self.queue_list.get(0, tk.END)) != lines:
+            selection = self.queue_list.curselection()
+            self.queue_list.delete(0, tk.END)
+            for line in lines:
+                self.queue_list.insert(tk.END, line)
+            for index in selection:
+                if index < len(lines):
+                    self.queue_list.selection_set(index)
+        self.queue_jobs = jobs
+        self.pause_btn.config(text="Продолжить" if paused else "Пауза")
+        if jobs and not paused:
+            self.start_queue_runner()
+        self.root.after(QUEUE_POLL_MS, self.refresh_queue)
+
+    def ask_resume_queue(self, jobs):
+        """Спросить, выполнять ли очередь, оставшуюся с прошлого запуска"""
+        titles = ", ".join(OPERATIONS.get(job.operation, job.operation) for job in jobs)
+        if messagebox.askyesno("Очередь операций",
+                               f"С прошлого запуска осталось заданий: {len(jobs)} ({titles}).\n"
+                               "Выполнить их сейчас?"):
+            self.queue.set_paused(False)
+        else:
+            self.append_output("ℹ Очередь оставлена на паузе: «Продолжить» запустит ее, «Очистить» - снимет\n")
+
+    def start_queue_runner(self):
+        """Запустить поток исполнителя, если очередь не выполняется"""
+        if self.queue_runner is None and self.queue.claim_runner():
+            # Очередь не выполняет другой процесс (--run-queue); блокировку возьмет run_queue
+            self.queue.release_runner()
+            self.queue_runner = threading.Thread(target=self.queue_loop, daemon=True)
+            self.queue_runner.start()
+
+    def queue_loop(self):
+        """Поток исполнителя очереди"""
+        try:
+            self.run_queue()
+        finally:
+            self.queue_runner = None
+            self.durations = self.expected_durations()
+
+    def remove_queued(self):
+        """Снять выбранное задание (выполняющееся останавливается кнопкой «Остановить»)"""
+        for index in self.queue_list.curselection():
+            if index < len(self.queue_jobs):
+                job = self.queue_jobs[index]
+                if job.state != RUNNING and self.queue.remove(job.id):
+                    self.append_output(f"\nℹ {OPERATIONS.get(job.operation, job.operation)}: снято с очереди\n")
+        self.root.after(0, self.refresh_queue)
+
+    def clear_queue(self):
+        count = self.queue.clear()
+        if count:
+            self.append_output(f"\nℹ Снято с очереди заданий: {count}\n")
+
+    def toggle_queue_pause(self):
+        self.queue.set_paused(not self.queue_paused)
+
+    def show_stats(self):
+        """Показать статистику длительности операций и шагов"""
+        rows = self.stats()
+        window = tk.Toplevel(self.root)
+        window.title("Статистика операций")
+        window.geometry("700x400")
+        columns = ("count", "p50", "p95", "last", "trend")
+        tree = ttk.Treeview(window, columns=columns)
+        tree.heading("#0", text="Операция / шаг")
+        for column, title in zip(columns, ("Запусков", "p50, с", "p95, с", "Последний, с", "Тренд")):
+            tree.heading(column, text=title)
+            tree.column(column, width=90, anchor=tk.E)
+        parents = {}
+        for row in rows:
+            trend = "" if row.trend is None else f"{row.trend:+.0%}"
+            values = (row.count, f"{row.p50:.1f}", f"{row.p95:.1f}", f"{row.last:.1f}", trend)
+            if row.step is None:
+                parents[row.operation] = tree.insert("", tk.END, text=row.operation,
+                                                     values=values, open=True)
+            else:
+                parent = parents.get(row.operation, "")
+                tree.insert(parent, tk.END, text=row.step, values=values)
+        tree.pack(fill=tk.BOTH, expand=True)
+        if not rows:
+            self.append_output("\nИстория замеров пока пуста\n")
+
+    def show_history(self):
+        """Окно истории: транзакции pacman и история отдельного пакета"""
+        window = tk.Toplevel(self.root)
+        window.title("История pacman")
+        window.geometry("850x500")
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        # Вкладка транзакций
+        tx_frame = ttk.Frame(notebook, padding="5")
+        notebook.add(tx_frame, text="Транзакции")
+        columns = ("time", "changes", "duration", "result")
+        tx_tree = ttk.Treeview(tx_frame, columns=columns, height=12)
+        tx_tree.heading("#0", text="Команда")
+        for column, title in zip(columns, ("Время", "Пакетов", "Длительность, с", "Итог")):
+            tx_tree.heading(column, text=title)
+            tx_tree.column(column, width=110, anchor=tk.E)
+        tx_tree.pack(fill=tk.BOTH, expand=True)
+        tx_details = scrolledtext.ScrolledText(tx_frame, height=8)
+        tx_details.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        # Вкладка пакета
+        pkg_frame = ttk.Frame(notebook, padding="5")
+        notebook.add(pkg_frame, text="Пакет")
+        search = ttk.Frame(pkg_frame)
+        search.pack(fill=tk.X)
+        package_var = tk.StringVar()
+        entry = ttk.Entry(search, textvariable=package_var, width=40)
+        entry.pack(side=tk.LEFT)
+        pkg_text = scrolledtext.ScrolledText(pkg_frame, height=20)
+        pkg_text.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        state = {"history": None, "transactions": {}}
+
+        def stamp(ts):
+            return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+        def fill(history):
+            state["history"] = history
+            for transaction in history.recent(200):
+                item = tx_tree.insert("", tk.END, text=transaction.command or "",
+                                      values=(stamp(transaction.start_ts), transaction.count,
+                                              transaction.duration, transaction.result or ""))
+                state["transactions"][item] = transaction
+            last = history.last_sysupgrade()
+            if last is not None:
+                tx_details.insert(tk.END, f"Последнее полное обновление: {stamp(last.start_ts)}, "
+                                          f"пакетов: {last.count}, {last.duration} с\n")
+
+        def failed(error):
+            tx_details.insert(tk.END, f"Не удалось прочитать журнал pacman: {error}\n")
+
+        def load():
+            # Первый разбор большого журнала может занять секунды
+            try:
+                history = self.load_history()
+            except OSError as e:
+                self.post(failed, e)
+                return
+            self.post(fill, history)
+
+        def on_select(event):
+            transaction = state["transactions"].get(tx_tree.focus())
+            if transaction is None:
+                return
+            tx_details.delete("1.0", tk.END)
+            for change in state["history"].changes(transaction):
+                tx_details.insert(tk.END, f"{change}\n")
+
+        def lookup(event=None):
+            name = package_var.get().strip()
+            history = state["history"]
+            pkg_text.delete("1.0", tk.END)
+            if not name or history is None:
+                return
+            last = history.last_change(name)
+            if last is None:
+                pkg_text.insert(tk.END, f"В журнале нет записей о {name}\n")
+            else:
+                pkg_text.insert(tk.END, f"Последнее изменение: {stamp(last[0].start_ts)}  {last[1]}\n\n")
+            for transaction, change in history.package_history(name):
+                pkg_text.insert(tk.END, f"{stamp(transaction.start_ts)}  {change}\n")
+            try:
+                candidates = self.downgrade_candidates(name)
+            except OSError as e:
+                pkg_text.insert(tk.END, f"\n⚠ Не удалось прочитать кэш пакетов: {e}\n")
+                return
+            if candidates:
+                pkg_text.insert(tk.END, "\nВерсии в кэше для отката:\n")
+                for cached, installed_at in candidates:
+                    when = f", установлена {stamp(installed_at)}" if installed_at else ""
+                    pkg_text.insert(tk.END, f"  {cached.version}{when}\n    sudo pacman -U {cached.path}\n")
+
+        tx_tree.bind("<<TreeviewSelect>>", on_select)
+        entry.bind("<Return>", lookup)
+        ttk.Button(search, text="Найти", command=lookup).pack(side=tk.LEFT, padx=(5, 0))
+        threading.Thread(target=load, daemon=True).start()
+
+    def confirm(self, title, message):
+        """Спросить подтверждение в диалоге (в главном потоке)"""
+        return self.call_in_main(messagebox.askyesno, title, message)
+
+    def get_option(self, name):
+        """Значение настройки из задания очереди или из флажков окна"""
+        job = self.current_job
+        if job is not None and name in job.options:
+            return job.options[name]
+        return self.option_vars[name].get()
+
+    def operation_finished(self):
+        super().operation_finished()
+        self.update_status("Готово")
+
+    def start_operation(self, name):
+        """Поставить операцию в очередь; ее выполнит поток исполнителя"""
+        self.enqueue(name)
+        self.start_queue_runner()
+
+
+
+def run_gui():
+    """Запустить графический интерфейс (ошибки запуска сообщает manjaro_updater.main)"""
+    root = tk.Tk()
+    app = ManjaroUpdater(root)
+    # Центрирование окна
+    root.update_idletasks()
+    x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
+    y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
+    root.geometry(f"+{x}+{y}")
+    try:
+        root.mainloop()
+    finally:
+        app.close_worker()
+        app.output.close()
@@ -0,0 +1,300 @@
+"""История транзакций pacman из /var/log/pacman.log.
+
+Журнал отображается в память (mmap), нужные строки находит одно
+регулярное выражение по байтам, без построчного чтения в Python.
+Индекс хранит только смещения транзакций в файле, их время, команду и
+номера транзакций для каждого пакета; подробности (версии) читаются из
+журнала по смещениям, когда они нужны. Индекс сохраняется на диск, при
+следующем запуске разбирается только дописанный хвост журнала; если
+журнал ротирован или обрезан, индекс строится заново.
+
+Старые версии pacman (до 5.0) писали строки без метки [PACMAN]/[ALPM]:
+"[2012-01-05 10:12] upgraded foo (1-1 -> 2-1)". Такие строки тоже
+разбираются. Если в старом журнале нет строк "Running '...'" и
+"transaction started", изменения до первой такой строки попадают в одну
+транзакцию без команды.
+"""
+import calendar
+import hashlib
+import json
+import mmap
+import os
+import re
+
+from vercmp import vercmp, version_key
+
+PACMAN_LOG = "/var/log/pacman.log"
+HISTORY_CACHE_VERSION = 2
+# По первым байтам журнала определяется, что это тот же файл
+HEAD_BYTES = 4096
+
+_LINE = re.compile(
+    rb"^\[([0-9T:+\- ]+)\] (?:\[(?:PACMAN|ALPM)\] )?"
+    rb"(?:Running '([^'\n]*)'|transaction (started|completed|failed|interrupted)"
+    rb"|(installed|upgraded|downgraded|reinstalled|removed) (\S+) \(([^)\n]*)\))",
+    re.M)
+# Команды полного обновления: pacman -Syu, -Su, -Syyu ...
+_SYSUPGRADE = re.compile(r"(?:^|\s)-S[a-zA-Z]*u")
+
+_days = {}
+_zones = {b"": 0, b"Z": 0}
+
+
+def parse_stamp(stamp):
+    """Время записи журнала в секундах epoch.
+
+    Форматы: 2024-01-05T10:12:33+0100 (pacman >= 5.2) и 2019-01-01 10:00.
+    """
+    day = _days.get(stamp[:10])
+    if day is None:
+        day = _days[stamp[:10]] = calendar.timegm(
+            (int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]), 0, 0, 0))
+    seconds = int(stamp[17:19]) if stamp[16:17] == b":" else 0
+    zone = stamp[19:]
+    offset = _zones.get(zone)
+    if offset is None:
+        digits = zone[1:].replace(b":", b"")
+        offset = (int(digits[:2]) * 3600 + int(digits[2:4] or 0) * 60) * (-1 if zone[:1] == b"-" else 1)
+        _zones[zone] = offset
+    return day + int(stamp[11:13]) * 3600 + int(stamp[14:16]) * 60 + seconds - offset
+
+
+class Change:
+    """Изменение пакета в транзакции"""
+
+    __slots__ = ("action", "name", "old", "new")
+
+    def __init__(self, action, name, versions):
+        self.action = action
+        self.name = name
+        self.old = self.new = None
+        if " -> " in versions:
+            self.old, self.new = versions.split(" -> ", 1)
+        elif action == "removed":
+            self.old = versions
+        else:
+            self.new = versions
+
+    def __str__(self):
+        if self.old and self.new:
+            return f"{self.action} {self.name} ({self.old} -> {self.new})"
+        return f"{self.action} {self.name} ({self.old or self.new})"
+
+
+class Transaction:
+    """Команда pacman: смещения в журнале, время, итог и число изменений"""
+
+    __slots__ = ("offset", "end", "start_ts", "end_ts", "command", "result", "count")
+
+    def __init__(self, offset, end, start_ts, end_ts, command=None, result=None, count=0):
+        self.offset = offset
+        self.end = end
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.command = command
+        self.result = result
+        self.count = count
+
+    @property
+    def duration(self):
+        return self.end_ts - self.start_ts
+
+    @property
+    def sysupgrade(self):
+        return bool(self.command and _SYSUPGRADE.search(self.command))
+
+    def to_list(self):
+        return [self.offset, self.end, self.start_ts, self.end_ts, self.command,
+                self.result, self.count]
+
+
+class History:
+    """Индекс журнала pacman с инкрементальным дочитыванием"""
+
+    def __init__(self, log_path=PACMAN_LOG, cache_file=None):
+        self.log_path = log_path
+        self.cache_file = cache_file
+        self._reset()
+        if cache_file:
+            self._load()
+
+    def _reset(self):
+        self.transactions = []
+        # {пакет: [номера транзакций]}
+        self.by_package = {}
+        self.offset = 0
+        self.inode = None
+        self.head = None
+
+    def _load(self):
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != HISTORY_CACHE_VERSION or data.get("log") != self.log_path:
+                return
+            self.transactions = [Transaction(*t) for t in data["transactions"]]
+            self.by_package = data["packages"]
+            self.offset = data["offset"]
+            self.inode = data["inode"]
+            self.head = data["head"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._reset()
+
+    def save(self):
+        if not self.cache_file:
+            return
+        data = {
+            "version": HISTORY_CACHE_VERSION,
+            "log": self.log_path,
+            "offset": self.offset,
+            "inode": self.inode,
+            "head": self.head,
+            "transactions": [t.to_list() for t in self.transactions],
+            "packages": self.by_package,
+        }
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.cache_file)
+
+    def update(self):
+        """Дочитать журнал с последнего смещения; вернуть число новых байт"""
+        with open(self.log_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if self.offset:
+                    head = hashlib.sha1(mm[:min(HEAD_BYTES, self.offset)]).hexdigest()
+                    if st.st_ino != self.inode or st.st_size < self.offset or head != self.head:
+                        # Другой файл или он обрезан: индекс строится заново
+                        self._reset()
+                start = self.offset
+                end = mm.rfind(b"\n", start) + 1
+                if end <= start:
+                    return 0
+                self._parse(mm, start, end)
+                self.offset = end
+                self.inode = st.st_ino
+                self.head = hashlib.sha1(mm[:min(HEAD_BYTES, end)]).hexdigest()
+        return end - start
+
+    def _parse(self, mm, start, end):
+        transactions = self.transactions
+        by_package = self.by_package
+        current = transactions[-1] if transactions else None
+        index = len(transactions) - 1
+        # Списки by_package по имени в байтах, чтобы не декодировать каждую строку
+        names = {}
+        # Время разбирается только у первой и последней строки транзакции
+        last_stamp = None
+        for match in _LINE.finditer(mm, start, end):
+            stamp, command, state, action, name = match.group(1, 2, 3, 4, 5)
+            if command is not None or current is None:
+                if current is not None and last_stamp is not None:
+                    current.end_ts = parse_stamp(last_stamp)
+                ts = parse_stamp(stamp)
+                current = Transaction(match.start(), match.end(), ts, ts,
+                                      command.decode("utf-8", "replace") if command else None)
+                transactions.append(current)
+                index += 1
+                last_stamp = None
+                if command is not None:
+                    continue
+            current.end = match.end()
+            last_stamp = stamp
+            if state is not None:
+                if state != b"started":
+                    current.result = state.decode("ascii")
+                continue
+            current.count += 1
+            refs = names.get(name)
+            if refs is None:
+                refs = names[name] = by_package.setdefault(name.decode("utf-8", "replace"), [])
+            if not refs or refs[-1] != index:
+                refs.append(index)
+        if current is not None and last_stamp is not None:
+            current.end_ts = parse_stamp(last_stamp)
+
+    def _changes(self, mm, transaction, name=None):
+        changes = []
+        for match in _LINE.finditer(mm, transaction.offset, transaction.end):
+            action, package, versions = match.group(4, 5, 6)
+            if action is None:
+                continue
+            package = package.decode("utf-8", "replace")
+            if name is None or package == name:
+                changes.append(Change(action.decode("ascii"), package,
+                                      versions.decode("utf-8", "replace")))
+        return changes
+
+    def _map(self):
+        f = open(self.log_path, "rb")
+        try:
+            return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            f.close()
+            raise
+
+    def changes(self, transaction):
+        """Изменения пакетов в транзакции (читаются из журнала по смещениям)"""
+        f, mm = self._map()
+        with f, mm:
+            return self._changes(mm, transaction)
+
+    def package_history(self, name, limit=None):
+        """Изменения пакета от старых к новым: [(транзакция, Change)].
+
+        limit - сколько последних транзакций с этим пакетом смотреть.
+        """
+        refs = self.by_package.get(name, [])
+        if limit:
+            refs = refs[-limit:]
+        if not refs:
+            return []
+        result = []
+        f, mm = self._map()
+        with f, mm:
+            for index in refs:
+                transaction = self.transactions[index]
+                for change in self._changes(mm, transaction, name):
+                    result.append((transaction, change))
+        return result
+
+    def last_change(self, name):
+        """Последнее изменение пакета (транзакция, Change) или None"""
+        changes = self.package_history(name, limit=1)
+        return changes[-1] if changes else None
+
+    def last_sysupgrade(self):
+        """Последняя транзакция полного обновления с изменениями или None"""
+        for transaction in reversed(self.transactions):
+            if transaction.sysupgrade and transaction.count:
+                return transaction
+        return None
+
+    def recent(self, limit=50):
+        """Последние транзакции с изменениями, новые первыми"""
+        result = []
+        for transaction in reversed(self.transactions):
+            if transaction.count:
+                result.append(transaction)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+def downgrade_candidates(name, installed_version, cached, history=None):
+    """Версии пакета из кэша старше установленной, новые первыми.
+
+    cached - список pkgcache.CachedPackage этого пакета. Возвращает
+    [(CachedPackage, время установки этой версии по журналу или None)].
+    """
+    installed_at = {}
+    if history is not None:
+        for transaction, change in history.package_history(name):
+            if change.new:
+                installed_at[change.new] = transaction.start_ts
+    older = [p for p in cached if vercmp(p.version, installed_version) < 0]
+    older.sort(key=lambda p: version_key(p.version), reverse=True)
+    return [(p, installed_at.get(p.version)) for p in older]
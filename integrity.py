@@ -0,0 +1,336 @@
+"""Проверка целостности установленных пакетов без pacman -Qk.
+
+Читает /var/lib/pacman/local/*/files и mtree напрямую, проверяет пакеты
+параллельно в пуле процессов и хранит кэш по версии пакета и
+inode/mtime/size/права/владельцу/ctime файлов, чтобы повторная проверка
+смотрела только на изменившееся (chmod и chown меняют ctime).
+Процессы пула запускаются через forkserver: приложение многопоточное,
+и fork из потока Tk или помощника небезопасен. В глубоком режиме
+сверяются SHA-256 (чтение через mmap).
+
+Корень системы задается параметром root, поэтому проверку можно
+запускать на каталоге-фикстуре.
+"""
+import collections
+import gzip
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import stat
+from concurrent.futures import ProcessPoolExecutor
+
+from pkgdb import local_db_path, read_sections
+
+CACHE_VERSION = 2
+
+# Служебные файлы пакета из mtree, которых нет в файловой системе
+_META_FILES = {".BUILDINFO", ".PKGINFO", ".INSTALL", ".MTREE", ".CHANGELOG"}
+
+_TYPES = {"file": stat.S_ISREG, "dir": stat.S_ISDIR, "link": stat.S_ISLNK}
+
+# Виды проблем и их описание для вывода
+PROBLEM_TEXT = {
+    "missing": "отсутствует",
+    "type": "другой тип файла",
+    "link": "другая цель ссылки",
+    "mode": "другие права доступа",
+    "owner": "другой владелец",
+    "size": "другой размер",
+    "sha256": "повреждён (SHA-256)",
+    "unreadable": "нет доступа",
+}
+
+Problem = collections.namedtuple("Problem", "path kind detail")
+
+
+class PackageReport:
+    """Результат проверки одного пакета"""
+
+    def __init__(self, name, version, files, problems, cached=False):
+        self.name = name
+        self.version = version
+        self.files = files
+        self.problems = problems
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "files": self.files,
+            "problems": [p._asdict() for p in self.problems],
+        }
+
+
+def list_packages(root="/"):
+    """Список (каталог, имя, версия) установленных пакетов"""
+    packages = []
+    with os.scandir(local_db_path(root)) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            try:
+                desc = read_sections(os.path.join(entry.path, "desc"))
+            except OSError:
+                continue
+            name = desc.get("NAME", [entry.name])[0]
+            version = desc.get("VERSION", [""])[0]
+            packages.append((entry.path, name, version))
+    packages.sort(key=lambda p: p[1])
+    return packages
+
+
+def _unescape(path):
+    """Раскодировать восьмеричные escape-последовательности mtree (\\040)"""
+    if "\\" not in path:
+        return path
+    out = bytearray()
+    i = 0
+    raw = path.encode("utf-8", "surrogateescape")
+    while i < len(raw):
+        code = raw[i + 1:i + 4]
+        if raw[i] == 0x5C and len(code) == 3 and code.isdigit():
+            out.append(int(code, 8))
+            i += 4
+        else:
+            out.append(raw[i])
+            i += 1
+    return out.decode("utf-8", "surrogateescape")
+
+
+def parse_mtree(path):
+    """Прочитать mtree пакета: {путь: {атрибут: значение}}"""
+    entries = {}
+    defaults = {}
+    with gzip.open(path, "rt", encoding="utf-8", errors="surrogateescape") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            head, attrs = fields[0], dict(
+                kv.split("=", 1) for kv in fields[1:] if "=" in kv)
+            if head == "/set":
+                defaults.update(attrs)
+                continue
+            if head == "/unset":
+                for key in fields[1:]:
+                    defaults.pop(key, None)
+                continue
+            name = _unescape(head)
+            if name.startswith("./"):
+                name = name[2:]
+            if name in _META_FILES:
+                continue
+            entry = dict(defaults)
+            entry.update(attrs)
+            entries[name] = entry
+    return entries
+
+
+def sha256_file(path):
+    """SHA-256 файла, читая его через mmap"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return digest.hexdigest()
+
+
+# Сигнатура файла в кэше: inode, mtime, размер, права, владелец, группа, ctime;
+# за ней в записи идут найденные проблемы и признак проверки SHA-256
+_SIGNATURE_LEN = 7
+# Сигнатура отсутствующего файла
+_MISSING = [0, 0, -1, 0, 0, 0, 0]
+
+
+def _signature(st):
+    return [st.st_ino, st.st_mtime_ns, st.st_size, st.st_mode, st.st_uid, st.st_gid, st.st_ctime_ns]
+
+
+def _check_entry(full, entry, st, backup, deep):
+    """Сравнить файл с записью mtree, вернуть список (вид, подробности)"""
+    kind = entry.get("type", "file")
+    test = _TYPES.get(kind)
+    if test and not test(st.st_mode):
+        return [("type", kind)]
+    problems = []
+    if kind == "link":
+        target = _unescape(entry.get("link", ""))
+        try:
+            actual = os.readlink(full)
+        except OSError:
+            actual = None
+        if target and actual != target:
+            problems.append(("link", f"{actual} != {target}"))
+        return problems
+    if kind != "file":
+        return problems
+    if "mode" in entry and stat.S_IMODE(st.st_mode) != int(entry["mode"], 8):
+        problems.append(("mode", f"{stat.S_IMODE(st.st_mode):o} != {entry['mode']}"))
+    owner = (int(entry.get("uid", st.st_uid)), int(entry.get("gid", st.st_gid)))
+    if (st.st_uid, st.st_gid) != owner:
+        problems.append(("owner", f"{st.st_uid}:{st.st_gid} != {owner[0]}:{owner[1]}"))
+    # Файлы из %BACKUP% пользователь вправе менять
+    if backup:
+        return problems
+    if "size" in entry and st.st_size != int(entry["size"]):
+        problems.append(("size", f"{st.st_size} != {entry['size']}"))
+    elif deep and "sha256digest" in entry:
+        try:
+            if sha256_file(full) != entry["sha256digest"]:
+                problems.append(("sha256", ""))
+        except OSError as e:
+            problems.append(("unreadable", str(e)))
+    return problems
+
+
+def check_package(task):
+    """Проверить один пакет (выполняется в процессе пула).
+
+    task: (root, pkgdir, name, version, cached, deep), где cached -
+    запись кэша этого пакета или None. Возвращает (отчет, новая запись).
+    """
+    root, pkgdir, name, version, cached, deep = task
+    if cached and cached.get("version") != version:
+        cached = None
+    old_files = cached["files"] if cached else {}
+
+    # Быстрый путь: все файлы на месте и не менялись с прошлой проверки
+    if cached and (cached.get("deep") or not deep):
+        reused = _reuse_cached(root, old_files)
+        if reused is not None:
+            report = PackageReport(name, version, len(old_files),
+                                   reused, cached=True)
+            return report, cached
+
+    sections = read_sections(os.path.join(pkgdir, "files"))
+    paths = sections.get("FILES", [])
+    backup = {line.split("\t", 1)[0] for line in sections.get("BACKUP", [])}
+    mtree_path = os.path.join(pkgdir, "mtree")
+    mtree = parse_mtree(mtree_path) if os.path.exists(mtree_path) else {}
+
+    problems = []
+    files = {}
+    uncacheable = False
+    for rel in paths:
+        clean = rel.rstrip("/")
+        full = os.path.join(root, clean)
+        try:
+            st = os.lstat(full)
+        except FileNotFoundError:
+            problems.append(Problem("/" + rel, "missing", ""))
+            files[rel] = _MISSING + [[("missing", "")], True]
+            continue
+        except OSError as e:
+            # Недоступные файлы не кэшируем, чтобы проверить их снова
+            problems.append(Problem("/" + rel, "unreadable", str(e)))
+            uncacheable = True
+            continue
+        sig = _signature(st)
+        prev = old_files.get(rel)
+        if prev and prev[:_SIGNATURE_LEN] == sig and (prev[-1] or not deep):
+            found = [tuple(p) for p in prev[-2]]
+            hashed = prev[-1]
+        else:
+            entry = mtree.get(clean)
+            found = _check_entry(full, entry, st, rel in backup, deep) if entry else []
+            hashed = deep
+        files[rel] = sig + [found, hashed]
+        problems.extend(Problem("/" + rel, kind, detail) for kind, detail in found)
+
+    entry = None if uncacheable else {"version": version, "deep": deep, "files": files}
+    return PackageReport(name, version, len(paths), problems), entry
+
+
+def _reuse_cached(root, old_files):
+    """Проблемы из кэша, если ни один файл не изменился, иначе None"""
+    problems = []
+    for rel, record in old_files.items():
+        signature, found = record[:_SIGNATURE_LEN], record[-2]
+        try:
+            st = os.lstat(os.path.join(root, rel.rstrip("/")))
+        except FileNotFoundError:
+            if signature != _MISSING:
+                return None
+            problems.extend(Problem("/" + rel, kind, detail) for kind, detail in found)
+            continue
+        except OSError:
+            return None
+        if _signature(st) != signature:
+            return None
+        problems.extend(Problem("/" + rel, kind, detail) for kind, detail in found)
+    return problems
+
+
+def load_cache(path, root):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION or data.get("root") != os.path.abspath(root):
+        return {}
+    return data.get("packages", {})
+
+
+def save_cache(path, root, packages):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "root": os.path.abspath(root),
+                   "packages": packages}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def check_integrity(root="/", deep=False, cache_file=None, jobs=None, packages=None):
+    """Проверить установленные пакеты и вернуть список PackageReport.
+
+    packages - необязательный список имен для выборочной проверки,
+    jobs - число процессов (1 - без пула).
+    """
+    cache = load_cache(cache_file, root) if cache_file else {}
+    installed = list_packages(root)
+    if packages is not None:
+        wanted = set(packages)
+        installed = [p for p in installed if p[1] in wanted]
+
+    tasks = [(root, pkgdir, name, version, cache.get(name), deep)
+             for pkgdir, name, version in installed]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2:
+        results = [check_package(t) for t in tasks]
+    else:
+        context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            results = list(pool.map(check_package, tasks, chunksize=16))
+
+    reports = []
+    fresh = {} if packages is None else dict(cache)
+    for report, entry in results:
+        reports.append(report)
+        if entry is not None:
+            fresh[report.name] = entry
+        else:
+            fresh.pop(report.name, None)
+    if cache_file:
+        save_cache(cache_file, root, fresh)
+    return reports
+
+
+def format_problems(reports):
+    """Текстовое описание найденных проблем, по строке на файл"""
+    lines = []
+    for report in reports:
+        for problem in report.problems:
+            text = PROBLEM_TEXT.get(problem.kind, problem.kind)
+            detail = f" ({problem.detail})" if problem.detail else ""
+            lines.append(f"{report.name}: {problem.path} — {text}{detail}")
+    return "\n".join(lines)
@@ -0,0 +1,247 @@
+"""Очередь операций, сохраняемая на диск.
+
+Пока выполняется одна операция, следующие ставятся в очередь и
+выполняются по одной в порядке постановки. Лишние задания не
+добавляются: повторная постановка ожидающей операции или операции,
+которую покрывает ожидающая (clean_packages при full_clean в очереди),
+ничего не меняет, а новая операция снимает ожидающие, которые она
+покрывает.
+
+Очередь хранится в JSON и переживает перезапуск окна: окно
+восстанавливает ее на паузе (restore) и спрашивает, продолжать ли, чтобы
+забытые задания не начали менять систему сами. Каждое изменение
+выполняется под flock: файл перечитывается, меняется и записывается,
+поэтому окно и пакетный режим (--run-queue) видят одну очередь.
+Выполняет очередь только один процесс - тот, что держит блокировку
+исполнителя; задание, которое «выполнялось» без исполнителя, прервано
+и выполняется снова первым.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+
+QUEUE_VERSION = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+
+# Операция -> операции, которые она выполняет целиком
+COVERS = {
+    "full_clean": {"clean_packages", "clean_orphans", "clean_logs"},
+    "fix_dependencies": {"check_dependencies"},
+}
+
+
+def covers(operation, other):
+    """Выполняет ли operation всё, что сделала бы other"""
+    return operation == other or other in COVERS.get(operation, ())
+
+
+class Job:
+    """Задание очереди: операция и снимок настроек на момент постановки"""
+
+    __slots__ = ("id", "operation", "options", "queued_at", "state", "started_at")
+
+    def __init__(self, id, operation, options=None, queued_at=None, state=QUEUED, started_at=None):
+        self.id = id
+        self.operation = operation
+        self.options = options or {}
+        self.queued_at = queued_at if queued_at is not None else time.time()
+        self.state = state
+        self.started_at = started_at
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class JobQueue:
+    """Очередь заданий в файле path (без path - только в памяти)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = []
+        self.paused = False
+        self.next_id = 1
+        self._runner = None
+
+    @contextlib.contextmanager
+    def _locked(self, write=True):
+        """Перечитать очередь под блокировкой и записать, если write"""
+        with self.lock:
+            if not self.path:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._load()
+                yield
+                if write:
+                    self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != QUEUE_VERSION:
+                raise ValueError(data.get("version"))
+            jobs = [Job(**job) for job in data["jobs"]]
+            paused = bool(data.get("paused", False))
+            next_id = max([int(data.get("next_id", 1))] + [job.id + 1 for job in jobs])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Поврежденный файл: очередь начинается заново
+            jobs, paused, next_id = [], False, 1
+        self.jobs, self.paused, self.next_id = jobs, paused, next_id
+
+    def _save(self):
+        data = {
+            "version": QUEUE_VERSION,
+            "paused": self.paused,
+            "next_id": self.next_id,
+            "jobs": [job.to_dict() for job in self.jobs],
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def snapshot(self):
+        """(задания, приостановлена ли очередь) - текущее состояние файла"""
+        with self._locked(write=False):
+            return list(self.jobs), self.paused
+
+    def add(self, operation, options=None):
+        """Поставить операцию в очередь.
+
+        Возвращает (задание, добавлено ли новое, снятые задания). Если
+        ожидающее задание уже покрывает операцию, возвращается оно.
+        """
+        with self._locked():
+            pending = [job for job in self.jobs if job.state == QUEUED]
+            for job in pending:
+                if covers(job.operation, operation):
+                    return job, False, []
+            removed = [job for job in pending if covers(operation, job.operation)]
+            job = Job(self.next_id, operation, options)
+            self.next_id += 1
+            self.jobs = [j for j in self.jobs if j not in removed] + [job]
+            return job, True, removed
+
+    def remove(self, job_id):
+        """Снять ожидающее задание; True, если оно было в очереди"""
+        with self._locked():
+            before = len(self.jobs)
+            self.jobs = [job for job in self.jobs if job.id != job_id or job.state != QUEUED]
+            return len(self.jobs) != before
+
+    def clear(self):
+        """Снять все ожидающие задания; вернуть их число"""
+        with self._locked():
+            before = len(self.jobs)
+            self.jobs = [job for job in self.jobs if job.state != QUEUED]
+            return before - len(self.jobs)
+
+    def set_paused(self, paused):
+        with self._locked():
+            self.paused = paused
+
+    def claim_runner(self):
+        """Стать исполнителем очереди; False, если им уже является другой"""
+        if self._runner is not None:
+            return False
+        if not self.path:
+            self._runner = True
+            return True
+        runner = open(self.path + ".run", "a")
+        try:
+            fcntl.flock(runner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            runner.close()
+            return False
+        self._runner = runner
+        return True
+
+    def release_runner(self):
+        runner, self._runner = self._runner, None
+        if runner not in (None, True):
+            runner.close()
+
+    def _requeue_interrupted(self):
+        """Выполнявшиеся без исполнителя задания прерваны: они снова ждут, первыми"""
+        interrupted = [job for job in self.jobs if job.state == RUNNING]
+        for job in interrupted:
+            job.state = QUEUED
+        self.jobs = interrupted + [job for job in self.jobs if job not in interrupted]
+
+    def restore(self):
+        """Поставить на паузу очередь, оставшуюся с прошлого запуска.
+
+        Ничего не делает, если очередь выполняет другой процесс
+        (--run-queue). Возвращает (задания, была ли очередь на паузе) или
+        None, если восстанавливать нечего.
+        """
+        if not self.claim_runner():
+            return None
+        try:
+            with self._locked():
+                if not self.jobs:
+                    return None
+                self._requeue_interrupted()
+                paused, self.paused = self.paused, True
+                return list(self.jobs), paused
+        finally:
+            self.release_runner()
+
+    def next(self):
+        """Взять первое задание (только исполнителю); None - очередь пуста или на паузе"""
+        with self._locked():
+            # У исполнителя нет выполняющихся заданий
+            self._requeue_interrupted()
+            if self.paused or not self.jobs:
+                return None
+            job = self.jobs[0]
+            job.state = RUNNING
+            job.started_at = time.time()
+            return job
+
+    def finish(self, job):
+        with self._locked():
+            self.jobs = [j for j in self.jobs if j.id != job.id]
+
+
+def estimate(jobs, durations, now=None):
+    """Через сколько секунд завершится каждое задание: [(задание, секунды или None)].
+
+    durations - {операция: типичная длительность}. После задания с
+    неизвестной длительностью оценки остальных тоже неизвестны.
+    """
+    now = time.time() if now is None else now
+    result = []
+    elapsed = 0.0
+    for job in jobs:
+        duration = durations.get(job.operation)
+        if elapsed is None or duration is None:
+            elapsed = None
+        else:
+            if job.state == RUNNING and job.started_at:
+                duration = max(duration - (now - job.started_at), 0)
+            elapsed += duration
+        result.append((job, elapsed))
+    return result
+
+
+def format_eta(seconds):
+    """Оценка времени для людей: '~40 с', '~3 мин', '~1 ч 5 мин' или '?'"""
+    if seconds is None:
+        return "?"
+    if seconds < 60:
+        return f"~{max(int(seconds), 1)} с"
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"~{minutes} мин"
+    return f"~{minutes // 60} ч {minutes % 60} мин"
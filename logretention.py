@@ -0,0 +1,200 @@
+"""Хранение логов в рамках бюджета размера.
+
+Обходит /var/log рекурсивно через os.scandir (потоково, без построения
+полного списка каталога), группирует ротированные файлы по базовому логу
+и применяет к каждой группе политику: максимальный возраст, максимальный
+суммарный размер и число сохраняемых новейших ротаций. Журнал systemd
+ужимается через journalctl --vacuum-size под общий бюджет.
+
+Корень задается параметром, так что движок можно проверять на временном
+каталоге.
+"""
+import fnmatch
+import os
+import re
+import time
+
+from console import format_size
+
+LOG_ROOT = "/var/log"
+JOURNAL_DIR = "journal"
+DAY = 86400
+
+# Общий бюджет /var/log и минимальный размер, который оставляем журналу
+DEFAULT_BUDGET = 1024 * 1024 * 1024
+MIN_JOURNAL = 64 * 1024 * 1024
+
+# Суффиксы ротации: .1, .old, -20240101, затем сжатие
+_ROTATED = re.compile(r"(?:\.\d+|\.old|-\d{8}(?:\d{2})?)(?:\.(?:gz|xz|bz2|zst|lz4))?$"
+                      r"|\.(?:gz|xz|bz2|zst|lz4)$")
+
+
+class Policy:
+    """Политика хранения для группы логов"""
+
+    def __init__(self, max_age_days=7, max_bytes=64 * 1024 * 1024, keep_newest=2):
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.keep_newest = keep_newest
+
+
+DEFAULT_POLICY = Policy()
+
+
+class LogFile:
+    __slots__ = ("path", "size", "mtime")
+
+    def __init__(self, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+class LogGroup:
+    """Базовый лог и его ротированные копии"""
+
+    def __init__(self, base):
+        self.base = base
+        self.active = 0
+        self.rotated = []
+        self.remove = []
+
+    @property
+    def before(self):
+        return self.active + sum(f.size for f in self.rotated)
+
+    @property
+    def freed(self):
+        return sum(f.size for f in self.remove)
+
+    @property
+    def after(self):
+        return self.before - self.freed
+
+
+def base_name(path):
+    """Путь базового лога для файла и признак ротации"""
+    stripped = path
+    while True:
+        shorter = _ROTATED.sub("", stripped)
+        if shorter == stripped or not shorter:
+            break
+        stripped = shorter
+    return stripped, stripped != path
+
+
+def walk_logs(root):
+    """Пройти дерево логов, выдавая LogFile по одному"""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield LogFile(entry.path, st.st_size, st.st_mtime)
+                except OSError:
+                    continue
+
+
+def policy_for(base, root, policies):
+    """Политика для группы: первое совпадение шаблона или по умолчанию"""
+    rel = os.path.relpath(base, root)
+    for pattern, policy in (policies or {}).items():
+        if fnmatch.fnmatch(rel, pattern):
+            return policy
+    return DEFAULT_POLICY
+
+
+def select_removals(group, policy, now):
+    """Отметить ротированные файлы группы, нарушающие политику"""
+    rotated = sorted(group.rotated, key=lambda f: f.mtime, reverse=True)
+    max_age = policy.max_age_days * DAY if policy.max_age_days is not None else None
+    total = group.active
+    for index, log in enumerate(rotated):
+        too_many = policy.keep_newest is not None and index >= policy.keep_newest
+        too_old = max_age is not None and now - log.mtime > max_age
+        too_big = policy.max_bytes is not None and total + log.size > policy.max_bytes
+        if too_many or too_old or too_big:
+            group.remove.append(log)
+        else:
+            total += log.size
+
+
+class RetentionPlan:
+    """Итог анализа: группы логов, журнал и цель для journalctl"""
+
+    def __init__(self, groups, journal_bytes, journal_target):
+        self.groups = groups
+        self.journal_bytes = journal_bytes
+        self.journal_target = journal_target
+
+    def files(self):
+        for group in self.groups:
+            for log in group.remove:
+                yield log.path
+
+    @property
+    def count(self):
+        return sum(len(g.remove) for g in self.groups)
+
+    @property
+    def freed(self):
+        return sum(g.freed for g in self.groups)
+
+    @property
+    def before(self):
+        return sum(g.before for g in self.groups) + self.journal_bytes
+
+    @property
+    def after(self):
+        return self.before - self.freed - max(0, self.journal_bytes - self.journal_target)
+
+    def report(self):
+        """Строки отчета: группы, где что-то удаляется, и итог"""
+        for group in sorted(self.groups, key=lambda g: -g.freed):
+            if group.remove:
+                yield (f"{group.base}: {format_size(group.before)} → {format_size(group.after)} "
+                       f"(удаляется файлов: {len(group.remove)})")
+        yield (f"Журнал systemd: {format_size(self.journal_bytes)} → "
+               f"{format_size(min(self.journal_bytes, self.journal_target))}")
+        yield f"Итого: {format_size(self.before)} → {format_size(self.after)}"
+
+
+def plan_retention(root=LOG_ROOT, policies=None, budget=DEFAULT_BUDGET,
+                   min_journal=MIN_JOURNAL, now=None):
+    """Разобрать дерево логов и построить план очистки"""
+    now = now or time.time()
+    journal_root = os.path.join(root, JOURNAL_DIR) + os.sep
+    groups = {}
+    journal_bytes = 0
+    for log in walk_logs(root):
+        if log.path.startswith(journal_root):
+            journal_bytes += log.size
+            continue
+        base, rotated = base_name(log.path)
+        group = groups.get(base)
+        if group is None:
+            group = groups[base] = LogGroup(base)
+        if rotated:
+            group.rotated.append(log)
+        else:
+            group.active += log.size
+    for group in groups.values():
+        if group.rotated:
+            select_removals(group, policy_for(group.base, root, policies), now)
+    files_after = sum(g.after for g in groups.values())
+    journal_target = max(min_journal, budget - files_after)
+    return RetentionPlan(list(groups.values()), journal_bytes, journal_target)
+
+
+def journal_vacuum_command(plan, max_age_days=7):
+    """Команда ужатия журнала systemd до цели плана"""
+    return ["sudo", "journalctl", f"--vacuum-time={max_age_days}d",
+            f"--vacuum-size={plan.journal_target}"]
@@ -0,0 +1,238 @@
+"""Ранжирование зеркал с параллельной проверкой и историей оценок.
+
+Читает текущий mirrorlist и одновременно опрашивает зеркала: задержку
+ответа, свежесть синхронизации (файл state у Manjaro или lastsync у Arch)
+и скорость загрузки фиксированного объема. Оценки сохраняются на диск
+как экспоненциально взвешенная история, поэтому повторное ранжирование
+опрашивает только зеркала с устаревшими данными.
+
+Используется только стандартная библиотека (asyncio), так что вместо
+настоящих зеркал можно подставить локальные HTTP-серверы.
+"""
+import asyncio
+import json
+import os
+import ssl
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+MIRRORLIST = "/etc/pacman.d/mirrorlist"
+HISTORY_VERSION = 1
+
+# Параметры опроса по умолчанию
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TIMEOUT = 5.0
+PROBE_BYTES = 256 * 1024
+# Данные моложе этого срока используются без повторного опроса, с
+REUSE_AGE = 3600
+# Вес нового замера в экспоненциальном среднем
+ALPHA = 0.5
+# Размер "типичного пакета" для оценки времени загрузки, байт
+REFERENCE_SIZE = 10 * 1024 * 1024
+# Штраф за каждый час отставания синхронизации, с
+STALE_PENALTY = 2.0
+FAILED_SCORE = 1e9
+
+
+class ProbeResult:
+    """Результат одного опроса зеркала"""
+
+    def __init__(self, server, latency=None, throughput=None, lastsync=None, error=None):
+        self.server = server
+        self.latency = latency
+        self.throughput = throughput
+        self.lastsync = lastsync
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def read_mirrorlist(path=MIRRORLIST):
+    """Список адресов Server из mirrorlist в исходном порядке"""
+    servers = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#") or "=" not in line:
+                continue
+            key, value = (part.strip() for part in line.split("=", 1))
+            if key == "Server" and value not in servers:
+                servers.append(value)
+    return servers
+
+
+def write_mirrorlist(path, servers, comment="Отсортировано manjaro_updater"):
+    """Записать mirrorlist с серверами в заданном порядке"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f"## {comment}: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        for server in servers:
+            f.write(f"Server = {server}\n")
+    os.replace(tmp, path)
+
+
+def branch_url(server):
+    """Адрес ветки зеркала: часть Server до $repo"""
+    base = server.split("$repo", 1)[0]
+    return base if base.endswith("/") else base + "/"
+
+
+def probe_file_url(server, arch=None):
+    """Адрес файла для замера скорости (база core данного зеркала)"""
+    arch = arch or os.uname().machine
+    return server.replace("$repo", "core").replace("$arch", arch).rstrip("/") + "/core.db"
+
+
+def parse_lastsync(body):
+    """Время синхронизации из state ('date=ISO') или lastsync (epoch)"""
+    text = body.decode("utf-8", "replace").strip()
+    for line in text.splitlines():
+        if line.startswith("date="):
+            stamp = line[5:].strip().replace("Z", "+00:00")
+            value = datetime.fromisoformat(stamp)
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value.timestamp()
+    if text.isdigit():
+        return float(text)
+    return None
+
+
+async def http_get(url, limit, timeout, headers=None):
+    """Минимальный HTTP GET: (код, время до заголовков, тело, время тела)"""
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port,
+                                ssl=ssl.create_default_context() if secure else None),
+        timeout)
+    try:
+        request = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}",
+                   "User-Agent: manjaro_updater", "Connection: close"]
+        for key, value in (headers or {}).items():
+            request.append(f"{key}: {value}")
+        writer.write(("\r\n".join(request) + "\r\n\r\n").encode("ascii"))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        latency = time.perf_counter() - start
+        status = int(head.split(b" ", 2)[1])
+        body = bytearray()
+        body_start = time.perf_counter()
+        while len(body) < limit:
+            chunk = await asyncio.wait_for(reader.read(min(65536, limit - len(body))), timeout)
+            if not chunk:
+                break
+            body += chunk
+        return status, latency, bytes(body), time.perf_counter() - body_start
+    finally:
+        writer.close()
+
+
+async def probe_mirror(server, timeout=DEFAULT_TIMEOUT, probe_bytes=PROBE_BYTES,
+                       sync_file="state", arch=None):
+    """Опросить зеркало: задержка, время синхронизации и скорость"""
+    try:
+        status, latency, body, _ = await http_get(branch_url(server) + sync_file, 4096, timeout)
+        if status != 200:
+            return ProbeResult(server, error=f"HTTP {status}")
+        lastsync = parse_lastsync(body)
+        status, _, body, elapsed = await http_get(
+            probe_file_url(server, arch), probe_bytes, timeout,
+            {"Range": f"bytes=0-{probe_bytes - 1}"})
+        if status not in (200, 206):
+            return ProbeResult(server, latency=latency, lastsync=lastsync, error=f"HTTP {status}")
+        throughput = len(body) / elapsed if elapsed > 0 else float(len(body))
+        return ProbeResult(server, latency, throughput, lastsync)
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+        return ProbeResult(server, error=str(e) or type(e).__name__)
+
+
+async def probe_all(servers, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """Опросить зеркала параллельно, не более concurrency одновременно"""
+    limit = asyncio.Semaphore(concurrency)
+
+    async def bounded(server):
+        async with limit:
+            return await probe_mirror(server, **kwargs)
+
+    return await asyncio.gather(*(bounded(s) for s in servers))
+
+
+class MirrorHistory:
+    """Экспоненциально взвешенная история замеров зеркал"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.mirrors = {}
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == HISTORY_VERSION:
+                    self.mirrors = data.get("mirrors", {})
+            except (OSError, ValueError):
+                pass
+
+    def update(self, result, now=None):
+        now = now or time.time()
+        entry = self.mirrors.setdefault(result.server, {"failures": 0})
+        entry["updated"] = now
+        if not result.ok:
+            entry["failures"] = entry.get("failures", 0) + 1
+            entry["error"] = result.error
+            return
+        entry["failures"] = 0
+        entry.pop("error", None)
+        for key in ("latency", "throughput"):
+            value = getattr(result, key)
+            old = entry.get(key)
+            entry[key] = value if old is None else ALPHA * value + (1 - ALPHA) * old
+        if result.lastsync is not None:
+            entry["lastsync"] = result.lastsync
+
+    def is_fresh(self, server, max_age=REUSE_AGE, now=None):
+        entry = self.mirrors.get(server)
+        now = now or time.time()
+        return bool(entry) and not entry.get("failures") and now - entry.get("updated", 0) < max_age
+
+    def score(self, server, now=None):
+        """Ожидаемое время загрузки типичного пакета, с (меньше - лучше)"""
+        entry = self.mirrors.get(server)
+        if not entry or entry.get("failures") or not entry.get("throughput"):
+            return FAILED_SCORE
+        now = now or time.time()
+        score = entry["latency"] + REFERENCE_SIZE / entry["throughput"]
+        if entry.get("lastsync"):
+            score += max(0.0, now - entry["lastsync"]) / 3600 * STALE_PENALTY
+        return score
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": HISTORY_VERSION, "mirrors": self.mirrors}, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def rank_mirrors(servers, history_file=None, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, max_age=REUSE_AGE, force=False, **kwargs):
+    """Ранжировать зеркала и вернуть (отсортированный список, новые замеры)"""
+    history = MirrorHistory(history_file)
+    stale = [s for s in servers if force or not history.is_fresh(s, max_age)]
+    results = asyncio.run(probe_all(stale, concurrency, timeout=timeout, **kwargs)) if stale else []
+    now = time.time()
+    for result in results:
+        history.update(result, now)
+    history.save()
+    order = {server: i for i, server in enumerate(servers)}
+    ranked = sorted(servers, key=lambda s: (history.score(s, now), order[s]))
+    return ranked, results, history
@@ -0,0 +1,17 @@
+"""Пути к файлам состояния и журналам менеджера"""
+import os
+
+APP_NAME = "manjaro_updater"
+
+
+def cache_dir():
+    """Каталог для кэшей и истории (создается при необходимости)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, APP_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_path(name):
+    """Полный путь к файлу внутри каталога кэша"""
+    return os.path.join(cache_dir(), name)
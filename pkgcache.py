@@ -0,0 +1,125 @@
+"""Очистка кэша пакетов pacman с учетом версий.
+
+Индексирует /var/cache/pacman/pkg через os.scandir, разбирает имена
+файлов пакетов и оставляет по N последних версий каждого пакета плюс
+установленную. Неустановленные пакеты можно удалять целиком. План
+считается без удаления (пробный прогон), а само удаление выполняется
+одним привилегированным вызовом (privileged.bulk_remove_command).
+"""
+import os
+import re
+
+from console import format_size
+from vercmp import version_key
+
+PKG_CACHE = "/var/cache/pacman/pkg"
+DEFAULT_KEEP = 2
+
+_PKG_FILE = re.compile(
+    r"^(?P<name>.+)-(?P<version>[^-]+-[^-]+)-(?P<arch>[^-]+)\.pkg\.tar(?:\.[A-Za-z0-9]+)?$")
+
+
+class CachedPackage:
+    """Файл пакета в кэше (вместе с подписью .sig, если есть)"""
+
+    __slots__ = ("name", "version", "arch", "path", "size", "extra")
+
+    def __init__(self, name, version, arch, path, size):
+        self.name = name
+        self.version = version
+        self.arch = arch
+        self.path = path
+        self.size = size
+        self.extra = []
+
+    @property
+    def files(self):
+        return [self.path] + self.extra
+
+
+def parse_filename(filename):
+    """(имя, версия, архитектура) из имени файла пакета или None"""
+    match = _PKG_FILE.match(filename)
+    if not match:
+        return None
+    return match.group("name"), match.group("version"), match.group("arch")
+
+
+def scan_cache(cache_dir=PKG_CACHE):
+    """Проиндексировать кэш: {(имя, архитектура): [CachedPackage]}"""
+    packages = {}
+    signatures = {}
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            name = entry.name
+            if name.endswith(".sig"):
+                signatures[name[:-4]] = entry
+                continue
+            if name.endswith(".part"):
+                continue
+            parsed = parse_filename(name)
+            if parsed is None or not entry.is_file(follow_symlinks=False):
+                continue
+            pkg = CachedPackage(parsed[0], parsed[1], parsed[2], entry.path,
+                                entry.stat(follow_symlinks=False).st_size)
+            packages.setdefault((pkg.name, pkg.arch), []).append(pkg)
+    for versions in packages.values():
+        for pkg in versions:
+            sig = signatures.get(os.path.basename(pkg.path))
+            if sig is not None:
+                pkg.extra.append(sig.path)
+                pkg.size += sig.stat(follow_symlinks=False).st_size
+    return packages
+
+
+class PrunePlan:
+    """Что будет удалено: {имя: [CachedPackage]} и сводные цифры"""
+
+    def __init__(self):
+        self.remove = {}
+        self.kept = 0
+
+    def add(self, name, pkgs):
+        if pkgs:
+            self.remove.setdefault(name, []).extend(pkgs)
+
+    @property
+    def total(self):
+        return sum(p.size for pkgs in self.remove.values() for p in pkgs)
+
+    @property
+    def count(self):
+        return sum(len(pkgs) for pkgs in self.remove.values())
+
+    def files(self):
+        for pkgs in self.remove.values():
+            for pkg in pkgs:
+                yield from pkg.files
+
+    def report(self):
+        """Строки отчета: по пакету и итог"""
+        for name in sorted(self.remove):
+            pkgs = self.remove[name]
+            versions = ", ".join(p.version for p in pkgs)
+            yield f"{name}: {format_size(sum(p.size for p in pkgs))} ({versions})"
+        yield f"Итого: {self.count} файлов, {format_size(self.total)}; оставлено: {self.kept}"
+
+
+def plan_prune(packages, installed, keep=DEFAULT_KEEP, remove_uninstalled=False):
+    """Построить план очистки.
+
+    installed - {имя: версия} установленных пакетов. Для каждого пакета
+    остаются keep новейших версий и установленная; неустановленные при
+    remove_uninstalled удаляются полностью.
+    """
+    plan = PrunePlan()
+    for (name, _arch), versions in packages.items():
+        current = installed.get(name)
+        if current is None and remove_uninstalled:
+            plan.add(name, versions)
+            continue
+        versions = sorted(versions, key=lambda p: version_key(p.version), reverse=True)
+        extra = [p for p in versions[keep:] if p.version != current]
+        plan.kept += len(versions) - len(extra)
+        plan.add(name, extra)
+    return plan
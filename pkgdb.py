@@ -0,0 +1,189 @@
+"""Граф зависимостей локальной базы pacman.
+
+Разбирает desc-файлы из /var/lib/pacman/local, индексирует depends,
+optdepends, provides и причину установки и считает остаточные пакеты,
+включая те, что становятся остаточными после удаления других.
+Граф кэшируется и перестраивается только при изменении mtime каталога
+локальной базы.
+"""
+import json
+import os
+import re
+import threading
+
+LOCAL_DB = "var/lib/pacman/local"
+GRAPH_CACHE_VERSION = 1
+
+# Причина установки из %REASON%: 0 - явно, 1 - как зависимость
+REASON_EXPLICIT = 0
+REASON_DEPEND = 1
+
+_DEP_NAME = re.compile(r"^[^<>=:]+")
+
+
+def local_db_path(root="/"):
+    return os.path.join(root, LOCAL_DB)
+
+
+def parse_sections(lines):
+    """Разобрать строки формата desc/files в словарь {СЕКЦИЯ: [строки]}"""
+    sections = {}
+    current = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            current = sections.setdefault(line[1:-1], [])
+        elif line and current is not None:
+            current.append(line)
+    return sections
+
+
+def read_sections(path):
+    """Прочитать файл формата desc/files (см. parse_sections)"""
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        return parse_sections(f)
+
+
+def dep_name(spec):
+    """Имя из строки зависимости: 'foo>=1.0' -> 'foo', 'bar: описание' -> 'bar'"""
+    match = _DEP_NAME.match(spec.strip())
+    return match.group(0).strip() if match else spec.strip()
+
+
+class Package:
+    """Установленный пакет из локальной базы"""
+
+    __slots__ = ("name", "version", "reason", "size", "depends", "optdepends", "provides")
+
+    def __init__(self, name, version, reason, size, depends, optdepends, provides):
+        self.name = name
+        self.version = version
+        self.reason = reason
+        self.size = size
+        self.depends = depends
+        self.optdepends = optdepends
+        self.provides = provides
+
+    @classmethod
+    def from_desc(cls, desc):
+        return cls(
+            name=desc["NAME"][0],
+            version=desc.get("VERSION", [""])[0],
+            reason=int(desc.get("REASON", [REASON_EXPLICIT])[0]),
+            size=int(desc.get("SIZE", [0])[0]),
+            depends=[dep_name(d) for d in desc.get("DEPENDS", [])],
+            optdepends=[dep_name(d) for d in desc.get("OPTDEPENDS", [])],
+            provides=[dep_name(p) for p in desc.get("PROVIDES", [])],
+        )
+
+    def to_list(self):
+        return [self.name, self.version, self.reason, self.size,
+                self.depends, self.optdepends, self.provides]
+
+
+class DependencyGraph:
+    """Индекс установленных пакетов и обратных зависимостей"""
+
+    def __init__(self, packages, mtime_ns=None):
+        self.mtime_ns = mtime_ns
+        self.packages = {p.name: p for p in packages}
+        # Какие пакеты предоставляют имя (сам пакет и его provides)
+        self.providers = {}
+        for pkg in packages:
+            self.providers.setdefault(pkg.name, []).append(pkg.name)
+            for name in pkg.provides:
+                self.providers.setdefault(name, []).append(pkg.name)
+        # Кто требует пакет (depends и optdepends)
+        self.required_by = {name: set() for name in self.packages}
+        for pkg in packages:
+            for target in self.resolve(pkg.depends + pkg.optdepends):
+                if target != pkg.name:
+                    self.required_by[target].add(pkg.name)
+
+    def resolve(self, names):
+        """Установленные пакеты, удовлетворяющие списку зависимостей"""
+        found = []
+        for name in names:
+            found.extend(self.providers.get(name, ()))
+        return found
+
+    def orphans(self):
+        """Остаточные пакеты с учетом рекурсивных, в порядке обнаружения.
+
+        Пакет остаточный, если установлен как зависимость и все, кто его
+        требует, сами остаточные.
+        """
+        remaining = {name: len(req) for name, req in self.required_by.items()}
+        queue = [name for name, pkg in self.packages.items()
+                 if pkg.reason == REASON_DEPEND and not remaining[name]]
+        queue.sort()
+        found = set(queue)
+        i = 0
+        while i < len(queue):
+            pkg = self.packages[queue[i]]
+            i += 1
+            for target in set(self.resolve(pkg.depends + pkg.optdepends)):
+                if target == pkg.name or target in found:
+                    continue
+                remaining[target] -= 1
+                if not remaining[target] and self.packages[target].reason == REASON_DEPEND:
+                    found.add(target)
+                    queue.append(target)
+        return [self.packages[name] for name in queue]
+
+    def to_dict(self):
+        return {"version": GRAPH_CACHE_VERSION, "mtime_ns": self.mtime_ns,
+                "packages": [p.to_list() for p in self.packages.values()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Package(*row) for row in data["packages"]], data["mtime_ns"])
+
+
+def build_graph(root="/"):
+    """Прочитать локальную базу и построить граф"""
+    db = local_db_path(root)
+    mtime_ns = os.stat(db).st_mtime_ns
+    packages = []
+    with os.scandir(db) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            try:
+                desc = read_sections(os.path.join(entry.path, "desc"))
+            except OSError:
+                continue
+            if "NAME" in desc:
+                packages.append(Package.from_desc(desc))
+    return DependencyGraph(packages, mtime_ns)
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def load_graph(root="/", cache_file=None):
+    """Граф из кэша (в памяти или на диске) либо построенный заново"""
+    mtime_ns = os.stat(local_db_path(root)).st_mtime_ns
+    with _graphs_lock:
+        graph = _graphs.get(root)
+        if graph is not None and graph.mtime_ns == mtime_ns:
+            return graph
+        graph = None
+        if cache_file:
+            try:
+                with open(cache_file, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == GRAPH_CACHE_VERSION and data.get("mtime_ns") == mtime_ns:
+                    graph = DependencyGraph.from_dict(data)
+            except (OSError, ValueError, KeyError, TypeError):
+                graph = None
+        if graph is None:
+            graph = build_graph(root)
+            if cache_file:
+                tmp = cache_file + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(graph.to_dict(), f, separators=(",", ":"))
+                os.replace(tmp, cache_file)
+        _graphs[root] = graph
+        return graph
@@ -0,0 +1,220 @@
+"""Параллельная предзагрузка пакетов в кэш pacman с нескольких зеркал.
+
+Список загрузок (адрес, размер, SHA-256) берется из pacman -Sup, файлы
+качаются параллельно с лучших зеркал из истории ранжирования в каталог
+пользователя (кэш пакетов принадлежит root). Частично скачанные файлы
+докачиваются, контрольная сумма считается по мере загрузки. Готовые
+файлы переносит в кэш pacman одно действие помощника (add-to-cache,
+см. privileged.py), после чего обычный pacman -Syu находит все пакеты
+уже в кэше.
+"""
+import hashlib
+import http.client
+import os
+import queue
+import subprocess
+import threading
+import time
+import urllib.request
+
+PKG_CACHE = "/var/cache/pacman/pkg"
+# Формат вывода pacman -Sup: репозиторий, файл, размер, sha256, адрес
+PRINT_FORMAT = "%r %f %s %h %l"
+CHUNK = 256 * 1024
+DEFAULT_TIMEOUT = 30
+# Сколько лучших зеркал использовать и потоков на одно зеркало
+DEFAULT_MIRRORS = 3
+STREAMS_PER_MIRROR = 2
+
+
+class Download:
+    """Один пакет для загрузки"""
+
+    def __init__(self, repo, filename, size, sha256, url):
+        self.repo = repo
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.url = url
+        self.failed_on = set()
+
+
+def parse_print_output(text):
+    """Разобрать вывод pacman -Sup --print-format PRINT_FORMAT"""
+    downloads = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) != 5 or not fields[2].isdigit():
+            continue
+        repo, filename, size, sha256, url = fields
+        if url.startswith("file://"):
+            continue
+        downloads.append(Download(repo, filename, int(size), sha256.lower(), url))
+    return downloads
+
+
+def resolve_downloads(pacman="pacman"):
+    """Пакеты, которые скачает pacman -Su (базы должны быть синхронизированы)"""
+    result = subprocess.run(
+        [pacman, "-Sup", "--print-format", PRINT_FORMAT],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"pacman -Sup: код {result.returncode}")
+    return parse_print_output(result.stdout)
+
+
+def mirror_url(server, download, arch=None):
+    """Адрес пакета на конкретном зеркале"""
+    arch = arch or os.uname().machine
+    base = server.replace("$repo", download.repo).replace("$arch", arch)
+    return base.rstrip("/") + "/" + download.filename
+
+
+class PrefetchStats:
+    """Счетчики загрузки: всего и по зеркалам"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.bytes = 0
+        self.per_mirror = {}
+        self.done = []
+        self.cached = []
+        self.failed = []
+
+    def add(self, server, count):
+        with self.lock:
+            self.bytes += count
+            self.per_mirror[server] = self.per_mirror.get(server, 0) + count
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def throughput(self):
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+
+class ChecksumError(Exception):
+    """Контрольная сумма скачанного файла не совпала"""
+
+
+def fetch(url, download, part_path, stats, server, should_stop, timeout=DEFAULT_TIMEOUT):
+    """Скачать (или докачать) файл в part_path, проверяя SHA-256 на лету"""
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part_path):
+        with open(part_path, "rb") as f:
+            while True:
+                block = f.read(CHUNK)
+                if not block:
+                    break
+                digest.update(block)
+                offset += len(block)
+        if offset > download.size:
+            os.unlink(part_path)
+            digest, offset = hashlib.sha256(), 0
+
+    if offset < download.size:
+        request = urllib.request.Request(url, headers={"User-Agent": "manjaro_updater"})
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if offset and response.status != 206:
+                # Зеркало не умеет докачку: начинаем заново
+                digest, offset = hashlib.sha256(), 0
+            with open(part_path, "ab" if offset else "wb") as out:
+                while True:
+                    if should_stop():
+                        return False
+                    block = response.read(CHUNK)
+                    if not block:
+                        break
+                    out.write(block)
+                    digest.update(block)
+                    stats.add(server, len(block))
+
+    if download.sha256 and digest.hexdigest() != download.sha256:
+        os.unlink(part_path)
+        raise ChecksumError(download.filename)
+    if os.path.getsize(part_path) != download.size:
+        raise ChecksumError(f"{download.filename}: неполный файл")
+    return True
+
+
+def staged_files(staging_dir, downloads):
+    """Пути скачанных в staging_dir файлов, которые еще не перенесены в кэш"""
+    return [os.path.join(staging_dir, d.filename) for d in downloads
+            if os.path.exists(os.path.join(staging_dir, d.filename))]
+
+
+def prefetch(downloads, servers, staging_dir, cache_dir=PKG_CACHE, streams=STREAMS_PER_MIRROR,
+             should_stop=lambda: False, progress=None, arch=None, timeout=DEFAULT_TIMEOUT):
+    """Скачать пакеты в staging_dir, распределяя их по зеркалам servers.
+
+    Пакеты, которые уже есть в cache_dir или в staging_dir, не качаются.
+    Файлы берутся из общей очереди (крупные первыми), поэтому быстрые
+    зеркала сами забирают больше работы. При ошибке файл возвращается в
+    очередь для другого зеркала. progress(stats, download) вызывается
+    после каждого готового файла.
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    stats = PrefetchStats()
+    work = queue.Queue()
+    pending = 0
+    for download in sorted(downloads, key=lambda d: d.size, reverse=True):
+        if (os.path.exists(os.path.join(cache_dir, download.filename))
+                or os.path.exists(os.path.join(staging_dir, download.filename))):
+            stats.cached.append(download)
+        else:
+            work.put(download)
+            pending += 1
+    remaining = [pending]
+    remaining_lock = threading.Lock()
+
+    def finish(download, ok):
+        with remaining_lock:
+            remaining[0] -= 1
+            (stats.done if ok else stats.failed).append(download)
+        if progress:
+            progress(stats, download)
+
+    def worker(server):
+        while not should_stop():
+            with remaining_lock:
+                if remaining[0] <= 0:
+                    return
+            try:
+                download = work.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if server in download.failed_on:
+                # Этому зеркалу файл не дался, оставляем его другим
+                work.put(download)
+                time.sleep(0.05)
+                continue
+            part = os.path.join(staging_dir, download.filename + ".part")
+            try:
+                if fetch(mirror_url(server, download, arch), download, part, stats,
+                         server, should_stop, timeout):
+                    os.replace(part, os.path.join(staging_dir, download.filename))
+                    finish(download, True)
+            except (OSError, http.client.HTTPException, ChecksumError):
+                download.failed_on.add(server)
+                if download.failed_on >= set(servers):
+                    finish(download, False)
+                else:
+                    work.put(download)
+
+    threads = [threading.Thread(target=worker, args=(server,), daemon=True)
+               for server in servers for _ in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
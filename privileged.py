@@ -0,0 +1,729 @@
+"""Команды, выполняемые с правами root.
+
+Вместо sudo на каждый шаг приложение один раз за сеанс запускает
+помощника с правами root (через pkexec или sudo). Помощник слушает
+Unix-сокет в личном каталоге пользователя, принимает команды в виде
+argv, выполняет каждую в своей группе процессов и пересылает вывод
+кадрами с номером задания. Соединение одно; когда оно закрывается,
+помощник останавливает свои процессы и завершается.
+
+    python3 -I privileged.py --serve СОКЕТ --uid UID  < секрет
+
+Помощник обслуживает только клиента с нужным uid, предъявившего
+случайный секрет этого запуска (передается через stdin, который sudo
+и pkexec сохраняют). Запускаются только программы из ALLOWED, и только
+из ROOT_PATH, а не из PATH пользователя. Файловые операции (удаление,
+жесткие ссылки, каталоги, mirrorlist) выполняют действия этого же
+модуля, которые проверяют, что пути лежат внутри SAFE_ROOTS
+(рекурсивное удаление - только внутри RECURSIVE_ROOTS):
+
+    python3 -I privileged.py --verb remove-paths СПИСОК [--recursive]
+
+Без прав root действия пути не ограничивают (их ограничивают права
+пользователя), а без pkexec/sudo (launcher=[]) помощник работает от
+пользователя, что удобно для проверки на заглушках.
+"""
+import errno
+import fcntl
+import hmac
+import json
+import os
+import pty
+import pwd
+import re
+import secrets
+import shlex
+import shutil
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import termios
+import threading
+import time
+
+# Кадр: номер задания, вид, длина данных
+FRAME = struct.Struct("!IBI")
+RUN = 1
+CANCEL = 2
+OUTPUT = 3
+EXIT = 4
+ERROR = 5
+AUTH = 6
+
+READ_CHUNK = 64 * 1024
+START_TIMEOUT = 120
+# Размер псевдотерминала для вывода команд: по ширине pacman рисует полосы
+PTY_COLUMNS = 100
+PTY_ROWS = 40
+
+# Программы, которые помощник согласен запускать, и где он их ищет
+ALLOWED = {"pacman", "journalctl", "btrfs"}
+ROOT_PATH = ("/usr/bin", "/usr/sbin")
+
+# Каталоги, внутри которых действия помощника меняют файлы
+PKG_CACHE_ROOT = "/var/cache/pacman"
+LOG_ROOT = "/var/log"
+# Не внутри /.snapshots: там snapper ожидает только свои нумерованные каталоги
+SNAPSHOT_ROOT = "/.manjaro_updater_snapshots"
+SAFE_ROOTS = (PKG_CACHE_ROOT, LOG_ROOT, SNAPSHOT_ROOT)
+# Рекурсивно удаляются только наборы отката
+ROLLBACK_ROOT = os.path.join(PKG_CACHE_ROOT, "rollback")
+RECURSIVE_ROOTS = (ROLLBACK_ROOT,)
+PKG_DIR = os.path.join(PKG_CACHE_ROOT, "pkg")
+MIRRORLIST = "/etc/pacman.d/mirrorlist"
+
+# Имена файлов, которые можно положить в кэш пакетов
+_PACKAGE_FILE = re.compile(r"^[A-Za-z0-9@_+][A-Za-z0-9@._+:-]*\.pkg\.tar(?:\.[a-z0-9]+)?(?:\.sig)?$")
+
+HELPER = os.path.abspath(__file__)
+
+
+def write_file_list(paths, list_path):
+    """Записать пути через NUL (список для действий помощника), вернуть list_path"""
+    with open(list_path, "wb") as f:
+        for name in paths:
+            f.write(os.fsencode(name) + b"\0")
+    return list_path
+
+
+def read_file_list(list_path):
+    with open(list_path, "rb") as f:
+        return [os.fsdecode(name) for name in f.read().split(b"\0") if name]
+
+
+def verb_command(verb, *args, sudo=True):
+    """argv действия помощника (VERBS), через sudo или от пользователя"""
+    argv = [sys.executable, "-I", HELPER, "--verb", verb] + [str(arg) for arg in args]
+    return ["sudo"] + argv if sudo else argv
+
+
+def bulk_remove_command(list_path, recursive=False, sudo=True):
+    """Удалить все пути из списка одним действием помощника"""
+    args = [list_path, "--recursive"] if recursive else [list_path]
+    return verb_command("remove-paths", *args, sudo=sudo)
+
+
+def open_pty():
+    """(ведущий, подчиненный) дескрипторы псевдотерминала для вывода команды.
+
+    На терминале pacman и yay рисуют полосы прогресса и счетчики (n/m),
+    в канал - нет. Эхо и замена \\n на \\r\\n отключены. Модуль помощника
+    не импортирует остальное приложение, поэтому функция живет здесь и
+    используется и помощником, и core.run_command.
+    """
+    master, slave = pty.openpty()
+    try:
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", PTY_ROWS, PTY_COLUMNS, 0, 0))
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.OPOST
+        attrs[3] &= ~termios.ECHO
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+    except OSError:
+        os.close(master)
+        os.close(slave)
+        raise
+    return master, slave
+
+
+def read_pty(fd, size=READ_CHUNK):
+    """Прочитать блок с ведущей стороны псевдотерминала; b"" в конце вывода (EIO)"""
+    try:
+        return os.read(fd, size)
+    except OSError as e:
+        if e.errno == errno.EIO:
+            return b""
+        raise
+
+
+def privileged_argv(command):
+    """argv команды без sudo, если она выполняется через sudo, иначе None"""
+    if isinstance(command, str):
+        if not command.startswith("sudo "):
+            return None
+        argv = shlex.split(command)
+    else:
+        argv = list(command)
+    if len(argv) > 1 and argv[0] == "sudo" and not argv[1].startswith("-"):
+        return argv[1:]
+    return None
+
+
+def send_frame(sock, lock, job, kind, payload=b""):
+    with lock:
+        sock.sendall(FRAME.pack(job, kind, len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """(задание, вид, данные) или None, если соединение закрыто"""
+    header = _recv_exact(sock, FRAME.size)
+    if header is None:
+        return None
+    job, kind, length = FRAME.unpack(header)
+    payload = _recv_exact(sock, length) if length else b""
+    if payload is None:
+        return None
+    return job, kind, payload
+
+
+def resolve_program(name, path=ROOT_PATH, allowed=ALLOWED):
+    """Абсолютный путь разрешенной программы в path или None.
+
+    Имя со слешем принимается, только если это ровно такой путь.
+    """
+    if "/" in name:
+        candidates = {os.path.join(d, program) for d in path for program in allowed}
+        return name if name in candidates and os.access(name, os.X_OK) else None
+    if name not in allowed:
+        return None
+    for directory in path:
+        candidate = os.path.join(directory, name)
+        if os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def verb_argv(argv):
+    """argv, если это вызов действия этого модуля (verb_command), иначе None"""
+    prefix = [sys.executable, "-I", HELPER, "--verb"]
+    rest = argv[len(prefix):]
+    if argv[:len(prefix)] == prefix and rest and rest[0] in VERBS:
+        return list(argv)
+    return None
+
+
+# --- Действия с путями ---
+
+class UnsafePath(ValueError):
+    """Путь вне разрешенных каталогов"""
+
+
+def check_path(path, roots, allow_root=False):
+    """Проверить, что path лежит внутри одного из roots (сам root - при allow_root).
+
+    Родительский каталог раскрывается realpath, последний компонент
+    - нет: удаление или ссылка касаются самой записи, а не цели ссылки.
+    roots=None - без ограничений (действие выполняется не от root).
+    """
+    if roots is None:
+        return path
+    if not os.path.isabs(path) or os.path.normpath(path) != path or path == "/":
+        raise UnsafePath(path)
+    real = os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+    for root in roots:
+        root = os.path.realpath(root)
+        if real.startswith(root.rstrip("/") + "/") or (allow_root and real == root):
+            return real
+    raise UnsafePath(path)
+
+
+def remove_paths(paths, roots=SAFE_ROOTS, recursive=False):
+    """Удалить пути (как rm -f, с recursive - как rm -rf); вернуть число ошибок"""
+    errors = 0
+    for path in paths:
+        try:
+            real = check_path(path, roots)
+            if recursive and os.path.isdir(real) and not os.path.islink(real):
+                shutil.rmtree(real)
+            else:
+                os.unlink(real)
+        except FileNotFoundError:
+            continue
+        except (OSError, UnsafePath) as e:
+            print(f"{path}: {e if isinstance(e, OSError) else 'путь вне разрешенных каталогов'}",
+                  file=sys.stderr)
+            errors += 1
+    return errors
+
+
+def link_paths(paths, target, roots=SAFE_ROOTS):
+    """Жестко связать файлы в каталог target (как ln -f -t); вернуть число ошибок"""
+    errors = 0
+    target = check_path(target, roots)
+    for path in paths:
+        try:
+            source = check_path(path, roots)
+            dest = os.path.join(target, os.path.basename(source))
+            try:
+                os.link(source, dest, follow_symlinks=False)
+            except FileExistsError:
+                os.unlink(dest)
+                os.link(source, dest, follow_symlinks=False)
+        except (OSError, UnsafePath) as e:
+            print(f"{path}: {e if isinstance(e, OSError) else 'путь вне разрешенных каталогов'}",
+                  file=sys.stderr)
+            errors += 1
+    return errors
+
+
+def make_dirs(paths, roots=SAFE_ROOTS, mode=0o755):
+    """Создать каталоги (как install -d); вернуть число ошибок"""
+    errors = 0
+    for path in paths:
+        try:
+            os.makedirs(check_path(path, roots, allow_root=True), mode=mode, exist_ok=True)
+        except (OSError, UnsafePath) as e:
+            print(f"{path}: {e if isinstance(e, OSError) else 'путь вне разрешенных каталогов'}",
+                  file=sys.stderr)
+            errors += 1
+    return errors
+
+
+def caller_uid():
+    """uid пользователя, получившего root через sudo или pkexec, или None"""
+    value = os.environ.get("PKEXEC_UID") or os.environ.get("SUDO_UID")
+    return int(value) if value and value.isdigit() else None
+
+
+def invoking_user():
+    """Запись pwd пользователя, запустившего программу через sudo или pkexec.
+
+    None, если программа работает не от root или вызвавший неизвестен:
+    тогда домашний каталог и права - текущего пользователя.
+    """
+    uid = caller_uid() if os.geteuid() == 0 else None
+    if not uid:
+        return None
+    try:
+        return pwd.getpwuid(uid)
+    except KeyError:
+        return None
+
+
+def as_user(command, user=None):
+    """Команда от имени user (запись pwd) с его HOME или как есть"""
+    if user is None:
+        return command
+    return ["runuser", "-u", user.pw_name, "--", "env", f"HOME={user.pw_dir}",
+            f"USER={user.pw_name}", f"LOGNAME={user.pw_name}"] + command
+
+
+def add_to_cache(paths, cache_dir=PKG_DIR, owner=None):
+    """Скопировать скачанные пакеты в кэш pacman; вернуть число ошибок.
+
+    Принимаются только обычные файлы с именем пакета или подписи и, если
+    задан owner, принадлежащие ему: так нельзя выложить в кэш чужой файл.
+    Подлинность пакета pacman проверяет сам при установке.
+    """
+    errors = 0
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            if not _PACKAGE_FILE.match(name):
+                raise UnsafePath(path)
+            fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+            with open(fd, "rb") as source:
+                st = os.fstat(fd)
+                if not stat.S_ISREG(st.st_mode) or (owner is not None and st.st_uid != owner):
+                    raise UnsafePath(path)
+                with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=".", suffix=".part",
+                                                 delete=False) as out:
+                    try:
+                        shutil.copyfileobj(source, out, READ_CHUNK)
+                        os.fchmod(out.fileno(), 0o644)
+                    except BaseException:
+                        os.unlink(out.name)
+                        raise
+            os.replace(out.name, os.path.join(cache_dir, name))
+        except (OSError, UnsafePath) as e:
+            print(f"{path}: {e if isinstance(e, OSError) else 'недопустимый файл пакета'}",
+                  file=sys.stderr)
+            errors += 1
+    return errors
+
+
+def install_mirrorlist(source, target=MIRRORLIST):
+    """Установить mirrorlist из source с резервной копией target~.
+
+    Принимается только файл из комментариев и строк Server с адресом
+    http(s)/ftp, поэтому записать в target что-то другое нельзя.
+    """
+    with open(source, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        key, _, value = (part.strip() for part in text.partition("="))
+        if key != "Server" or value.split("://", 1)[0] not in ("http", "https", "ftp"):
+            print(f"{source}: недопустимая строка mirrorlist: {text}", file=sys.stderr)
+            return 1
+    if os.path.exists(target):
+        shutil.copy2(target, target + "~")
+    tmp = target + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, target)
+    return 0
+
+
+# Действия помощника и их аргументы
+VERBS = {
+    "remove-paths": "СПИСОК [--recursive]",
+    "link-paths": "СПИСОК КАТАЛОГ",
+    "make-dir": "КАТАЛОГ...",
+    "add-to-cache": "СПИСОК [КАТАЛОГ]",
+    "install-mirrorlist": "ФАЙЛ [ЦЕЛЬ]",
+}
+
+
+def run_verb(verb, args):
+    """Выполнить действие от имени текущего пользователя и вернуть код выхода"""
+    roots = SAFE_ROOTS if os.geteuid() == 0 else None
+    try:
+        if verb == "remove-paths" and len(args) in (1, 2) and args[1:] in ([], ["--recursive"]):
+            recursive = len(args) == 2
+            if recursive and roots is not None:
+                roots = RECURSIVE_ROOTS
+            return 1 if remove_paths(read_file_list(args[0]), roots, recursive=recursive) else 0
+        if verb == "link-paths" and len(args) == 2:
+            return 1 if link_paths(read_file_list(args[0]), args[1], roots) else 0
+        if verb == "make-dir" and args:
+            return 1 if make_dirs(args, roots) else 0
+        if verb == "add-to-cache" and len(args) in (1, 2):
+            cache_dir = args[1] if len(args) == 2 else PKG_DIR
+            owner = caller_uid() if roots is not None else None
+            if roots is not None and (cache_dir != PKG_DIR or owner is None):
+                raise UnsafePath(cache_dir)
+            return 1 if add_to_cache(read_file_list(args[0]), cache_dir, owner) else 0
+        if verb == "install-mirrorlist" and len(args) in (1, 2):
+            target = args[1] if len(args) == 2 else MIRRORLIST
+            if roots is not None and target != MIRRORLIST:
+                raise UnsafePath(target)
+            return install_mirrorlist(args[0], target)
+    except (OSError, UnsafePath, ValueError) as e:
+        print(f"{verb}: {e}", file=sys.stderr)
+        return 1
+    print(f"использование: --verb {verb} {VERBS.get(verb, '')}", file=sys.stderr)
+    return 2
+
+
+# --- Помощник (сторона root) ---
+
+class HelperSession:
+    """Обслуживание одного клиента: задания, вывод, отмена"""
+
+    def __init__(self, sock, allowed=ALLOWED):
+        self.sock = sock
+        self.allowed = allowed
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+
+    def serve(self):
+        try:
+            while True:
+                frame = recv_frame(self.sock)
+                if frame is None:
+                    break
+                job, kind, payload = frame
+                if kind == RUN:
+                    argv = json.loads(payload.decode("utf-8"))["argv"]
+                    threading.Thread(target=self.run_job, args=(job, argv), daemon=True).start()
+                elif kind == CANCEL:
+                    self.cancel(job)
+        finally:
+            with self.jobs_lock:
+                jobs = list(self.jobs)
+            for job in jobs:
+                self.cancel(job)
+
+    def cancel(self, job):
+        with self.jobs_lock:
+            process = self.jobs.get(job)
+        if process is not None:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def send(self, job, kind, payload=b""):
+        try:
+            send_frame(self.sock, self.lock, job, kind, payload)
+        except OSError:
+            # Клиент ушел: serve() завершится и остановит задания
+            pass
+
+    def run_job(self, job, argv):
+        command = verb_argv(argv) if argv else None
+        if command is None and argv:
+            program = resolve_program(argv[0], allowed=self.allowed)
+            command = [program] + argv[1:] if program else None
+        if command is None:
+            self.send(job, ERROR, f"команда не разрешена: {argv[:1]}".encode("utf-8"))
+            self.send(job, EXIT, json.dumps({"code": 126}).encode("utf-8"))
+            return
+        env = dict(os.environ, PATH=":".join(ROOT_PATH))
+        try:
+            master, slave = open_pty()
+            try:
+                process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=slave,
+                                           stderr=slave, start_new_session=True, env=env)
+            except OSError:
+                os.close(master)
+                raise
+            finally:
+                os.close(slave)
+        except OSError as e:
+            self.send(job, ERROR, str(e).encode("utf-8"))
+            self.send(job, EXIT, json.dumps({"code": 127}).encode("utf-8"))
+            return
+        with self.jobs_lock:
+            self.jobs[job] = process
+        try:
+            while True:
+                chunk = read_pty(master)
+                if not chunk:
+                    break
+                self.send(job, OUTPUT, chunk)
+        finally:
+            os.close(master)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        with self.jobs_lock:
+            self.jobs.pop(job, None)
+        result = {"code": process.returncode, "cpu_user_s": round(usage.ru_utime, 3),
+                  "cpu_sys_s": round(usage.ru_stime, 3), "max_rss_kb": usage.ru_maxrss}
+        self.send(job, EXIT, json.dumps(result).encode("utf-8"))
+
+
+def serve(path, uid, token):
+    """Принять одно соединение на сокете path и обслуживать его.
+
+    Клиент должен иметь uid (или быть root) и первым кадром прислать token.
+    """
+    old = os.umask(0o177)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(old)
+    if os.geteuid() == 0 and uid != 0:
+        # Каталог сокета принадлежит пользователю: ссылку вместо сокета не разыменовывать
+        os.lchown(path, uid, -1)
+    if not stat.S_ISSOCK(os.lstat(path).st_mode):
+        listener.close()
+        return 1
+    listener.listen(1)
+    listener.settimeout(START_TIMEOUT)
+    try:
+        sock, _ = listener.accept()
+    except socket.timeout:
+        # Клиент так и не подключился (например, закрыл окно pkexec)
+        return 1
+    finally:
+        listener.close()
+        os.unlink(path)
+    with sock:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, peer_uid, _ = struct.unpack("3i", creds)
+        if peer_uid not in (uid, 0):
+            return 1
+        sock.settimeout(START_TIMEOUT)
+        try:
+            frame = recv_frame(sock)
+        except OSError:
+            return 1
+        if frame is None or frame[1] != AUTH or not hmac.compare_digest(frame[2], token):
+            return 1
+        sock.settimeout(None)
+        HelperSession(sock).serve()
+    return 0
+
+
+# --- Клиент (сторона приложения) ---
+
+class WorkerError(Exception):
+    """Помощник не запустился или соединение с ним потеряно"""
+
+
+class _Job:
+    def __init__(self, on_output):
+        self.on_output = on_output
+        self.done = threading.Event()
+        self.result = None
+
+
+def default_launcher():
+    """Чем запускать помощника: ничем (уже root), pkexec с дисплеем или sudo"""
+    if os.geteuid() == 0:
+        return []
+    if (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")) and shutil.which("pkexec"):
+        return ["pkexec"]
+    return ["sudo"]
+
+
+class PrivilegedWorker:
+    """Клиент долгоживущего помощника с правами root"""
+
+    def __init__(self, launcher=None, timeout=START_TIMEOUT):
+        self.launcher = default_launcher() if launcher is None else list(launcher)
+        self.timeout = timeout
+        self.token = secrets.token_hex(32).encode("ascii")
+        self.process = None
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.next_job = 1
+        self._tmpdir = None
+
+    @property
+    def alive(self):
+        return self.sock is not None
+
+    def start(self):
+        """Запустить помощника и подключиться к нему"""
+        self._tmpdir = tempfile.mkdtemp(prefix="manjaro_updater.")
+        path = os.path.join(self._tmpdir, "helper.sock")
+        command = self.launcher + [sys.executable, "-I", HELPER,
+                                   "--serve", path, "--uid", str(os.getuid())]
+        # Секрет идет через stdin: sudo закрывает остальные дескрипторы,
+        # а пароль спрашивает через терминал, а не stdin
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            self.process.stdin.write(self.token + b"\n")
+            self.process.stdin.close()
+        except OSError:
+            pass
+        deadline = time.monotonic() + self.timeout
+        while True:
+            # Сокет появляется после bind, но принимает соединения только после listen
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                break
+            except OSError:
+                sock.close()
+            if self.process.poll() is not None:
+                self.close()
+                raise WorkerError(f"помощник завершился с кодом {self.process.returncode}")
+            if time.monotonic() > deadline:
+                self.close()
+                raise WorkerError("помощник не запустился вовремя")
+            time.sleep(0.05)
+        try:
+            send_frame(sock, self.send_lock, 0, AUTH, self.token)
+        except OSError as e:
+            sock.close()
+            self.close()
+            raise WorkerError(f"помощник не принял соединение: {e}")
+        self.sock = sock
+        threading.Thread(target=self._reader, daemon=True).start()
+        return self
+
+    def _reader(self):
+        sock = self.sock
+        try:
+            while True:
+                frame = recv_frame(sock)
+                if frame is None:
+                    break
+                job_id, kind, payload = frame
+                with self.jobs_lock:
+                    job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == OUTPUT:
+                    job.on_output(payload)
+                elif kind == ERROR:
+                    job.on_output(b"\n" + payload + b"\n")
+                elif kind == EXIT:
+                    job.result = json.loads(payload.decode("utf-8"))
+                    job.done.set()
+        except OSError:
+            pass
+        # Соединение потеряно: ожидающие задания завершаются с ошибкой
+        self.sock = None
+        with self.jobs_lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.done.set()
+
+    def run(self, argv, on_output):
+        """Выполнить argv в помощнике; вернуть {"code": ..., ...} после завершения"""
+        sock = self.sock
+        if sock is None:
+            raise WorkerError("помощник не запущен")
+        job = _Job(on_output)
+        with self.jobs_lock:
+            job_id = self.next_job
+            self.next_job += 1
+            self.jobs[job_id] = job
+        try:
+            payload = json.dumps({"argv": list(argv)}).encode("utf-8")
+            try:
+                send_frame(sock, self.send_lock, job_id, RUN, payload)
+            except OSError as e:
+                raise WorkerError(f"соединение с помощником потеряно: {e}")
+            job.done.wait()
+            if job.result is None:
+                raise WorkerError("соединение с помощником потеряно")
+            return job.result
+        finally:
+            with self.jobs_lock:
+                self.jobs.pop(job_id, None)
+
+    def cancel_all(self):
+        """Остановить группы процессов всех выполняющихся заданий"""
+        sock = self.sock
+        if sock is None:
+            return
+        with self.jobs_lock:
+            jobs = list(self.jobs)
+        for job_id in jobs:
+            try:
+                send_frame(sock, self.send_lock, job_id, CANCEL)
+            except OSError:
+                break
+
+    def close(self):
+        """Закрыть соединение; помощник остановит задания и завершится"""
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+
+def main(argv):
+    if argv[:1] == ["--verb"] and len(argv) > 1:
+        return run_verb(argv[1], argv[2:])
+    import argparse
+    parser = argparse.ArgumentParser(description="Помощник manjaro_updater с правами root")
+    parser.add_argument("--serve", required=True, metavar="СОКЕТ")
+    parser.add_argument("--uid", type=int, required=True)
+    args = parser.parse_args(argv)
+    token = sys.stdin.buffer.readline().strip()
+    if not token:
+        print("помощник: нет секрета запуска в stdin", file=sys.stderr)
+        return 2
+    return serve(args.serve, args.uid, token)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""Планировщик шагов операции с учетом ресурсов.
+
+Операция описывается небольшим графом шагов: каждый шаг объявляет
+ресурсы, которые ему нужны (блокировка базы pacman, кэш yay, журнал,
+сеть...), и шаги, после которых он выполняется. Шаги без общих ресурсов
+запускаются одновременно. Ресурс может допускать несколько владельцев
+сразу (limits): так ограничивается число одновременных сборок.
+"""
+import collections
+import threading
+
+# Ресурсы, которые могут объявлять шаги
+PACMAN_DB = "pacman-db"
+PKG_CACHE = "pkg-cache"
+YAY_CACHE = "yay-cache"
+JOURNAL = "journal"
+LOGS = "logs"
+NETWORK = "network"
+MIRRORLIST = "mirrorlist"
+# Слот сборки makepkg; число слотов задается в limits
+BUILD = "build"
+
+
+class Step:
+    """Шаг операции: команда, ресурсы и зависимости от других шагов"""
+
+    def __init__(self, name, command, description, resources=(), after=()):
+        self.name = name
+        self.command = command
+        self.description = description
+        self.resources = frozenset(resources)
+        self.after = tuple(after)
+
+
+class StepScheduler:
+    """Выполняет граф шагов, запуская неконфликтующие шаги параллельно.
+
+    run_step(step) выполняет шаг и возвращает True при успехе. Шаги,
+    зависящие от неудавшегося, пропускаются; остальные продолжают
+    выполняться. should_stop() прерывает запуск новых шагов.
+    limits - {ресурс: сколько шагов могут занимать его одновременно},
+    по умолчанию ресурс занимает один шаг.
+    """
+
+    def __init__(self, run_step, max_parallel=None, limits=None):
+        self.run_step = run_step
+        self.max_parallel = max_parallel
+        self.limits = limits or {}
+
+    def _available(self, step, busy):
+        return all(busy[resource] < self.limits.get(resource, 1) for resource in step.resources)
+
+    def run(self, steps, should_stop=lambda: False):
+        """Выполнить шаги, вернуть {имя: True/False/None(не запускался)}"""
+        names = {step.name for step in steps}
+        for step in steps:
+            unknown = set(step.after) - names
+            if unknown:
+                raise ValueError(f"шаг {step.name}: неизвестные зависимости {sorted(unknown)}")
+        results = {step.name: None for step in steps}
+        pending = list(steps)
+        running = set()
+        busy = collections.Counter()
+        done = threading.Condition()
+
+        def worker(step):
+            try:
+                ok = bool(self.run_step(step))
+            except Exception:
+                ok = False
+            with done:
+                results[step.name] = ok
+                running.discard(step.name)
+                busy.subtract(step.resources)
+                done.notify_all()
+
+        with done:
+            while pending or running:
+                if should_stop():
+                    pending.clear()
+                started = False
+                for step in list(pending):
+                    deps = [results[name] for name in step.after]
+                    if any(dep is False for dep in deps):
+                        # Зависимость не удалась: шаг не выполняется
+                        results[step.name] = False
+                        pending.remove(step)
+                        started = True
+                        continue
+                    if any(dep is None for dep in deps) or not self._available(step, busy):
+                        continue
+                    if self.max_parallel and len(running) >= self.max_parallel:
+                        break
+                    pending.remove(step)
+                    running.add(step.name)
+                    busy.update(step.resources)
+                    threading.Thread(target=worker, args=(step,), daemon=True).start()
+                    started = True
+                if not started and (pending or running):
+                    if not running:
+                        raise RuntimeError("граф шагов не может продолжиться (цикл зависимостей)")
+                    done.wait(0.5)
+        return results
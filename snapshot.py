@@ -0,0 +1,320 @@
+"""Снимок перед транзакцией и откат к прежнему набору пакетов.
+
+Перед обновлением или очисткой (по настройке snapshot):
+- файлы установленных версий всех пакетов из кэша pacman жестко
+  связываются (ln, не копирование) в каталог набора отката
+  /var/cache/pacman/rollback/<id>. Это одна ссылка на файл пакета и его
+  подпись: время зависит от числа пакетов, а не от размера корня, и
+  места набор не занимает, пока очистка кэша не удалит оригиналы;
+- если корень - подтом btrfs, дополнительно создается его снимок
+  только для чтения (btrfs subvolume snapshot -r, постоянное время) в
+  отдельном каталоге, а не в /.snapshots, где snapper ждет только свои
+  нумерованные снимки. Вложенные подтома (@home, @cache) в него не
+  входят, поэтому набор пакетов создается и на btrfs: откат им не
+  требует перезагрузки.
+Манифест (версия, причина установки и файлы каждого пакета) хранится в
+кэше приложения; старые снимки сверх KEEP удаляются. Манифест может
+менять пользователь, поэтому удаляются только каталоги вида
+<каталог наборов>/<id> и <каталог снимков btrfs>/<id>, а помощник
+рекурсивно удаляет только внутри privileged.RECURSIVE_ROOTS.
+
+Откат сравнивает манифест с установленными пакетами: измененные и
+удаленные ставятся обратно одним pacman -U из набора отката, пакеты,
+появившиеся после снимка, только перечисляются. Версии, которых при
+снимке не было в кэше, откатить нельзя - они попадают в отчет.
+
+Каталоги и sudo - параметры, поэтому набор отката проверяется на
+обычном временном каталоге (benchmarks/bench_snapshot.py).
+"""
+import json
+import os
+import re
+import secrets
+import time
+
+import privileged
+from pkgdb import REASON_EXPLICIT
+from scheduler import PACMAN_DB, PKG_CACHE, Step
+
+ROLLBACK_DIR = privileged.ROLLBACK_ROOT
+BTRFS_DIR = privileged.SNAPSHOT_ROOT
+MOUNTS = "/proc/self/mounts"
+MANIFEST_VERSION = 1
+# Сколько последних снимков хранить
+KEEP = 3
+# Номер inode корня любого подтома btrfs (BTRFS_FIRST_FREE_OBJECTID)
+BTRFS_SUBVOLUME_INO = 256
+
+_MOUNT_ESCAPE = re.compile(r"\\([0-7]{3})")
+# Дата и время снимка и случайный суффикс (снимки в одну секунду); старые id без суффикса
+_ID = re.compile(r"^\d{8}-\d{6}(?:-[0-9a-f]{4})?$")
+
+
+def filesystem_type(path="/", mounts=MOUNTS):
+    """Тип файловой системы, на которой лежит path (по самой длинной точке монтирования)"""
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open(mounts) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Пробелы в путях экранированы как \040
+                point = _MOUNT_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+                inside = path == point or path.startswith(point.rstrip("/") + "/")
+                if inside and len(point) >= len(best):
+                    best, fstype = point, fields[2]
+    except OSError:
+        pass
+    return fstype
+
+
+def is_btrfs_subvolume(path="/", mounts=MOUNTS):
+    """Лежит ли path на btrfs и является ли корнем подтома (только его можно снять)"""
+    if filesystem_type(path, mounts) != "btrfs":
+        return False
+    try:
+        return os.stat(path).st_ino == BTRFS_SUBVOLUME_INO
+    except OSError:
+        return False
+
+
+def new_id(now=None):
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + "-" + secrets.token_hex(2)
+
+
+def expirable(path, parent):
+    """Путь из манифеста - каталог снимка <parent>/<id>, а не что-то другое"""
+    return (isinstance(path, str) and os.path.dirname(path) == parent.rstrip("/")
+            and _ID.match(os.path.basename(path)) is not None)
+
+
+class Snapshot:
+    """Запись манифеста: набор отката и, если есть, снимок btrfs"""
+
+    def __init__(self, snapshot_id, ts, operation, rollback_dir, packages, missing, btrfs=None):
+        self.id = snapshot_id
+        self.ts = ts
+        self.operation = operation
+        self.rollback_dir = rollback_dir
+        # {имя: [версия, причина установки, [имена файлов в наборе]]}
+        self.packages = packages
+        # Установленные пакеты, версий которых не было в кэше: {имя: версия}
+        self.missing = missing
+        self.btrfs = btrfs
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "ts": self.ts,
+            "operation": self.operation,
+            "rollback_dir": self.rollback_dir,
+            "packages": self.packages,
+            "missing": self.missing,
+            "btrfs": self.btrfs,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data["ts"], data.get("operation"), data["rollback_dir"],
+                   data["packages"], data.get("missing", {}), data.get("btrfs"))
+
+    @property
+    def file_count(self):
+        return sum(len(files) for _, _, files in self.packages.values())
+
+    def describe(self):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.ts))
+        text = f"Снимок {self.id} ({stamp}, {self.operation or '-'}): пакетов в наборе отката: {len(self.packages)}"
+        if self.missing:
+            text += f", нет в кэше: {len(self.missing)}"
+        if self.btrfs:
+            text += f"\nСнимок корня btrfs: {self.btrfs}"
+        return text
+
+
+def plan_snapshot(installed, cache, operation=None, rollback_root=ROLLBACK_DIR,
+                  btrfs_dir=None, now=None):
+    """Снимок для установленных пакетов и файлы кэша, которые в него войдут.
+
+    installed - {имя: (версия, причина установки)}, cache - результат
+    pkgcache.scan_cache(). btrfs_dir - каталог для снимка корня или None.
+    Возвращает (Snapshot, [пути файлов в кэше]).
+    """
+    now = now or time.time()
+    snapshot_id = new_id(now)
+    by_version = {}
+    for (name, _arch), versions in cache.items():
+        for pkg in versions:
+            by_version[(name, pkg.version)] = pkg
+    packages = {}
+    missing = {}
+    sources = []
+    for name, (version, reason) in sorted(installed.items()):
+        pkg = by_version.get((name, version))
+        if pkg is None:
+            missing[name] = version
+            continue
+        packages[name] = [version, reason, [os.path.basename(path) for path in pkg.files]]
+        sources.extend(pkg.files)
+    snapshot = Snapshot(snapshot_id, round(now, 3), operation, os.path.join(rollback_root, snapshot_id),
+                        packages, missing,
+                        os.path.join(btrfs_dir, snapshot_id) if btrfs_dir else None)
+    return snapshot, sources
+
+
+def _root(argv, sudo):
+    return ["sudo"] + argv if sudo else argv
+
+
+def snapshot_steps(snapshot, list_path, sudo=True, root="/"):
+    """Шаги создания снимка: каталоги, жесткие ссылки из списка list_path, снимок btrfs"""
+    directories = [snapshot.rollback_dir]
+    if snapshot.btrfs:
+        directories.append(os.path.dirname(snapshot.btrfs))
+    steps = [
+        Step("snapshot-dir", privileged.verb_command("make-dir", *directories, sudo=sudo),
+             "Создание каталогов снимка"),
+        Step("snapshot-links",
+             privileged.verb_command("link-paths", list_path, snapshot.rollback_dir, sudo=sudo),
+             f"Набор отката: {len(snapshot.packages)} пакетов, {snapshot.file_count} файлов (жесткие ссылки)",
+             resources={PKG_CACHE}, after=["snapshot-dir"]),
+    ]
+    if snapshot.btrfs:
+        steps.append(Step("snapshot-btrfs",
+                          _root(["btrfs", "subvolume", "snapshot", "-r", root, snapshot.btrfs], sudo),
+                          "Снимок корня btrfs", after=["snapshot-dir"]))
+    return steps
+
+
+def expired_dirs(expired, rollback_root=ROLLBACK_DIR):
+    """Каталоги наборов отката устаревших снимков, прошедшие проверку expirable"""
+    return [snapshot.rollback_dir for snapshot in expired if expirable(snapshot.rollback_dir, rollback_root)]
+
+
+def expire_steps(expired, list_path, sudo=True, rollback_root=ROLLBACK_DIR, btrfs_dir=BTRFS_DIR):
+    """Шаги удаления устаревших снимков.
+
+    list_path - список expired_dirs(expired, rollback_root)
+    (write_file_list). Снимки btrfs вне btrfs_dir пропускаются.
+    """
+    steps = []
+    dirs = expired_dirs(expired, rollback_root)
+    if dirs:
+        steps.append(Step("snapshot-expire",
+                          privileged.bulk_remove_command(list_path, recursive=True, sudo=sudo),
+                          f"Удаление старых наборов отката: {len(dirs)}"))
+    subvolumes = [snapshot.btrfs for snapshot in expired
+                  if snapshot.btrfs and expirable(snapshot.btrfs, btrfs_dir)]
+    if subvolumes:
+        steps.append(Step("snapshot-expire-btrfs",
+                          _root(["btrfs", "subvolume", "delete"] + subvolumes, sudo),
+                          f"Удаление старых снимков btrfs: {len(subvolumes)}"))
+    return steps
+
+
+class SnapshotStore:
+    """Манифест снимков (JSON), новые в конце"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if data.get("version") != MANIFEST_VERSION:
+            return []
+        return [Snapshot.from_dict(entry) for entry in data.get("snapshots", [])]
+
+    def save(self, snapshots):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION,
+                       "snapshots": [snapshot.to_dict() for snapshot in snapshots]},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def add(self, snapshot, keep=KEEP):
+        """Записать снимок, вернуть снимки, вышедшие за предел keep"""
+        snapshots = self.load() + [snapshot]
+        expired, snapshots = snapshots[:-keep], snapshots[-keep:]
+        self.save(snapshots)
+        return expired
+
+    def latest(self):
+        snapshots = self.load()
+        return snapshots[-1] if snapshots else None
+
+
+class RollbackPlan:
+    """Что вернуть к состоянию снимка"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        # [(имя, текущая версия или None, версия снимка)]
+        self.changes = []
+        # Пакеты, которые были зависимостями и удалены после снимка
+        self.dependencies = []
+        # Изменились, но файлов нет в наборе отката
+        self.unavailable = []
+        # Установлены после снимка
+        self.added = []
+        self.files = []
+
+    @property
+    def count(self):
+        return len(self.changes)
+
+    def report(self, limit=40):
+        lines = [self.snapshot.describe()]
+        if self.changes:
+            lines.append(f"Вернуть пакетов: {len(self.changes)}")
+        for name, current, version in self.changes[:limit]:
+            lines.append(f"  {name}: {current or 'удален'} -> {version}")
+        if len(self.changes) > limit:
+            lines.append(f"  ... и еще {len(self.changes) - limit}")
+        if self.unavailable:
+            lines.append(f"Нет в наборе отката (не было в кэше): {', '.join(self.unavailable)}")
+        if self.added:
+            lines.append(f"Установлены после снимка (не удаляются): {', '.join(self.added)}")
+        if not self.changes:
+            lines.append("Установленные пакеты совпадают со снимком")
+        return lines
+
+
+def plan_rollback(snapshot, installed):
+    """Сравнить снимок с установленными пакетами ({имя: версия})"""
+    plan = RollbackPlan(snapshot)
+    for name, (version, reason, files) in sorted(snapshot.packages.items()):
+        current = installed.get(name)
+        if current == version:
+            continue
+        plan.changes.append((name, current, version))
+        plan.files.extend(os.path.join(snapshot.rollback_dir, file) for file in files
+                          if not file.endswith(".sig"))
+        if current is None and reason != REASON_EXPLICIT:
+            plan.dependencies.append(name)
+    plan.unavailable = sorted(name for name, version in snapshot.missing.items()
+                              if installed.get(name) != version)
+    plan.added = sorted(name for name in installed
+                        if name not in snapshot.packages and name not in snapshot.missing)
+    return plan
+
+
+def rollback_steps(plan, sudo=True):
+    """Шаги отката: pacman -U из набора отката и причина установки для зависимостей"""
+    if not plan.files:
+        return []
+    steps = [Step("rollback", _root(["pacman", "-U", "--noconfirm"] + plan.files, sudo),
+                  f"Откат {plan.count} пакетов к снимку {plan.snapshot.id}",
+                  resources={PACMAN_DB})]
+    if plan.dependencies:
+        steps.append(Step("rollback-reason",
+                          _root(["pacman", "-D", "--asdeps"] + plan.dependencies, sudo),
+                          "Возврат пакетов в зависимости", resources={PACMAN_DB},
+                          after=["rollback"]))
+    return steps
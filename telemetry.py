@@ -0,0 +1,181 @@
+"""Телеметрия операций: история замеров и статистика.
+
+Каждый шаг (команда) и каждая операция записываются строкой JSON в
+файл истории: время выполнения, процессорное время и максимальный RSS
+дочернего процесса, объем вывода и код выхода. Для команд с транзакцией
+pacman отдельно записываются фазы (transaction.py): загрузка, установка,
+хуки и т.д. Статистика считает p50/p95 длительности по операциям, шагам и
+фазам и сравнивает последние запуски с предыдущими, чтобы были видны
+регрессии.
+
+История ограничена: когда файл вырастает больше MAX_BYTES, в нем
+остаются последние KEEP_BYTES. Оценкам времени нужны только последние
+запуски, поэтому они читают лишь хвост файла (RECENT_BYTES).
+"""
+import json
+import math
+import os
+import threading
+import time
+
+# Сколько последних запусков сравнивать с предыдущими
+RECENT_RUNS = 5
+# Предел размера истории, сколько оставлять при обрезке и сколько читать для оценок
+MAX_BYTES = 8 * 1024 ** 2
+KEEP_BYTES = 4 * 1024 ** 2
+RECENT_BYTES = 256 * 1024
+
+
+def read_tail(path, size):
+    """Последние size байт файла целыми строками"""
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        start = max(0, end - size)
+        f.seek(start)
+        data = f.read()
+    if start:
+        # Первая строка обрезана посередине
+        data = data[data.find(b"\n") + 1:] if b"\n" in data else b""
+    return data
+
+
+class Telemetry:
+    """Дописываемая история замеров в формате JSONL"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, keep_bytes=KEEP_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep_bytes = keep_bytes
+        self.lock = threading.Lock()
+
+    def record(self, kind, **fields):
+        """Добавить запись (kind - 'step', 'phase' или 'operation')"""
+        entry = {"ts": round(time.time(), 3), "kind": kind}
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(line.encode("utf-8"))
+                    size = f.tell()
+                if size > self.max_bytes:
+                    self._truncate()
+            except OSError:
+                # Телеметрия не должна мешать операциям
+                pass
+        return entry
+
+    def _truncate(self):
+        """Оставить в истории последние keep_bytes"""
+        data = read_tail(self.path, self.keep_bytes)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def load(self, since=None, tail=None):
+        """Прочитать записи истории (не старше since; только последние tail байт файла)"""
+        try:
+            if tail is None:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            else:
+                data = read_tail(self.path, tail)
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in data.decode("utf-8", "replace").splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or entry.get("ts", 0) >= since:
+                records.append(entry)
+        return records
+
+    def recent(self):
+        """Записи из хвоста истории - для оценок по последним запускам"""
+        return self.load(tail=RECENT_BYTES)
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StatRow:
+    """Статистика длительности для операции или шага"""
+
+    def __init__(self, operation, step, durations, last_ts):
+        self.operation = operation
+        self.step = step
+        self.count = len(durations)
+        self.p50 = percentile(durations, 0.5)
+        self.p95 = percentile(durations, 0.95)
+        self.last = durations[-1]
+        self.last_ts = last_ts
+        # Изменение медианы последних запусков относительно предыдущих
+        recent, older = durations[-RECENT_RUNS:], durations[:-RECENT_RUNS]
+        self.trend = None
+        if older:
+            base = percentile(older, 0.5)
+            if base:
+                self.trend = percentile(recent, 0.5) / base - 1
+
+    def to_dict(self):
+        return {
+            "operation": self.operation,
+            "step": self.step,
+            "count": self.count,
+            "p50_s": round(self.p50, 3),
+            "p95_s": round(self.p95, 3),
+            "last_s": round(self.last, 3),
+            "last_ts": self.last_ts,
+            "trend": None if self.trend is None else round(self.trend, 3),
+        }
+
+
+def summarize(records):
+    """Строки статистики: по операциям (step=None), их шагам и фазам шагов ("шаг/фаза")"""
+    series = {}
+    for entry in sorted(records, key=lambda e: e.get("ts", 0)):
+        if "wall_s" not in entry:
+            continue
+        step = None
+        if entry["kind"] == "step":
+            step = entry.get("step")
+        elif entry["kind"] == "phase":
+            step = f"{entry.get('step')}/{entry.get('phase')}"
+        key = (entry.get("operation") or "", step)
+        durations, _ = series.get(key, ([], None))
+        durations.append(entry["wall_s"])
+        series[key] = (durations, entry["ts"])
+    rows = [StatRow(op, step, durations, ts) for (op, step), (durations, ts) in series.items()]
+    rows.sort(key=lambda r: (r.operation, r.step is not None, r.step or ""))
+    return rows
+
+
+def child_usage(usage):
+    """Поля записи из rusage завершившегося процесса (os.wait4)"""
+    if usage is None:
+        return {}
+    return {
+        "cpu_user_s": round(usage.ru_utime, 3),
+        "cpu_sys_s": round(usage.ru_stime, 3),
+        "max_rss_kb": usage.ru_maxrss,
+    }
+
+
+def wait_with_usage(process):
+    """Дождаться процесса Popen и вернуть его rusage (или None)"""
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        process.wait()
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return usage
@@ -0,0 +1,134 @@
+import http.server
+import json
+import pwd
+import threading
+import urllib.parse
+
+import pytest
+
+import aur
+from pkgdb import Package
+
+
+def remote(name, version, depends=(), base=None, provides=()):
+    return aur.AurPackage(name, base or name, version, list(depends), list(provides))
+
+
+def local(name, version):
+    return Package(name, version, 0, 0, [], [], [])
+
+
+def test_batches_fit_url_limit():
+    rpc = "https://aur.example/rpc/v5/info"
+    names = [f"package-with-a-long-name-{i}" for i in range(400)]
+    batches = list(aur._batches(names, rpc))
+    assert len(batches) > 1
+    assert [name for batch in batches for name in batch] == names
+    for batch in batches:
+        url = rpc + "?" + urllib.parse.urlencode([("arg[]", name) for name in batch])
+        assert len(url) <= aur.MAX_URL
+
+
+def test_query_info_merges_batches(monkeypatch):
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            requests.append(query["arg[]"])
+            results = [{"Name": name, "PackageBase": name, "Version": "1-1",
+                        "Depends": ["glibc>=2.40"]} for name in query["arg[]"] if name != "gone"]
+            body = json.dumps({"type": "multiinfo", "results": results}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setattr(aur, "MAX_URL", 200)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        names = [f"pkg{i:02}" for i in range(30)] + ["gone"]
+        info = aur.query_info(names, f"http://127.0.0.1:{server.server_port}/rpc", timeout=5)
+    finally:
+        server.shutdown()
+    assert len(requests) > 1
+    assert sorted(info) == names[:-1]
+    assert info["pkg00"].depends == ["glibc"]
+
+
+def test_plan_orders_builds_by_dependencies():
+    foreign = {"app": local("app", "1-1"), "lib": local("lib", "1-1"),
+               "same": local("same", "2-1"), "split-a": local("split-a", "1-1")}
+    info = {"app": remote("app", "2-1", ["lib"]), "lib": remote("lib", "1.1-1"),
+            "same": remote("same", "2-1"), "split-a": remote("split-a", "3-1", base="split")}
+    builds, unknown = aur.plan_builds(foreign, info, ignored=["split-a"])
+    assert [b.base for b in builds] == ["lib", "app"]
+    assert builds[1].after == {"lib"}
+    assert unknown == []
+
+
+def test_plan_closes_missing_dependencies():
+    foreign = {"app": local("app", "1-1")}
+    info = {"app": remote("app", "2-1", ["glibc", "cmake", "libfoo", "python"])}
+    queried = []
+
+    def query(names):
+        queried.append(names)
+        known = {"libfoo": remote("libfoo", "1-1", ["libbar"], base="foo"),
+                 "libbar": remote("libbar", "1-1", ["zlib"])}
+        return {name: known[name] for name in names if name in known}
+
+    installed = {"glibc": ["glibc"], "sh": ["bash"]}
+    repo = {"cmake": "cmake", "zlib": "zlib", "python3": "python", "python": "python"}
+    builds, _ = aur.plan_builds(foreign, info, installed=installed, repo=repo, query=query)
+    assert queried == [["libfoo"], ["libbar"]]
+    assert [b.base for b in builds] == ["libbar", "foo", "app"]
+    by_base = {b.base: b for b in builds}
+    assert by_base["app"].repo_deps == {"cmake", "python"}
+    assert by_base["app"].after == {"foo"}
+    assert by_base["foo"].asdeps and by_base["foo"].packages == ["libfoo"]
+    assert by_base["libbar"].repo_deps == {"zlib"}
+    assert not by_base["app"].asdeps
+
+    steps = {s.name: s for s in aur.build_steps(builds, "/cache", 2)}
+    assert steps["deps:app"].command[-2:] == ["cmake", "python"]
+    assert "deps:app" in steps["build:app"].after
+    assert "install:foo" in steps["build:app"].after
+    assert "--asdeps" in steps["install:foo"].command
+    assert "--asdeps" not in steps["install:app"].command
+    assert "--syncdeps" in steps["build:app"].command
+
+
+def test_plan_fails_on_unknown_dependency():
+    foreign = {"app": local("app", "1-1")}
+    info = {"app": remote("app", "2-1", ["nowhere"])}
+    with pytest.raises(aur.AurError, match="nowhere"):
+        aur.plan_builds(foreign, info, installed={}, repo={}, query=lambda names: {})
+
+
+def test_plan_detects_cycle():
+    foreign = {"a": local("a", "1-1"), "b": local("b", "1-1")}
+    info = {"a": remote("a", "2-1", ["b"]), "b": remote("b", "2-1", ["a"])}
+    with pytest.raises(aur.AurError, match="цикл"):
+        aur.plan_builds(foreign, info)
+
+
+def test_builds_run_as_invoking_user(monkeypatch):
+    user = pwd.struct_passwd(("alice", "x", 1000, 1000, "", "/home/alice", "/bin/bash"))
+    command = aur.build_command("/home/alice/.cache/yay/app", 4, user)
+    assert command[:4] == ["runuser", "-u", "alice", "--"]
+    assert "HOME=/home/alice" in command
+    assert aur.fetch_command("app", "/tmp/nowhere", user=user)[:3] == ["runuser", "-u", "alice"]
+
+    monkeypatch.setattr(aur.os, "geteuid", lambda: 0)
+    monkeypatch.delenv("SUDO_UID", raising=False)
+    monkeypatch.delenv("PKEXEC_UID", raising=False)
+    with pytest.raises(aur.AurError):
+        aur.build_user()
+    monkeypatch.setenv("SUDO_UID", "0")
+    with pytest.raises(aur.AurError):
+        aur.build_user()
@@ -0,0 +1,38 @@
+import cli
+import core
+
+
+class Manager(cli.CliManager):
+    def rollback(self):
+        # Цвет статуса не влияет на итог: важен возвращенный результат
+        self.update_status("⚠ Нет снимков для отката", "orange")
+        return core.RESULT_FAILED
+
+    def clean_logs(self):
+        if not self.confirm("Подтверждение", "Очистить логи?"):
+            self.update_status("⚠ Отменено", "orange")
+            return core.RESULT_DECLINED
+        self.update_status("✓ Очистка логов завершена", "green")
+        return core.RESULT_OK
+
+    def clean_orphans(self):
+        self.update_status("✓ Готово", "green")
+
+
+def test_exit_code_follows_operation_result(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    manager = Manager()
+    try:
+        record = manager.run_one("rollback")
+        assert (record["result"], record["exit_code"]) == ("failed", cli.EXIT_FAILED)
+        record = manager.run_one("clean_logs")
+        assert (record["result"], record["exit_code"]) == ("declined", cli.EXIT_DECLINED)
+        manager.assume_yes = True
+        record = manager.run_one("clean_logs")
+        assert (record["result"], record["exit_code"]) == ("ok", cli.EXIT_OK)
+        # Операция без результата считается неудачной
+        assert manager.run_one("clean_orphans")["exit_code"] == cli.EXIT_FAILED
+    finally:
+        manager.output.close()
+    results = [r["result"] for r in manager.telemetry.load() if r.get("kind") == "operation"]
+    assert results == ["failed", "declined", "ok", "failed"]
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+import privileged
+from console import OutputDecoder, TerminalFilter, read_output
+
+# Вывод pacman -Syu на терминале (формат pacman 6: полосы через \r, цвет,
+# стирание строки, счетчики (n/m))
+PACMAN_TTY = (
+    "\x1b[1;34m::\x1b[0;1m Synchronizing package databases...\x1b[0m\n"
+    " core downloading...\r core                 132.2 KiB   661 KiB/s 00:00 [########------]  55%"
+    "\r core                 240.4 KiB   790 KiB/s 00:00 [##############] 100%\x1b[K\n"
+    "\x1b[1;34m::\x1b[0;1m Starting full system upgrade...\x1b[0m\n"
+    "resolving dependencies...\n"
+    "\x1b[1;33mwarning: \x1b[0mbash: local (5.2) is newer\n"
+    "(1/2) checking keys in keyring                     [--------------]   0%"
+    "\r(1/2) checking keys in keyring                     [##############] 100%\n"
+    "(2/2) upgrading zlib                               [##############] 100%\n"
+)
+
+# Тот же вывод в канал: полос и счетчиков нет
+PACMAN_PIPE = (
+    ":: Synchronizing package databases...\n"
+    " core downloading...\n"
+    ":: Starting full system upgrade...\n"
+    "resolving dependencies...\n"
+    "warning: bash: local (5.2) is newer\n"
+    "checking keyring...\n"
+    "upgrading zlib...\n"
+)
+
+
+def decode(text, chunk=7):
+    """Прогнать текст через OutputDecoder мелкими блоками"""
+    lines, progress = [], []
+    decoder = OutputDecoder(lines.append, progress.append)
+    data = text.encode("utf-8")
+    for i in range(0, len(data), chunk):
+        decoder.feed(data[i:i + chunk])
+    decoder.close()
+    return "".join(lines).splitlines(), progress
+
+
+def test_tty_output_is_collapsed_and_uncolored():
+    lines, progress = decode(PACMAN_TTY)
+    assert lines == [
+        ":: Synchronizing package databases...",
+        " core                 240.4 KiB   790 KiB/s 00:00 [##############] 100%",
+        ":: Starting full system upgrade...",
+        "resolving dependencies...",
+        "warning: bash: local (5.2) is newer",
+        "(1/2) checking keys in keyring                     [##############] 100%",
+        "(2/2) upgrading zlib                               [##############] 100%",
+    ]
+    assert not any("\x1b" in line for line in lines)
+    assert [(p.label, p.percent, p.rate) for p in progress][:2] == [
+        ("core", 55, "661 KiB/s"), ("core", 100, "790 KiB/s")]
+
+
+def test_pipe_output_passes_through():
+    lines, progress = decode(PACMAN_PIPE)
+    assert lines == PACMAN_PIPE.splitlines()
+    assert progress == []
+
+
+def test_escape_split_between_chunks():
+    terminal = TerminalFilter()
+    assert terminal.feed("done\x1b") == ""
+    assert terminal.feed("[0m line\x1b[") == ""
+    assert terminal.feed("K\n") == "done line\n"
+    assert terminal.flush() == ""
+
+
+def test_child_runs_on_pty():
+    script = ("import os, sys\n"
+              "sys.stdout.write('tty=%s\\n' % os.isatty(1))\n"
+              "sys.stdout.write('\\rfile  [###---]  50%\\rfile  [######] 100%\\n')\n"
+              "sys.stderr.write('error line\\n')\n")
+    master, slave = privileged.open_pty()
+    try:
+        process = subprocess.Popen([sys.executable, "-c", script], stdout=slave, stderr=slave,
+                                   start_new_session=True)
+    finally:
+        os.close(slave)
+    lines = []
+    try:
+        read_output(master, lines.append)
+    finally:
+        os.close(master)
+    assert process.wait() == 0
+    assert "".join(lines).splitlines() == ["tty=True", "file  [######] 100%", "error line"]
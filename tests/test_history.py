@@ -0,0 +1,55 @@
+import history
+
+OLD_LOG = (
+    "[2012-01-05 10:12] Running 'pacman -Syu'\n"
+    "[2012-01-05 10:12] synchronizing package lists\n"
+    "[2012-01-05 10:13] upgraded foo (1-1 -> 2-1)\n"
+    "[2012-01-05 10:13] installed bar (1.0-1)\n"
+)
+NEW_LOG = (
+    "[2024-01-05T10:12:33+0100] [PACMAN] Running 'pacman -S baz'\n"
+    "[2024-01-05T10:12:34+0100] [ALPM] transaction started\n"
+    "[2024-01-05T10:12:35+0100] [ALPM] installed baz (3-1)\n"
+    "[2024-01-05T10:12:35+0100] [ALPM-SCRIPTLET] installed something else (1)\n"
+    "[2024-01-05T10:12:36+0100] [ALPM] transaction completed\n"
+    "[2024-02-01T09:00:00+0100] [PACMAN] Running 'pacman -Syu'\n"
+    "[2024-02-01T09:00:01+0100] [ALPM] transaction started\n"
+    "[2024-02-01T09:00:02+0100] [ALPM] upgraded foo (2-1 -> 3-1)\n"
+    "[2024-02-01T09:00:03+0100] [ALPM] removed bar (1.0-1)\n"
+    "[2024-02-01T09:00:05+0100] [ALPM] transaction completed\n"
+)
+
+
+def test_old_and_new_log_lines(tmp_path):
+    log = tmp_path / "pacman.log"
+    log.write_text(OLD_LOG + NEW_LOG)
+    index = history.History(str(log))
+    index.update()
+    assert [t.command for t in index.transactions] == ["pacman -Syu", "pacman -S baz", "pacman -Syu"]
+    assert [t.count for t in index.transactions] == [2, 1, 2]
+    assert index.transactions[0].start_ts == history.parse_stamp(b"2012-01-05 10:12")
+    assert [str(c) for _, c in index.package_history("foo")] == ["upgraded foo (1-1 -> 2-1)",
+                                                                  "upgraded foo (2-1 -> 3-1)"]
+    assert "something" not in index.by_package
+    assert index.last_sysupgrade() is index.transactions[2]
+
+
+def test_last_change_after_incremental_update(tmp_path):
+    log = tmp_path / "pacman.log"
+    cache = str(tmp_path / "history.json")
+    log.write_text(NEW_LOG)
+    index = history.History(str(log), cache)
+    index.update()
+    index.save()
+    transaction, change = index.last_change("bar")
+    assert (change.action, change.old, change.new) == ("removed", "1.0-1", None)
+    assert index.last_change("missing") is None
+
+    with open(log, "a") as f:
+        f.write("[2024-03-01T08:00:00+0100] [PACMAN] Running 'pacman -S bar'\n"
+                "[2024-03-01T08:00:01+0100] [ALPM] installed bar (1.1-1)\n")
+    index = history.History(str(log), cache)
+    assert index.update() > 0
+    transaction, change = index.last_change("bar")
+    assert transaction.command == "pacman -S bar" and change.new == "1.1-1"
+    assert transaction.start_ts == history.parse_stamp(b"2024-03-01T08:00:00+0100")
@@ -0,0 +1,68 @@
+import gzip
+import os
+
+import integrity
+from pkgdb import local_db_path
+
+
+def write_package(root, name, version, files, mtree):
+    pkgdir = os.path.join(local_db_path(root), f"{name}-{version}")
+    os.makedirs(pkgdir)
+    with open(os.path.join(pkgdir, "desc"), "w") as f:
+        f.write(f"%NAME%\n{name}\n\n%VERSION%\n{version}\n")
+    with open(os.path.join(pkgdir, "files"), "w") as f:
+        f.write("%FILES%\n" + "".join(path + "\n" for path in files))
+    with gzip.open(os.path.join(pkgdir, "mtree"), "wt") as f:
+        f.write(mtree)
+
+
+def test_parse_mtree_defaults_and_escapes(tmp_path):
+    path = tmp_path / "mtree"
+    with gzip.open(path, "wt") as f:
+        f.write("#mtree\n"
+                "/set type=file uid=0 gid=0 mode=644\n"
+                "./.PKGINFO time=1 size=10\n"
+                "./usr time=1 mode=755 type=dir\n"
+                "./usr/my\\040file size=3 sha256digest=abc\n"
+                "/unset mode\n"
+                "./usr/link type=link link=my\\040file\n")
+    entries = integrity.parse_mtree(path)
+    assert ".PKGINFO" not in entries
+    assert entries["usr"]["type"] == "dir"
+    assert entries["usr/my file"] == {"type": "file", "uid": "0", "gid": "0", "mode": "644",
+                                      "size": "3", "sha256digest": "abc"}
+    assert "mode" not in entries["usr/link"]
+    assert integrity._unescape(entries["usr/link"]["link"]) == "my file"
+
+
+def test_cache_invalidated_by_chmod(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "usr/bin"))
+    tool = os.path.join(root, "usr/bin/tool")
+    with open(tool, "w") as f:
+        f.write("abc")
+    os.chmod(tool, 0o755)
+    owner = f"uid={os.getuid()} gid={os.getgid()}"
+    write_package(root, "tool", "1.0-1", ["usr/", "usr/bin/", "usr/bin/tool"],
+                  f"/set type=file {owner} mode=755\n./usr/bin/tool size=3\n")
+    cache = str(tmp_path / "integrity.json")
+
+    first = integrity.check_integrity(root, cache_file=cache, jobs=1)
+    assert first[0].ok and not first[0].cached
+    second = integrity.check_integrity(root, cache_file=cache, jobs=1)
+    assert second[0].ok and second[0].cached
+
+    os.chmod(tool, 0o4755)
+    third = integrity.check_integrity(root, cache_file=cache, jobs=1)
+    assert not third[0].cached
+    assert [p.kind for p in third[0].problems] == ["mode"]
+
+
+def test_missing_file_reported_from_cache(tmp_path):
+    root = str(tmp_path)
+    write_package(root, "gone", "1-1", ["usr/lib/gone.so"], "")
+    cache = str(tmp_path / "integrity.json")
+    integrity.check_integrity(root, cache_file=cache, jobs=1)
+    report = integrity.check_integrity(root, cache_file=cache, jobs=1)[0]
+    assert report.cached
+    assert [(p.path, p.kind) for p in report.problems] == [("/usr/lib/gone.so", "missing")]
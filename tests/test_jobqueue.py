@@ -0,0 +1,106 @@
+import json
+
+import jobqueue
+
+
+def test_corrupt_file_resets_queue(tmp_path):
+    path = tmp_path / "queue.json"
+    queue = jobqueue.JobQueue(str(path))
+    queue.add("full_update")
+    queue.set_paused(True)
+    assert queue.snapshot() == (queue.jobs, True)
+
+    path.write_text('{"version": 1, "paused": true, "next_id": 7, "jobs": [{"bogus": 1}]}')
+    jobs, paused = queue.snapshot()
+    assert (jobs, paused, queue.next_id) == ([], False, 1)
+    path.write_text("{not json")
+    queue.paused, queue.next_id = True, 5
+    assert queue.snapshot() == ([], False) and queue.next_id == 1
+
+
+def test_next_id_never_reuses_saved_ids(tmp_path):
+    path = tmp_path / "queue.json"
+    path.write_text(json.dumps({"version": 1, "next_id": 1, "jobs": [
+        {"id": 4, "operation": "clean_logs", "options": {}, "queued_at": 0, "state": "queued",
+         "started_at": None}]}))
+    job, added, _ = jobqueue.JobQueue(str(path)).add("full_update")
+    assert added and job.id == 5
+
+
+def test_restored_queue_waits_paused(tmp_path):
+    path = str(tmp_path / "queue.json")
+    first = jobqueue.JobQueue(path)
+    first.add("clean_logs")
+    first.add("full_update")
+    assert first.claim_runner()
+    assert first.next().operation == "clean_logs"
+    first.release_runner()
+
+    # Окно открыто заново: прерванное задание первым, очередь на паузе
+    queue = jobqueue.JobQueue(path)
+    jobs, paused = queue.restore()
+    assert [(j.operation, j.state) for j in jobs] == [("clean_logs", "queued"), ("full_update", "queued")]
+    assert not paused
+    assert queue.claim_runner()
+    assert queue.next() is None
+    queue.set_paused(False)
+    assert queue.next().operation == "clean_logs"
+    queue.release_runner()
+
+
+def test_restore_leaves_queue_of_other_runner(tmp_path):
+    path = str(tmp_path / "queue.json")
+    runner = jobqueue.JobQueue(path)
+    runner.add("full_update")
+    assert runner.claim_runner()
+    assert jobqueue.JobQueue(path).restore() is None
+    assert runner.snapshot()[1] is False
+    runner.release_runner()
+    assert jobqueue.JobQueue(str(tmp_path / "empty.json")).restore() is None
+
+
+def test_add_coalesces_covered_operations(tmp_path):
+    queue = jobqueue.JobQueue(str(tmp_path / "queue.json"))
+    update, added, _ = queue.add("full_update", {"snapshot": True})
+    assert added
+    again, added, removed = queue.add("full_update", {"snapshot": False})
+    assert (again.id, added, removed) == (update.id, False, [])
+    assert again.options == {"snapshot": True}
+
+    logs, _, _ = queue.add("clean_logs")
+    orphans, _, _ = queue.add("clean_orphans")
+    # Выполняющееся задание новая операция не снимает
+    assert queue.claim_runner()
+    assert queue.next().operation == "full_update"
+    full, added, removed = queue.add("full_clean")
+    assert added
+    assert [job.id for job in removed] == [logs.id, orphans.id]
+    jobs, _ = queue.snapshot()
+    assert [(job.operation, job.state) for job in jobs] == [("full_update", "running"), ("full_clean", "queued")]
+
+    job, added, removed = queue.add("clean_packages")
+    assert (job.id, added, removed) == (full.id, False, [])
+    queue.release_runner()
+
+
+def test_running_job_does_not_absorb_new_one():
+    queue = jobqueue.JobQueue()
+    queue.add("full_clean")
+    assert queue.claim_runner()
+    queue.next()
+    job, added, _ = queue.add("clean_logs")
+    assert added and job.operation == "clean_logs"
+    queue.release_runner()
+
+
+def test_estimate_accumulates_and_stops_at_unknown():
+    jobs = [jobqueue.Job(1, "full_update", state=jobqueue.RUNNING, started_at=100.0),
+            jobqueue.Job(2, "clean_logs"),
+            jobqueue.Job(3, "rollback"),
+            jobqueue.Job(4, "clean_logs")]
+    durations = {"full_update": 300.0, "clean_logs": 20.0}
+    etas = [eta for _, eta in jobqueue.estimate(jobs, durations, now=160.0)]
+    assert etas == [240.0, 260.0, None, None]
+    # Задание идет дольше обычного: остаток не уходит в минус
+    etas = [eta for _, eta in jobqueue.estimate(jobs[:2], durations, now=1000.0)]
+    assert etas == [0, 20.0]
@@ -0,0 +1,62 @@
+import os
+
+import logretention
+from logretention import DAY, Policy
+
+NOW = 1_800_000_000
+
+
+def make_log(root, rel, size, age_days):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.truncate(size)
+    mtime = NOW - age_days * DAY
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_base_name_strips_rotation_suffixes():
+    assert logretention.base_name("/var/log/Xorg.0.log.old") == ("/var/log/Xorg.0.log", True)
+    assert logretention.base_name("/var/log/pacman.log.1.gz") == ("/var/log/pacman.log", True)
+    assert logretention.base_name("/var/log/messages-20240101.xz") == ("/var/log/messages", True)
+    assert logretention.base_name("/var/log/pacman.log") == ("/var/log/pacman.log", False)
+
+
+def test_keep_newest_age_and_size(tmp_path):
+    root = str(tmp_path)
+    make_log(root, "app.log", 100, 0)
+    newest = make_log(root, "app.log.1", 100, 1)
+    second = make_log(root, "app.log.2", 100, 2)
+    third = make_log(root, "app.log.3", 100, 3)
+    old = make_log(root, "other.log.1", 10, 30)
+    fresh = make_log(root, "other.log.2", 10, 1)
+    big = make_log(root, "big.log.1", 900, 1)
+    make_log(root, "big.log", 200, 0)
+
+    plan = logretention.plan_retention(root, {"*": Policy(max_age_days=7, max_bytes=1000, keep_newest=2)},
+                                       now=NOW)
+    removed = set(plan.files())
+    assert third in removed and newest not in removed and second not in removed
+    assert old in removed and fresh not in removed
+    assert big in removed
+    assert plan.count == 3
+    assert plan.freed == 100 + 10 + 900
+
+
+def test_policy_pattern_and_journal_budget(tmp_path):
+    root = str(tmp_path)
+    make_log(root, "journal/abc/system.journal", 5000, 0)
+    kept = make_log(root, "audit/audit.log.1", 100, 100)
+    make_log(root, "audit/audit.log", 100, 0)
+    policies = {"audit/*": Policy(max_age_days=None, max_bytes=None, keep_newest=None)}
+
+    plan = logretention.plan_retention(root, policies, budget=1000, min_journal=300, now=NOW)
+    assert kept not in set(plan.files())
+    assert plan.journal_bytes == 5000
+    # Файлы занимают 200 байт, журналу остается бюджет минус файлы
+    assert plan.journal_target == 800
+    assert logretention.journal_vacuum_command(plan)[-1] == "--vacuum-size=800"
+
+    tight = logretention.plan_retention(root, policies, budget=100, min_journal=300, now=NOW)
+    assert tight.journal_target == 300
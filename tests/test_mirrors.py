@@ -0,0 +1,63 @@
+import http.server
+import threading
+import time
+
+import mirrors
+
+
+def test_mirrorlist_round_trip(tmp_path):
+    path = tmp_path / "mirrorlist"
+    path.write_text("## header\n"
+                    "Server = https://a.example/stable/$repo/$arch\n"
+                    "#Server = https://disabled.example/stable/$repo/$arch\n"
+                    "Server=https://b.example/stable/$repo/$arch\n"
+                    "Server = https://a.example/stable/$repo/$arch\n")
+    servers = mirrors.read_mirrorlist(str(path))
+    assert servers == ["https://a.example/stable/$repo/$arch", "https://b.example/stable/$repo/$arch"]
+    mirrors.write_mirrorlist(str(path), servers[::-1])
+    assert mirrors.read_mirrorlist(str(path)) == servers[::-1]
+
+
+def test_rank_uses_fresh_history(tmp_path):
+    history_file = str(tmp_path / "history.json")
+    history = mirrors.MirrorHistory(history_file)
+    now = time.time()
+    broken = "http://127.0.0.1:9/stable/$repo/$arch"
+    for server, latency, throughput in (("slow", 0.5, 1e6), ("fast", 0.05, 1e8)):
+        history.update(mirrors.ProbeResult(server, latency, throughput, now), now)
+    history.update(mirrors.ProbeResult(broken, error="timeout"), now)
+    history.save()
+
+    # Свежие замеры не повторяются, зеркало с ошибкой опрашивается снова
+    ranked, results, _ = mirrors.rank_mirrors([broken, "slow", "fast"], history_file, timeout=1)
+    assert [r.server for r in results] == [broken]
+    assert ranked == ["fast", "slow", broken]
+
+
+def test_rank_probes_local_mirrors(tmp_path):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/good/"):
+                body = b"date=2026-01-01T00:00:00Z\n" if self.path.endswith("state") else b"x" * 4096
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        servers = [f"{base}/bad/$repo/$arch", f"{base}/good/$repo/$arch"]
+        ranked, results, history = mirrors.rank_mirrors(
+            servers, str(tmp_path / "history.json"), timeout=2, probe_bytes=1024)
+    finally:
+        server.shutdown()
+    assert ranked == servers[::-1]
+    assert {r.server: r.ok for r in results} == {servers[0]: False, servers[1]: True}
+    assert history.is_fresh(servers[1]) and not history.is_fresh(servers[0])
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import pkgcache
+
+
+def write(directory, name, size):
+    (directory / name).write_bytes(b"x" * size)
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("bash-5.2.037-1-x86_64.pkg.tar.zst", ("bash", "5.2.037-1", "x86_64")),
+    ("zlib-1:1.3.1-2-x86_64.pkg.tar.zst", ("zlib", "1:1.3.1-2", "x86_64")),
+    ("lib32-glibc-2.41+r1-1-x86_64.pkg.tar.xz", ("lib32-glibc", "2.41+r1-1", "x86_64")),
+    ("ca-certificates-20240618-1-any.pkg.tar", ("ca-certificates", "20240618-1", "any")),
+])
+def test_parse_filename(filename, expected):
+    assert pkgcache.parse_filename(filename) == expected
+
+
+@pytest.mark.parametrize("filename", [
+    "bash-5.2.037-1-x86_64.pkg.tar.zst.sig",
+    "bash-5.2.037-1-x86_64.pkg.tar.zst.part",
+    "bash-5.2.037-x86_64.pkg.tar.zst",
+    "bash-5.2.037-1-x86_64.tar.zst",
+    "5.2.037-1-x86_64.pkg.tar.zst",
+    "bash-5.2.037-1-x86_64.pkg.tar.zst.old.tmp",
+])
+def test_parse_filename_rejects(filename):
+    assert pkgcache.parse_filename(filename) is None
+
+
+def test_scan_pairs_signatures_and_skips_others(tmp_path):
+    write(tmp_path, "bash-5.2-1-x86_64.pkg.tar.zst", 100)
+    write(tmp_path, "bash-5.2-1-x86_64.pkg.tar.zst.sig", 10)
+    write(tmp_path, "bash-5.3-1-x86_64.pkg.tar.zst.part", 50)
+    write(tmp_path, "notes.txt", 5)
+    os.symlink(tmp_path / "notes.txt", tmp_path / "evil-1-1-any.pkg.tar.zst")
+    packages = pkgcache.scan_cache(str(tmp_path))
+    assert list(packages) == [("bash", "x86_64")]
+    pkg, = packages[("bash", "x86_64")]
+    assert pkg.size == 110
+    assert pkg.files == [str(tmp_path / "bash-5.2-1-x86_64.pkg.tar.zst"),
+                         str(tmp_path / "bash-5.2-1-x86_64.pkg.tar.zst.sig")]
+
+
+def test_plan_keeps_newest_and_installed(tmp_path):
+    for version in ("1.0-1", "1.9-1", "1.10-1", "1:0.1-1"):
+        write(tmp_path, f"app-{version}-x86_64.pkg.tar.zst", 100)
+    write(tmp_path, "app-1.0-1-x86_64.pkg.tar.zst.sig", 10)
+    write(tmp_path, "gone-1-1-any.pkg.tar.zst", 7)
+    packages = pkgcache.scan_cache(str(tmp_path))
+
+    plan = pkgcache.plan_prune(packages, {"app": "1.0-1"}, keep=2)
+    assert [p.version for p in plan.remove["app"]] == ["1.9-1"]
+    assert "gone" not in plan.remove
+    assert plan.kept == 4
+
+    plan = pkgcache.plan_prune(packages, {"app": "1:0.1-1"}, keep=1, remove_uninstalled=True)
+    assert sorted(p.version for p in plan.remove["app"]) == ["1.0-1", "1.10-1", "1.9-1"]
+    assert [p.version for p in plan.remove["gone"]] == ["1-1"]
+    # Подпись считается и удаляется вместе с пакетом
+    assert plan.count == 4
+    assert plan.total == 310 + 7
+    assert str(tmp_path / "app-1.0-1-x86_64.pkg.tar.zst.sig") in set(plan.files())
+    assert len(list(plan.files())) == 5
@@ -0,0 +1,79 @@
+import os
+
+import pkgdb
+
+
+def add_package(root, name, reason=pkgdb.REASON_DEPEND, depends=(), optdepends=(), provides=()):
+    path = root / pkgdb.LOCAL_DB / f"{name}-1-1"
+    path.mkdir(parents=True)
+    lines = [f"%NAME%\n{name}\n", "%VERSION%\n1-1\n", f"%REASON%\n{reason}\n", "%SIZE%\n1024\n"]
+    for section, values in (("DEPENDS", depends), ("OPTDEPENDS", optdepends), ("PROVIDES", provides)):
+        if values:
+            lines.append(f"%{section}%\n" + "".join(value + "\n" for value in values))
+    (path / "desc").write_text("\n".join(lines))
+
+
+def make_db(root):
+    explicit = pkgdb.REASON_EXPLICIT
+    add_package(root, "app", explicit, depends=["libfoo>=1.0", "sh"], optdepends=["viewer: просмотр"])
+    add_package(root, "libfoo")
+    add_package(root, "bash", provides=["sh"])
+    add_package(root, "viewer")
+    # Остаточный сам по себе и тянущий за собой свою зависимость
+    add_package(root, "stale", depends=["stale-dep"])
+    add_package(root, "stale-dep")
+    # Явно установленный пакет без зависимых не остаточный
+    add_package(root, "editor", explicit, depends=["editor-lib"])
+    add_package(root, "editor-lib")
+    # Зависимость явного пакета, который никто не требует
+    add_package(root, "tool", explicit)
+
+
+def test_orphans_skip_required_and_explicit(tmp_path):
+    make_db(tmp_path)
+    graph = pkgdb.build_graph(str(tmp_path))
+    assert graph.packages["app"].depends == ["libfoo", "sh"]
+    assert graph.resolve(["sh"]) == ["bash"]
+    # stale-dep становится остаточным только после stale
+    assert [p.name for p in graph.orphans()] == ["stale", "stale-dep"]
+
+
+def test_orphan_chain_through_provides(tmp_path):
+    add_package(tmp_path, "top", depends=["sh"])
+    add_package(tmp_path, "bash", provides=["sh=5.2"])
+    add_package(tmp_path, "keep", pkgdb.REASON_EXPLICIT, optdepends=["extra"])
+    add_package(tmp_path, "extra")
+    graph = pkgdb.build_graph(str(tmp_path))
+    assert [p.name for p in graph.orphans()] == ["top", "bash"]
+
+
+def test_graph_cache_follows_db_mtime(tmp_path, monkeypatch):
+    make_db(tmp_path)
+    root = str(tmp_path)
+    db = tmp_path / pkgdb.LOCAL_DB
+    cache_file = str(tmp_path / "depgraph.json")
+    builds = []
+    build_graph = pkgdb.build_graph
+
+    def counting(root):
+        builds.append(root)
+        return build_graph(root)
+
+    monkeypatch.setattr(pkgdb, "build_graph", counting)
+    monkeypatch.setattr(pkgdb, "_graphs", {})
+    os.utime(db, ns=(1_000_000_000, 1_000_000_000))
+    graph = pkgdb.load_graph(root, cache_file)
+    assert pkgdb.load_graph(root, cache_file) is graph
+    assert len(builds) == 1
+
+    # Новый процесс: граф берется из файла кэша
+    monkeypatch.setattr(pkgdb, "_graphs", {})
+    cached = pkgdb.load_graph(root, cache_file)
+    assert len(builds) == 1
+    assert [p.name for p in cached.orphans()] == ["stale", "stale-dep"]
+
+    add_package(tmp_path, "new")
+    os.utime(db, ns=(2_000_000_000, 2_000_000_000))
+    graph = pkgdb.load_graph(root, cache_file)
+    assert len(builds) == 2
+    assert "new" in graph.packages
@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+import prefetch
+
+
+def test_prefetch_downloads_into_staging(tmp_path):
+    mirror = tmp_path / "mirror" / "core" / "x86_64"
+    mirror.mkdir(parents=True)
+    cache = tmp_path / "pkg"
+    cache.mkdir()
+    staging = tmp_path / "staging"
+    downloads = []
+    for name, data in (("a-1-1-x86_64.pkg.tar.zst", b"a" * 5000), ("b-1-1-x86_64.pkg.tar.zst", b"b" * 10)):
+        (mirror / name).write_bytes(data)
+        downloads.append(prefetch.Download("core", name, len(data), hashlib.sha256(data).hexdigest(), ""))
+    (cache / "b-1-1-x86_64.pkg.tar.zst").write_bytes(b"b" * 10)
+
+    stats = prefetch.prefetch(downloads, [f"file://{tmp_path}/mirror/$repo/$arch"], str(staging),
+                              cache_dir=str(cache), arch="x86_64")
+    assert [d.filename for d in stats.done] == ["a-1-1-x86_64.pkg.tar.zst"]
+    assert [d.filename for d in stats.cached] == ["b-1-1-x86_64.pkg.tar.zst"]
+    # В кэш pacman ничего не пишется: переносит помощник
+    assert os.listdir(cache) == ["b-1-1-x86_64.pkg.tar.zst"]
+    assert prefetch.staged_files(str(staging), downloads) == [str(staging / "a-1-1-x86_64.pkg.tar.zst")]
+
+
+def test_parse_print_output_skips_local_files():
+    text = ("core bash-5.2-1-x86_64.pkg.tar.zst 1000 ABCDEF https://m/core/bash-5.2-1-x86_64.pkg.tar.zst\n"
+            "local x-1-1-any.pkg.tar.zst 5 00 file:///var/cache/pacman/pkg/x-1-1-any.pkg.tar.zst\n"
+            ":: Synchronizing package databases...\n")
+    downloads = prefetch.parse_print_output(text)
+    assert [(d.repo, d.filename, d.size, d.sha256) for d in downloads] == [
+        ("core", "bash-5.2-1-x86_64.pkg.tar.zst", 1000, "abcdef")]
@@ -0,0 +1,215 @@
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+import privileged
+
+
+def collect(sock, job):
+    """Кадры задания до EXIT: (вывод и ошибки, результат)"""
+    text = b""
+    while True:
+        frame = privileged.recv_frame(sock)
+        assert frame is not None
+        frame_job, kind, payload = frame
+        assert frame_job == job
+        if kind == privileged.EXIT:
+            return text, json.loads(payload)
+        text += payload
+
+
+def test_frame_round_trip():
+    a, b = socket.socketpair()
+    with a, b:
+        lock = threading.Lock()
+        big = os.urandom(300 * 1024)
+        sender = threading.Thread(target=privileged.send_frame, args=(a, lock, 7, privileged.OUTPUT, big))
+        sender.start()
+        assert privileged.recv_frame(b) == (7, privileged.OUTPUT, big)
+        sender.join()
+        privileged.send_frame(a, lock, 8, privileged.CANCEL)
+        assert privileged.recv_frame(b) == (8, privileged.CANCEL, b"")
+        a.close()
+        assert privileged.recv_frame(b) is None
+
+
+@pytest.mark.parametrize("argv", [
+    ["rm", "-rf", "/"],
+    ["/tmp/pacman", "-Syu"],
+    ["/usr/bin/../bin/pacman"],
+    ["./pacman"],
+    ["xargs", "-0", "rm"],
+    ["install", "-m", "4755", "/tmp/x", "/usr/bin/x"],
+])
+def test_helper_rejects_commands_outside_allowlist(argv):
+    client, server = socket.socketpair()
+    session = privileged.HelperSession(server)
+    thread = threading.Thread(target=session.serve, daemon=True)
+    thread.start()
+    with client:
+        privileged.send_frame(client, threading.Lock(), 1, privileged.RUN,
+                              json.dumps({"argv": argv}).encode())
+        text, result = collect(client, 1)
+        assert result["code"] == 126
+        assert "не разрешена" in text.decode()
+        client.shutdown(socket.SHUT_RDWR)
+    thread.join(5)
+    server.close()
+
+
+def test_resolve_program_only_in_root_path(tmp_path):
+    program = tmp_path / "pacman"
+    program.write_text("#!/bin/sh\n")
+    program.chmod(0o755)
+    path = (str(tmp_path),)
+    assert privileged.resolve_program("pacman", path) == str(program)
+    assert privileged.resolve_program(str(program), path) == str(program)
+    assert privileged.resolve_program("sh", path) is None
+    assert privileged.resolve_program(str(tmp_path / "x" / ".." / "pacman"), path) is None
+
+
+def test_verb_argv_matches_only_own_verbs():
+    argv = privileged.verb_command("remove-paths", "/tmp/list", sudo=False)
+    assert privileged.verb_argv(argv) == argv
+    assert privileged.privileged_argv(privileged.verb_command("make-dir", "/x")) == \
+        privileged.verb_command("make-dir", "/x", sudo=False)
+    assert privileged.verb_argv(argv[:4] + ["exec", "id"]) is None
+    assert privileged.verb_argv(["/tmp/python", "-I", privileged.HELPER, "--verb", "make-dir", "/x"]) is None
+
+
+def test_path_verbs_stay_inside_roots(tmp_path):
+    root = tmp_path / "cache"
+    outside = tmp_path / "outside"
+    (root / "pkg").mkdir(parents=True)
+    outside.mkdir()
+    victim = outside / "victim"
+    victim.write_text("keep")
+    (root / "escape").symlink_to(outside)
+    package = root / "pkg" / "a.pkg.tar.zst"
+    package.write_text("pkg")
+    roots = (str(root),)
+
+    assert privileged.remove_paths([str(root / "escape" / "victim"), str(root / "pkg" / ".." / ".." / "outside"),
+                                    str(root)], roots, recursive=True) == 3
+    assert victim.exists() and root.exists()
+    assert privileged.make_dirs([str(root), str(root / "rollback" / "1")], roots) == 0
+    assert privileged.link_paths([str(package), str(victim)], str(root / "rollback" / "1"), roots) == 1
+    assert os.path.samefile(package, root / "rollback" / "1" / package.name)
+    assert privileged.remove_paths([str(root / "rollback"), str(root / "escape")], roots, recursive=True) == 0
+    assert not (root / "rollback").exists() and not (root / "escape").exists()
+    assert victim.exists() and package.exists()
+
+
+def test_install_mirrorlist_accepts_only_servers(tmp_path):
+    target = tmp_path / "mirrorlist"
+    target.write_text("Server = https://old.example/$repo\n")
+    good = tmp_path / "ranked"
+    good.write_text("## ranked\n\nServer = https://a.example/stable/$repo/$arch\n")
+    bad = tmp_path / "bad"
+    bad.write_text("Server = https://a.example/$repo\nInclude = /etc/shadow\n")
+    assert privileged.install_mirrorlist(str(bad), str(target)) == 1
+    assert "old.example" in target.read_text()
+    assert privileged.install_mirrorlist(str(good), str(target)) == 0
+    assert target.read_text() == good.read_text()
+    assert "old.example" in (tmp_path / "mirrorlist~").read_text()
+
+
+def serve_in_thread(path, token):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(code=privileged.serve(path, os.getuid(), token)),
+                              daemon=True)
+    thread.start()
+    while not os.path.exists(path):
+        thread.join(0.01)
+    return thread, result
+
+
+def connect(path):
+    for _ in range(500):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return sock
+        except OSError:
+            sock.close()
+            threading.Event().wait(0.01)
+    raise AssertionError("помощник не слушает сокет")
+
+
+def test_serve_requires_launch_token(tmp_path):
+    path = str(tmp_path / "helper.sock")
+    thread, result = serve_in_thread(path, b"secret")
+    with connect(path) as sock:
+        privileged.send_frame(sock, threading.Lock(), 0, privileged.AUTH, b"guess")
+        assert privileged.recv_frame(sock) is None
+    thread.join(5)
+    assert result["code"] == 1
+
+    thread, result = serve_in_thread(path, b"secret")
+    with connect(path) as sock:
+        lock = threading.Lock()
+        privileged.send_frame(sock, lock, 0, privileged.AUTH, b"secret")
+        privileged.send_frame(sock, lock, 3, privileged.RUN, json.dumps({"argv": ["rm"]}).encode())
+        assert collect(sock, 3)[1]["code"] == 126
+    thread.join(5)
+    assert result["code"] == 0
+
+
+def test_serve_does_not_follow_swapped_socket(tmp_path, monkeypatch):
+    path = str(tmp_path / "helper.sock")
+    victim = tmp_path / "shadow"
+    victim.write_text("root:x")
+    calls = []
+
+    def lchown(target, uid, gid):
+        # Пользователь успел подменить сокет ссылкой между bind и chown
+        os.unlink(target)
+        os.symlink(victim, target)
+        calls.append((target, uid))
+
+    monkeypatch.setattr(privileged.os, "geteuid", lambda: 0)
+    monkeypatch.setattr(privileged.os, "lchown", lchown)
+    monkeypatch.setattr(privileged.os, "chown", lambda *args, **kwargs: pytest.fail("chown по пути"))
+    assert privileged.serve(path, 1000, b"secret") == 1
+    assert calls == [(path, 1000)]
+    assert victim.read_text() == "root:x"
+
+
+def test_serve_gives_up_when_nobody_connects(tmp_path, monkeypatch):
+    monkeypatch.setattr(privileged, "START_TIMEOUT", 0.1)
+    path = str(tmp_path / "helper.sock")
+    assert privileged.serve(path, os.getuid(), b"secret") == 1
+    assert not os.path.exists(path)
+
+
+def test_add_to_cache_copies_only_owned_package_files(tmp_path):
+    staging = tmp_path / "staging"
+    cache = tmp_path / "pkg"
+    staging.mkdir()
+    cache.mkdir()
+    package = staging / "bash-5.2.026-1-x86_64.pkg.tar.zst"
+    package.write_bytes(b"package")
+    secret = tmp_path / "secret"
+    secret.write_text("secret")
+    link = staging / "evil-1-1-any.pkg.tar.zst"
+    link.symlink_to(secret)
+    other = staging / "notes.txt"
+    other.write_text("x")
+
+    errors = privileged.add_to_cache([str(package), str(link), str(other)], str(cache), owner=os.getuid())
+    assert errors == 2
+    assert sorted(os.listdir(cache)) == [package.name]
+    assert (cache / package.name).read_bytes() == b"package"
+    assert (cache / package.name).stat().st_mode & 0o777 == 0o644
+    assert privileged.add_to_cache([str(package)], str(cache), owner=os.getuid() + 1) == 1
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="пути ограничиваются только от root")
+def test_recursive_remove_only_in_rollback_root(tmp_path, capsys):
+    listing = privileged.write_file_list(["/var/cache/pacman/pkg/no-such-dir", "/var/log/no-such-dir"],
+                                         str(tmp_path / "list"))
+    assert privileged.run_verb("remove-paths", [listing, "--recursive"]) == 1
+    assert capsys.readouterr().err.count("вне разрешенных") == 2
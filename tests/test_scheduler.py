@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import scheduler
+from scheduler import Step, StepScheduler
+
+
+class Recorder:
+    """run_step, который запоминает время начала и конца шагов"""
+
+    def __init__(self, duration=0.05, fail=()):
+        self.duration = duration
+        self.fail = set(fail)
+        self.times = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, step):
+        start = time.monotonic()
+        time.sleep(self.duration)
+        with self.lock:
+            self.times[step.name] = (start, time.monotonic())
+        return step.name not in self.fail
+
+    def overlap(self, a, b):
+        (start_a, end_a), (start_b, end_b) = self.times[a], self.times[b]
+        return start_a < end_b and start_b < end_a
+
+    def max_concurrent(self):
+        events = sorted([(start, 1) for start, _ in self.times.values()]
+                        + [(end, -1) for _, end in self.times.values()])
+        current = peak = 0
+        for _, delta in events:
+            current += delta
+            peak = max(peak, current)
+        return peak
+
+
+def step(name, resources=(), after=()):
+    return Step(name, ["true"], name, resources=resources, after=after)
+
+
+def test_shared_resource_serializes_disjoint_overlap():
+    recorder = Recorder()
+    steps = [step("sync", {scheduler.PACMAN_DB, scheduler.NETWORK}),
+             step("update", {scheduler.PACMAN_DB}),
+             step("journal", {scheduler.JOURNAL}),
+             step("logs", {scheduler.LOGS})]
+    results = StepScheduler(recorder).run(steps)
+    assert all(results.values())
+    assert not recorder.overlap("sync", "update")
+    assert recorder.overlap("journal", "logs")
+    assert recorder.overlap("sync", "journal")
+
+
+def test_failed_step_skips_dependents():
+    recorder = Recorder(duration=0.01, fail={"mirrorlist"})
+    steps = [step("mirrorlist"), step("sync", after=["mirrorlist"]),
+             step("update", after=["sync"]), step("logs")]
+    results = StepScheduler(recorder).run(steps)
+    assert results == {"mirrorlist": False, "sync": False, "update": False, "logs": True}
+    assert set(recorder.times) == {"mirrorlist", "logs"}
+
+
+def test_dependencies_run_in_order():
+    recorder = Recorder(duration=0.01)
+    StepScheduler(recorder).run([step("b", after=["a"]), step("a")])
+    assert recorder.times["a"][1] <= recorder.times["b"][0]
+
+
+def test_limits_and_max_parallel():
+    recorder = Recorder()
+    builds = [step(f"build:{i}", {scheduler.BUILD}) for i in range(6)]
+    results = StepScheduler(recorder, limits={scheduler.BUILD: 2}).run(builds)
+    assert all(results.values())
+    assert recorder.max_concurrent() == 2
+
+    recorder = Recorder()
+    StepScheduler(recorder, max_parallel=3).run([step(f"s{i}") for i in range(6)])
+    assert recorder.max_concurrent() == 3
+
+
+def test_should_stop_prevents_new_launches():
+    recorder = Recorder(duration=0.02)
+    steps = [step(f"s{i}", {scheduler.PACMAN_DB}) for i in range(4)]
+    results = StepScheduler(recorder).run(steps, should_stop=lambda: bool(recorder.times))
+    assert results == {"s0": True, "s1": None, "s2": None, "s3": None}
+
+
+def test_cycle_and_unknown_dependency_raise():
+    with pytest.raises(RuntimeError):
+        StepScheduler(Recorder(duration=0)).run([step("a", after=["b"]), step("b", after=["a"])])
+    with pytest.raises(ValueError):
+        StepScheduler(Recorder(duration=0)).run([step("a", after=["missing"])])
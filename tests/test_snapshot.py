@@ -0,0 +1,86 @@
+import os
+
+import snapshot
+from pkgcache import CachedPackage
+from pkgdb import REASON_DEPEND, REASON_EXPLICIT
+
+
+def cached(tmp_path, name, version):
+    path = tmp_path / f"{name}-{version}-x86_64.pkg.tar.zst"
+    path.write_bytes(b"pkg")
+    (tmp_path / (path.name + ".sig")).write_bytes(b"sig")
+    package = CachedPackage(name, version, "x86_64", str(path), 3)
+    package.extra.append(str(path) + ".sig")
+    return package
+
+
+def test_manifest_round_trip_and_expiry(tmp_path):
+    store = snapshot.SnapshotStore(str(tmp_path / "snapshots.json"))
+    assert store.load() == [] and store.latest() is None
+    cache = {("bash", "x86_64"): [cached(tmp_path, "bash", "5.2-1")]}
+    installed = {"bash": ("5.2-1", REASON_EXPLICIT), "gone": ("1-1", REASON_DEPEND)}
+    plans = []
+    for i in range(snapshot.KEEP + 2):
+        plan, sources = snapshot.plan_snapshot(installed, cache, "full_update",
+                                               rollback_root=str(tmp_path / "rollback"), now=1000.0)
+        plans.append(plan)
+        expired = store.add(plan)
+    assert sources == [str(tmp_path / "bash-5.2-1-x86_64.pkg.tar.zst"),
+                       str(tmp_path / "bash-5.2-1-x86_64.pkg.tar.zst.sig")]
+    # Снимки в одну и ту же секунду получают разные id
+    assert len({plan.id for plan in plans}) == len(plans)
+    assert [s.id for s in expired] == [plans[1].id]
+    loaded = store.load()
+    assert [s.id for s in loaded] == [p.id for p in plans[-snapshot.KEEP:]]
+    latest = store.latest()
+    assert latest.to_dict() == plans[-1].to_dict()
+    assert latest.missing == {"gone": "1-1"}
+    assert latest.packages["bash"][2] == ["bash-5.2-1-x86_64.pkg.tar.zst", "bash-5.2-1-x86_64.pkg.tar.zst.sig"]
+
+
+def test_plan_rollback(tmp_path):
+    packages = {
+        "same": ["1-1", REASON_EXPLICIT, ["same-1-1-any.pkg.tar.zst"]],
+        "upgraded": ["1-1", REASON_EXPLICIT, ["upgraded-1-1-any.pkg.tar.zst", "upgraded-1-1-any.pkg.tar.zst.sig"]],
+        "removed-dep": ["2-1", REASON_DEPEND, ["removed-dep-2-1-any.pkg.tar.zst"]],
+        "removed": ["3-1", REASON_EXPLICIT, ["removed-3-1-any.pkg.tar.zst"]],
+    }
+    snap = snapshot.Snapshot("20260101-000000-abcd", 0, "full_update", "/rb/20260101-000000-abcd", packages,
+                             {"uncached": "1-1", "kept": "5-1"})
+    installed = {"same": "1-1", "upgraded": "1-2", "uncached": "1-2", "kept": "5-1", "new": "1-1"}
+    plan = snapshot.plan_rollback(snap, installed)
+    assert plan.changes == [("removed", None, "3-1"), ("removed-dep", None, "2-1"), ("upgraded", "1-2", "1-1")]
+    assert plan.files == ["/rb/20260101-000000-abcd/removed-3-1-any.pkg.tar.zst",
+                          "/rb/20260101-000000-abcd/removed-dep-2-1-any.pkg.tar.zst",
+                          "/rb/20260101-000000-abcd/upgraded-1-1-any.pkg.tar.zst"]
+    assert plan.dependencies == ["removed-dep"]
+    assert plan.unavailable == ["uncached"]
+    assert plan.added == ["new"]
+    steps = snapshot.rollback_steps(plan, sudo=False)
+    assert [s.name for s in steps] == ["rollback", "rollback-reason"]
+    assert steps[1].command == ["pacman", "-D", "--asdeps", "removed-dep"]
+
+
+def test_expiry_ignores_paths_outside_snapshot_dirs():
+    good = snapshot.Snapshot("20260101-000000-abcd", 0, None, "/rb/20260101-000000-abcd", {}, {},
+                             "/snap/20260101-000000-abcd")
+    old = snapshot.Snapshot("20250101-000000", 0, None, "/rb/20250101-000000", {}, {})
+    tampered = [
+        snapshot.Snapshot("x", 0, None, "/var/cache/pacman/pkg", {}, {}, "/home"),
+        snapshot.Snapshot("y", 0, None, "/rb/../etc", {}, {}, "/snap/20260101-000000-abcd/.."),
+        snapshot.Snapshot("z", 0, None, "/rb/20260101-000000-abcd/nested", {}, {}),
+    ]
+    assert snapshot.expired_dirs([good, old] + tampered, "/rb") == [good.rollback_dir, old.rollback_dir]
+    steps = snapshot.expire_steps([good] + tampered, "/tmp/list", sudo=False, rollback_root="/rb",
+                                  btrfs_dir="/snap")
+    assert steps[-1].command == ["btrfs", "subvolume", "delete", "/snap/20260101-000000-abcd"]
+    assert snapshot.expire_steps(tampered, "/tmp/list", rollback_root="/rb", btrfs_dir="/snap") == []
+
+
+def test_btrfs_only_for_subvolume(tmp_path):
+    mounts = tmp_path / "mounts"
+    mounts.write_text(f"/dev/sda2 / btrfs rw 0 0\n/dev/sda3 {tmp_path} ext4 rw 0 0\n")
+    assert not snapshot.is_btrfs_subvolume(str(tmp_path), str(mounts))
+    expected = os.stat("/").st_ino == snapshot.BTRFS_SUBVOLUME_INO
+    assert snapshot.is_btrfs_subvolume("/", str(mounts)) == expected
+    assert snapshot.BTRFS_DIR.split("/")[1] != ".snapshots"
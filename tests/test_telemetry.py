@@ -0,0 +1,52 @@
+import json
+
+import telemetry
+
+
+def test_history_is_capped_and_read_from_tail(tmp_path):
+    path = tmp_path / "telemetry.jsonl"
+    store = telemetry.Telemetry(str(path), max_bytes=4000, keep_bytes=2000)
+    for i in range(200):
+        store.record("operation", operation="full_update", wall_s=float(i))
+        assert path.stat().st_size <= 4000
+    records = store.load()
+    # Обрезка оставляет целые строки и самые новые записи
+    assert records[-1]["wall_s"] == 199.0
+    assert [r["wall_s"] for r in records] == sorted(r["wall_s"] for r in records)
+    assert len(records) == len(path.read_text().splitlines())
+
+    tail = store.load(tail=300)
+    assert 0 < len(tail) < len(records)
+    assert tail == records[-len(tail):]
+
+
+def test_load_skips_broken_lines(tmp_path):
+    path = tmp_path / "telemetry.jsonl"
+    path.write_text('{"ts":1,"kind":"step","wall_s":1}\n{"ts":2,"ki\n'
+                    + json.dumps({"ts": 3, "kind": "step", "wall_s": 2}) + "\n")
+    store = telemetry.Telemetry(str(path))
+    assert [r["ts"] for r in store.load()] == [1, 3]
+    assert [r["ts"] for r in store.load(since=2)] == [3]
+    assert telemetry.Telemetry(str(tmp_path / "missing")).recent() == []
+
+
+def test_summarize_trend():
+    records = [{"ts": i, "kind": "operation", "operation": "op", "wall_s": 10.0 if i < 10 else 20.0}
+               for i in range(15)]
+    records.append({"ts": 20, "kind": "phase", "operation": "op", "step": "update", "phase": "hooks",
+                    "wall_s": 3.0})
+    rows = telemetry.summarize(records)
+    assert [(r.operation, r.step) for r in rows] == [("op", None), ("op", "update/hooks")]
+    assert rows[0].count == 15 and rows[0].p50 == 10.0 and rows[0].trend == 1.0
+
+
+def test_percentile_nearest_rank():
+    assert telemetry.percentile([], 0.5) is None
+    assert telemetry.percentile([2, 1], 0.5) == 1
+    assert telemetry.percentile([6, 5, 4, 3, 2, 1], 0.5) == 3
+    assert telemetry.percentile([5, 1, 3, 2, 4], 0.5) == 3
+    values = list(range(1, 21))
+    assert telemetry.percentile(values, 0.95) == 19
+    assert telemetry.percentile(values, 1.0) == 20
+    assert telemetry.percentile(values, 0.0) == 1
+    assert telemetry.percentile([7], 0.95) == 7
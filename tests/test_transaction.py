@@ -0,0 +1,114 @@
+from transaction import TransactionTracker
+
+# Вывод pacman -Syu в канал (noprogressbar): ни (n/m), ни полосы Total
+PIPE_UPGRADE = """\
+:: Synchronizing package databases...
+ core downloading...
+ extra downloading...
+:: Starting full system upgrade...
+resolving dependencies...
+looking for conflicting packages...
+
+Packages (3) bash-5.2.037-1  glibc-2.41-1  zlib-1:1.3.1-2
+
+Total Download Size:   12.50 MiB
+Total Installed Size:  60.00 MiB
+
+:: Proceed with installation? [Y/n]
+:: Retrieving packages...
+ bash-5.2.037-1-x86_64 downloading...
+ glibc-2.41-1-x86_64 downloading...
+ zlib-1:1.3.1-2-x86_64 downloading...
+checking keyring...
+checking package integrity...
+loading package files...
+checking for file conflicts...
+checking available disk space...
+:: Processing package changes...
+upgrading bash...
+upgrading glibc...
+upgrading zlib...
+:: Running post-transaction hooks...
+"""
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def feed(tracker, text, clock=None, step=1.0):
+    states = []
+    tracker.on_update = states.append
+    for line in text.splitlines(keepends=True):
+        if clock:
+            clock.now += step
+        tracker.feed_text(line)
+    return states
+
+
+def test_pipe_output_counts_packages():
+    tracker = TransactionTracker()
+    states = feed(tracker, PIPE_UPGRADE.split(":: Running")[0])
+    assert tracker.packages == 3
+    phases = [s.phase for s in states]
+    for phase in ("sync", "resolve", "download", "integrity", "conflicts", "install"):
+        assert phase in phases
+    installs = [s for s in states if s.phase == "install" and s.done]
+    assert [s.done for s in installs] == [1, 2, 3]
+    assert installs[-1].percent > installs[0].percent
+    downloads = [s for s in states if s.phase == "download" and s.done]
+    assert downloads[-1].done == 3
+    integrity = [s for s in states if s.phase == "integrity"]
+    assert integrity[-1].total == 3
+
+
+def test_russian_pipe_output():
+    text = ("Пакеты (2) bash-5.2.037-1  zlib-1:1.3.1-2\n"
+            ":: Обработка изменений пакетов...\n"
+            "обновление bash...\n"
+            "обновление zlib...\n"
+            ":: Запуск post-transaction hooks...\n")
+    tracker = TransactionTracker()
+    states = feed(tracker, text)
+    assert [s.phase for s in states] == ["install", "install", "install", "hooks"]
+    assert states[2].done == 2
+
+
+def test_other_commands_do_not_start_tracking():
+    tracker = TransactionTracker()
+    feed(tracker, "removing old packages...\nupgrading cache index...\n")
+    assert not tracker.active
+
+
+def test_tty_counters_still_used():
+    tracker = TransactionTracker()
+    states = feed(tracker, "(1/4) upgrading bash\n(2/4) upgrading glibc\n")
+    assert (states[-1].phase, states[-1].done, states[-1].total) == ("install", 2, 4)
+
+
+def test_partial_eta_when_later_phase_has_no_history():
+    history = [{"kind": "phase", "phase": "install", "wall_s": 30.0, "units": 3},
+               {"kind": "phase", "phase": "conflicts", "wall_s": 2.0, "units": 3}]
+    clock = Clock()
+    tracker = TransactionTracker(load_history=lambda: history, clock=clock)
+    states = feed(tracker, "Packages (3) a-1 b-1 c-1\n:: Retrieving packages...\n", clock)
+    state = states[-1]
+    # У загрузки, проверки и хуков нет истории: оценка по установке и конфликтам
+    assert state.eta_partial
+    assert state.eta == 32.0
+
+
+def test_full_eta_and_none_without_history():
+    tracker = TransactionTracker(clock=Clock())
+    states = feed(tracker, ":: Processing package changes...\n")
+    assert states[-1].eta is None and not states[-1].eta_partial
+
+    history = [{"kind": "phase", "phase": phase, "wall_s": 10.0, "units": 1}
+               for phase in ("install", "hooks")]
+    tracker = TransactionTracker(load_history=lambda: history, clock=Clock())
+    states = feed(tracker, "Packages (2) a-1 b-1\n:: Processing package changes...\n")
+    assert states[-1].eta == 30.0 and not states[-1].eta_partial
@@ -0,0 +1,70 @@
+import io
+import os
+import tarfile
+
+import updates
+from pkgdb import Package
+
+
+def write_db(path, packages):
+    """База репозитория: tar.gz с каталогами имя-версия/desc"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tarfile.open(path, "w:gz") as tar:
+        for name, version, csize, isize in packages:
+            desc = (f"%FILENAME%\n{name}-{version}-x86_64.pkg.tar.zst\n\n%NAME%\n{name}\n\n"
+                    f"%VERSION%\n{version}\n\n%CSIZE%\n{csize}\n\n%ISIZE%\n{isize}\n").encode()
+            info = tarfile.TarInfo(f"{name}-{version}/desc")
+            info.size = len(desc)
+            tar.addfile(info, io.BytesIO(desc))
+
+
+def local(name, version, size):
+    return Package(name, version, 0, size, [], [], [])
+
+
+def test_parse_sync_db(tmp_path):
+    path = str(tmp_path / "core.db")
+    write_db(path, [("bash", "5.2.026-1", 1000, 5000), ("zlib", "1:1.3.1-1", 80, 200)])
+    packages = updates.parse_sync_db(path)
+    assert sorted(packages) == ["bash", "zlib"]
+    assert packages["zlib"].version == "1:1.3.1-1"
+    assert packages["bash"].to_list() == ["5.2.026-1", 1000, 5000, "bash-5.2.026-1-x86_64.pkg.tar.zst", []]
+
+
+def test_preview_updates_from_local_mirror(tmp_path):
+    mirror = tmp_path / "mirror"
+    write_db(str(mirror / "core" / "x86_64" / "core.db"),
+             [("bash", "5.2.026-1", 1000, 5000), ("zlib", "1:1.3.1-1", 80, 200)])
+    write_db(str(mirror / "extra" / "x86_64" / "extra.db"),
+             [("bash", "9.9-1", 1, 1), ("vim", "9.1-1", 300, 900), ("held", "2.0-1", 10, 10)])
+    conf = tmp_path / "pacman.conf"
+    conf.write_text("[options]\nIgnorePkg = held\n\n[core]\nInclude = x\n\n[extra]\nInclude = x\n")
+    installed = {
+        "bash": local("bash", "5.2.015-1", 4000),
+        "zlib": local("zlib", "1:1.3.1-1", 200),
+        "vim": local("vim", "9.0-1", 1000),
+        "held": local("held", "1.0-1", 10),
+    }
+    server = f"file://{mirror}/$repo/$arch"
+    cache_file = str(tmp_path / "sync.json")
+
+    preview = updates.preview_updates(installed, str(tmp_path / "db"), [server], cache_file,
+                                      conf=str(conf), arch="x86_64")
+    # bash берется из первого по порядку репозитория, held игнорируется
+    assert [(u.repo, u.name, u.old, u.new) for u in preview.updates] == [
+        ("core", "bash", "5.2.015-1", "5.2.026-1"), ("extra", "vim", "9.0-1", "9.1-1")]
+    assert preview.download_size == 1300
+    assert preview.installed_delta == 1000 - 100
+    assert preview.errors == {}
+
+    cache = updates.SyncCache(cache_file)
+    assert set(cache.repos) == {"core", "extra"}
+    assert cache.repos["core"]["packages"]["bash"][0] == "5.2.026-1"
+
+
+def test_compute_updates_skips_cached_downloads(tmp_path):
+    sync = {"core": {"bash": updates.SyncPackage("bash", "2-1", 500, 10, "bash-2-1.pkg.tar.zst")}}
+    (tmp_path / "bash-2-1.pkg.tar.zst").write_bytes(b"")
+    pending = updates.compute_updates({"bash": local("bash", "1-1", 10)}, sync, ["core"],
+                                      pkg_cache=str(tmp_path))
+    assert [(u.name, u.download) for u in pending] == [("bash", 0)]
@@ -0,0 +1,72 @@
+import pytest
+
+from vercmp import vercmp, version_key
+
+# Таблица из vercmptest.sh (pacman): сравнение проверяется в обе стороны
+CASES = [
+    # одинаковая длина, без pkgrel
+    ("1.5.0", "1.5.0", 0),
+    ("1.5.1", "1.5.0", 1),
+    ("1.5.1", "1.5", 1),
+    # pkgrel
+    ("1.5.0-1", "1.5.0-1", 0),
+    ("1.5.0-1", "1.5.0-2", -1),
+    ("1.5.0-1", "1.5.1-1", -1),
+    ("1.5.0-2", "1.5.1-1", -1),
+    ("1.5-1", "1.5.1-1", -1),
+    ("1.5-2", "1.5.1-2", -1),
+    ("1.0-10", "1.0-9", 1),
+    # pkgrel только у одной версии не учитывается
+    ("1.5", "1.5-1", 0),
+    ("1.1-1", "1.1", 0),
+    ("1.0-1", "1.1", -1),
+    ("1.1-1", "1.0", 1),
+    # буквенные части
+    ("1.5b-1", "1.5-1", -1),
+    ("1.5b", "1.5", -1),
+    ("1.5b", "1.5.1", -1),
+    ("1.0a", "1.0alpha", -1),
+    ("1.0alpha", "1.0b", -1),
+    ("1.0b", "1.0beta", -1),
+    ("1.0beta", "1.0rc", -1),
+    ("1.0rc", "1.0", -1),
+    ("1.5.a", "1.5", 1),
+    ("1.5.b", "1.5.a", 1),
+    ("1.5.1", "1.5.b", 1),
+    ("1.5.b-1", "1.5.b", 0),
+    ("1.5-1", "1.5.b", -1),
+    ("1.010", "1.9", 1),
+    ("1.001", "1.1", 0),
+    # разделители
+    ("2.0", "2_0", 0),
+    ("2.0_a", "2_0.a", 0),
+    ("2.0a", "2.0.a", -1),
+    ("2___a", "2_a", 1),
+    # ~ в libalpm - обычный разделитель, а не "раньше выпуска", как в dpkg
+    ("1.0~rc1", "1.0", 1),
+    ("1.0~rc1", "1.0rc1", 1),
+    ("1.0~1", "1.0", 1),
+    # эпоха
+    ("0:1.0", "0:1.0", 0),
+    ("0:1.0", "0:1.1", -1),
+    ("1:1.0", "0:1.0", 1),
+    ("1:1.0", "0:1.1", 1),
+    ("1:1.0", "2:1.1", -1),
+    ("1:1.0", "0:1.0-1", 1),
+    ("1:1.0-1", "0:1.1-1", 1),
+    ("0:1.0", "1.0", 0),
+    ("0:1.1", "1.0", 1),
+    ("1:1.0", "1.1", 1),
+    ("1:1.1", "1.1", 1),
+]
+
+
+@pytest.mark.parametrize("a, b, expected", CASES)
+def test_vercmp_matches_alpm(a, b, expected):
+    assert vercmp(a, b) == expected
+    assert vercmp(b, a) == -expected
+
+
+def test_version_key_sorts():
+    versions = ["1:0.9-1", "1.10-1", "1.9-2", "1.9-1", "1.9rc1-1"]
+    assert sorted(versions, key=version_key) == ["1.9rc1-1", "1.9-1", "1.9-2", "1.10-1", "1:0.9-1"]
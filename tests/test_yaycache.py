@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+import aur
+import privileged
+import yaycache
+
+
+def make_build(root, base, packages=(), old=False):
+    path = root / base
+    (path / ".git").mkdir(parents=True)
+    (path / "PKGBUILD").write_text("pkgname=x\n")
+    (path / ".SRCINFO").write_text("".join(f"pkgname = {name}\n" for name in packages or [base]))
+    (path / "src").mkdir()
+    (path / "src" / "main.c").write_text("int main;\n")
+    if old:
+        os.utime(path / "src", (0, 0))
+        os.utime(path / "src" / "main.c", (0, 0))
+    return path
+
+
+def test_prune_paths_stay_inside_cache(tmp_path):
+    root = tmp_path / "yay"
+    make_build(root, "kept", old=True)
+    make_build(root, "gone")
+    plan = yaycache.plan_prune(yaycache.analyze(str(root)), {"kept": "1-1"})
+    files = sorted(plan.files())
+    assert files == [str(root / "gone"), str(root / "kept" / "src")]
+    assert plan.count == 2
+
+    # Каталог сборки подменили ссылкой наружу после анализа
+    outside = tmp_path / "outside"
+    (outside / "src").mkdir(parents=True)
+    os.rename(root / "kept", tmp_path / "moved")
+    os.symlink(outside, root / "kept")
+    with pytest.raises(privileged.UnsafePath):
+        list(plan.files())
+
+
+def test_remove_command_runs_as_owner():
+    assert yaycache.remove_command("/tmp/list")[0] == "xargs"
+    user = privileged.pwd.struct_passwd(("alice", "x", 1000, 1000, "", "/home/alice", "/bin/bash"))
+    command = yaycache.remove_command("/tmp/list", user)
+    assert command[:3] == ["runuser", "-u", "alice"]
+    assert command[-5:] == ["-a", "/tmp/list", "rm", "-rf", "--"]
+
+
+def test_yay_cache_dir_of_invoking_user(monkeypatch):
+    monkeypatch.setattr(privileged.os, "geteuid", lambda: 0)
+    monkeypatch.delenv("PKEXEC_UID", raising=False)
+    monkeypatch.setenv("SUDO_UID", "65534")
+    monkeypatch.setenv("XDG_CACHE_HOME", "/root/.cache")
+    home = privileged.pwd.getpwuid(65534).pw_dir
+    assert aur.yay_cache_dir() == os.path.join(home, ".cache", "yay")
+
+    monkeypatch.delenv("SUDO_UID")
+    assert aur.yay_cache_dir() == "/root/.cache/yay"
+
+
+def set_age(path, days, now):
+    stamp = now - days * yaycache.DAY
+    os.utime(path, (stamp, stamp))
+
+
+def test_policy_keeps_installed_clone_and_package(tmp_path):
+    now = 1_700_000_000
+    root = tmp_path / "yay"
+    app = make_build(root, "app", ["app", "app-docs"])
+    set_age(app / "src", 30, now)
+    for name in ("app-1.0-1-x86_64.pkg.tar.zst", "app-1.0-1-x86_64.pkg.tar.zst.sig",
+                 "app-0.9-1-x86_64.pkg.tar.zst", "app-0.9-1-x86_64.pkg.tar.zst.sig",
+                 "app-docs-1.0-1-any.pkg.tar.zst", "old.log", "fresh.log",
+                 "app-1.0.tar.gz", "app-0.9.tar.gz"):
+        (app / name).write_bytes(b"x")
+        set_age(app / name, 1, now)
+    set_age(app / "old.log", 10, now)
+    set_age(app / "app-0.9.tar.gz", 40, now)
+    fresh = make_build(root, "fresh")
+    set_age(fresh / "src", 1, now)
+    make_build(root, "gone")
+
+    installed = {"app": "1.0-1", "fresh": "1-1"}
+    plan = yaycache.plan_prune(yaycache.analyze(str(root)), installed, now=now)
+    builds = {build.base: build for build in plan.analysis.builds}
+    removed = sorted(item.name for item in builds["app"].remove)
+    # app-docs не установлен: его пакет удаляется, а клон нужен app
+    assert removed == ["app-0.9-1-x86_64.pkg.tar.zst", "app-0.9-1-x86_64.pkg.tar.zst.sig",
+                       "app-0.9.tar.gz", "app-docs-1.0-1-any.pkg.tar.zst", "old.log", "src"]
+    assert not builds["app"].remove_all
+    assert builds["fresh"].remove == []
+    assert builds["gone"].remove_all
+    assert str(root / "gone") in set(plan.files())
+    assert plan.count == len(removed) + 1
+
+    keep_all = yaycache.Policy(src_max_age_days=None, log_max_age_days=None,
+                               sources_max_age_days=None, drop_uninstalled=False)
+    plan = yaycache.plan_prune(plan.analysis, installed, keep_all, now=now)
+    builds = {build.base: build for build in plan.analysis.builds}
+    assert not builds["gone"].remove_all
+    assert {item.category for item in builds["gone"].remove} == {yaycache.GIT}
+
+
+def test_snapshot_rescans_only_changed_directories(tmp_path):
+    root = tmp_path / "yay"
+    make_build(root, "one")
+    two = make_build(root, "two")
+    snapshot = str(tmp_path / "yay.json")
+    first = yaycache.analyze(str(root), snapshot_file=snapshot)
+    assert first.rescanned == len(first.dirs) == 4
+
+    second = yaycache.analyze(str(root), snapshot_file=snapshot)
+    assert second.rescanned == 0
+    assert second.size == first.size
+
+    (two / "src" / "extra.c").write_bytes(b"x" * 10000)
+    os.utime(two / "src", ns=(1, 1))
+    third = yaycache.analyze(str(root), snapshot_file=snapshot)
+    assert third.rescanned == 1
+    assert third.size > first.size
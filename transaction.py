@@ -0,0 +1,374 @@
+"""Модель прогресса транзакции pacman по ее выводу.
+
+Вывод pacman (и pacman внутри yay) проходит фазы:
+    sync       - синхронизация баз (":: Synchronizing package databases...")
+    resolve    - разрешение зависимостей и поиск конфликтов пакетов
+    download   - загрузка пакетов (":: Retrieving packages...")
+    integrity  - ключи, целостность, загрузка файлов пакетов ("(n/m) checking ...")
+    conflicts  - конфликты файлов и свободное место
+    install    - установка, обновление, удаление ("(n/m) upgrading ...")
+    hooks      - хуки до и после транзакции (mkinitcpio, DKMS...)
+Трекер получает завершенные строки и кадры полос прогресса, определяет
+фазу и ее долю выполнения, считает общий процент с весами фаз и оценку
+оставшегося времени. На терминале pacman рисует счетчики (n/m) и полосу
+«Total»; в канал (noprogressbar) он пишет только строки вроде
+" core downloading...", "checking package integrity...", "upgrading foo...",
+и тогда доля считается по числу таких строк относительно списка
+"Packages (N)", который pacman печатает в обоих режимах.
+
+Веса и оценка берутся из истории: для каждой фазы известна скорость
+(секунд на байт загрузки, на пакет, на запуск) по прошлым транзакциям.
+Без истории используются веса по умолчанию. Если для части оставшихся
+фаз истории нет, оценка частичная - нижняя граница по известным фазам.
+
+Строки распознаются на английском и русском (переводы из ru.po pacman):
+pacman пишет на языке системы.
+"""
+import re
+import threading
+import time
+
+PHASES = ("sync", "resolve", "download", "integrity", "conflicts", "install", "hooks")
+
+PHASE_TITLES = {
+    "sync": "Синхронизация баз",
+    "resolve": "Разрешение зависимостей",
+    "download": "Загрузка",
+    "integrity": "Проверка пакетов",
+    "conflicts": "Проверка конфликтов",
+    "install": "Установка",
+    "hooks": "Хуки",
+}
+
+# Доли фаз в общем проценте, пока нет истории
+DEFAULT_WEIGHTS = {
+    "sync": 0.05,
+    "resolve": 0.02,
+    "download": 0.40,
+    "integrity": 0.08,
+    "conflicts": 0.05,
+    "install": 0.30,
+    "hooks": 0.10,
+}
+
+# Сколько последних транзакций учитывать и с какой доли фазы ей верить
+HISTORY_RUNS = 20
+MIN_FRACTION = 0.05
+
+_COUNTED = re.compile(r"^\(\s*(\d+)/(\d+)\)\s*(.*)$")
+_MARKERS = (
+    ("sync", re.compile(r"^:: (?:Synchronizing package databases|Синхронизация баз данных пакетов)")),
+    ("resolve", re.compile(r"^(?:resolving dependencies|looking for conflicting packages"
+                           r"|разрешение зависимостей|поиск конфликтующих пакетов)")),
+    ("download", re.compile(r"^:: (?:Retrieving packages|Получение пакетов)")),
+    ("install", re.compile(r"^:: (?:Processing package changes|Обработка изменений пакетов)")),
+    ("hooks", re.compile(r"^:: (?:Running (?:pre|post)-transaction hooks"
+                         r"|Запуск (?:pre|post)-transaction hooks|Запуск хуков)")),
+)
+# Шаги фаз проверки: в (n/m) на терминале и отдельными строками в канале
+_STEP_PHASES = (
+    ("integrity", re.compile(r"^(?:checking keys in keyring|checking keyring|checking package integrity"
+                             r"|loading package files|downloading required keys"
+                             r"|проверка ключей|проверка связки ключей|проверка целостности пакет"
+                             r"|загрузка файлов пакетов|загрузка необходимых ключей)")),
+    ("conflicts", re.compile(r"^(?:checking for file conflicts|checking available disk space"
+                             r"|проверка конфликтов файлов|проверка доступного места)")),
+)
+# Сколько шагов у фаз проверки без счетчиков (ключи, целостность, файлы; конфликты, место)
+_STEPS = {"integrity": 3, "conflicts": 2}
+_OPERATION = re.compile(r"^(?:installing|upgrading|reinstalling|downgrading|removing"
+                        r"|установка|обновление|переустановка|откат версии|удаление) \S")
+_DOWNLOADING = re.compile(r"^\S+ (?:downloading|загружается)\.\.\.$")
+_PACKAGES = re.compile(r"^(?:Packages|Package|Пакеты|Пакет)\s*\((\d+)\)")
+_DOWNLOAD_SIZE = re.compile(r"^(?:Total Download Size|Будет загружено):\s*([\d.,]+)\s*([KMGT]?i?B)")
+_TOTAL_BAR = re.compile(r"^\s*(?:Total|Всего)\s*\(\s*(\d+)/(\d+)\)")
+_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+
+
+def parse_size(number, unit):
+    return int(float(number.replace(",", ".")) * _UNITS.get(unit, 1))
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+class PhaseRates:
+    """Скорости фаз по прошлым транзакциям (записи телеметрии kind=phase)"""
+
+    def __init__(self, records=()):
+        runs = {}
+        for entry in records:
+            if entry.get("kind") == "phase" and entry.get("phase") in DEFAULT_WEIGHTS:
+                runs.setdefault(entry["phase"], []).append(entry)
+        self.rates = {}
+        self.durations = {}
+        for phase, entries in runs.items():
+            entries = entries[-HISTORY_RUNS:]
+            self.durations[phase] = _median([e["wall_s"] for e in entries])
+            rates = [e["wall_s"] / e["units"] for e in entries if e.get("units")]
+            if rates:
+                self.rates[phase] = _median(rates)
+
+    def expected(self, phase, units):
+        """Ожидаемая длительность фазы для units единиц или None"""
+        if units is not None and phase in self.rates:
+            return self.rates[phase] * units
+        return self.durations.get(phase)
+
+
+class TransactionState:
+    """Снимок прогресса для интерфейса"""
+
+    __slots__ = ("phase", "done", "total", "percent", "eta", "rate", "eta_partial")
+
+    def __init__(self, phase, done, total, percent, eta, rate, eta_partial=False):
+        self.phase = phase
+        self.done = done
+        self.total = total
+        self.percent = percent
+        self.eta = eta
+        self.rate = rate
+        # eta - нижняя граница: для части оставшихся фаз нет истории
+        self.eta_partial = eta_partial
+
+    @property
+    def title(self):
+        return PHASE_TITLES.get(self.phase, self.phase)
+
+    def __eq__(self, other):
+        return isinstance(other, TransactionState) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __str__(self):
+        text = self.title
+        if self.total:
+            text += f" {self.done}/{self.total}"
+        text += f", {self.percent}%"
+        return f"{text} ({self.rate})" if self.rate else text
+
+
+class TransactionTracker:
+    """Следит за фазами транзакции по строкам вывода.
+
+    load_history() возвращает записи телеметрии для PhaseRates и
+    вызывается только когда в выводе встретилась первая фаза: большинство
+    команд транзакций не выполняют. on_update(TransactionState)
+    вызывается при изменении состояния (из потока чтения вывода).
+    finish() возвращает секунды каждой фазы.
+    """
+
+    def __init__(self, load_history=None, on_update=None, clock=time.monotonic):
+        self.load_history = load_history
+        self.rates = None
+        self.on_update = on_update
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.phase = None
+        # Место в порядке PHASES: хуки до транзакции идут перед установкой
+        self.position = -1
+        self.phase_start = None
+        self.times = {}
+        self.done = 0
+        self.total = 0
+        self.fraction = 0.0
+        self.rate = None
+        self.packages = None
+        self.download_bytes = None
+        self.state = None
+
+    @property
+    def active(self):
+        return self.phase is not None
+
+    def feed_text(self, text):
+        """Завершенные строки вывода"""
+        with self.lock:
+            changed = False
+            for line in text.splitlines():
+                changed = self._line(line.strip()) or changed
+            if changed:
+                self._publish()
+
+    def feed_progress(self, progress):
+        """Кадр полосы прогресса (console.Progress)"""
+        with self.lock:
+            if self.phase is None:
+                return
+            total = _TOTAL_BAR.match(progress.label)
+            if self.phase == "download" and total:
+                self.done, self.total = int(total.group(1)), int(total.group(2))
+                self.fraction = progress.percent / 100
+            elif self.phase in ("integrity", "conflicts") and self.total:
+                # Полоса "(n/m) проверка ..." - доля внутри шага n
+                self.fraction = (self.done - 1 + progress.percent / 100) / self.total
+            self.rate = progress.rate
+            self._publish()
+
+    def _enter(self, phase):
+        if self.rates is None:
+            self.rates = PhaseRates(self.load_history() if self.load_history else ())
+        now = self.clock()
+        if self.phase is not None:
+            self.times[self.phase] = self.times.get(self.phase, 0.0) + now - self.phase_start
+        if phase in ("sync", "resolve") and self.position >= PHASES.index("download"):
+            # Новая транзакция в той же команде (yay запускает pacman несколько раз)
+            self.packages = self.download_bytes = None
+        self.phase = phase
+        self.phase_start = now
+        if phase == "hooks" and self.position < PHASES.index("install"):
+            self.position = PHASES.index("conflicts")
+        else:
+            self.position = PHASES.index(phase)
+        self.done = self.total = 0
+        self.fraction = 0.0
+        self.rate = None
+
+    def _line(self, line):
+        if not line:
+            return False
+        match = _PACKAGES.match(line)
+        if match:
+            self.packages = int(match.group(1))
+            return False
+        match = _DOWNLOAD_SIZE.match(line)
+        if match:
+            self.download_bytes = parse_size(match.group(1), match.group(2))
+            return False
+        for phase, pattern in _MARKERS:
+            if pattern.match(line):
+                if phase != self.phase:
+                    self._enter(phase)
+                return True
+        match = _COUNTED.match(line)
+        if match:
+            done, total, text = int(match.group(1)), int(match.group(2)), match.group(3)
+            phase = self.phase if self.phase == "hooks" else self._step_phase(text)
+            if phase is None:
+                return False
+            if phase != self.phase:
+                self._enter(phase)
+            self.done, self.total = done, total
+            self.fraction = done / total if total else 0.0
+            return True
+        # Вывод без терминала: шаги и операции отдельными строками без (n/m);
+        # такие строки пишут и другие команды, поэтому только внутри транзакции
+        if self.phase is None:
+            return False
+        phase = self._step_phase(line)
+        if phase in _STEPS:
+            if phase != self.phase:
+                self._enter(phase)
+            self.total = max(self.total, _STEPS[phase], self.done + 1)
+            self.done += 1
+            self.fraction = (self.done - 1) / self.total
+            return True
+        if phase == "install":
+            if self.phase != "install":
+                self._enter("install")
+            # Строка печатается в начале операции: завершено на одну меньше
+            self._count(self.packages)
+            return True
+        if self.phase == "download" and not self.total:
+            if _DOWNLOADING.match(line):
+                # Начало загрузки файла; при параллельной загрузке доля немного опережает
+                self._count(self.packages)
+                return True
+            if line.endswith("100%") and not _TOTAL_BAR.match(line) and self.packages:
+                # Без полосы Total доля считается по скачанным файлам
+                self.done += 1
+                self.fraction = min(self.done / self.packages, 1.0)
+                return True
+        return False
+
+    def _step_phase(self, text):
+        for name, pattern in _STEP_PHASES:
+            if pattern.match(text):
+                return name
+        return "install" if _OPERATION.match(text) else None
+
+    def _count(self, total):
+        """Еще одна начатая единица фазы из total (или неизвестного числа)"""
+        self.done += 1
+        if total:
+            self.fraction = min((self.done - 1) / total, 1.0)
+
+    def _units(self, phase):
+        if phase == "download":
+            return self.download_bytes
+        if phase in ("integrity", "conflicts", "install"):
+            return self.packages
+        return 1
+
+    def _expected(self, phase):
+        if phase == "download" and self.download_bytes == 0:
+            return 0.0
+        return self.rates.expected(phase, self._units(phase))
+
+    def _weights(self):
+        expected = {phase: self._expected(phase) for phase in PHASES}
+        if all(value is not None for value in expected.values()) and sum(expected.values()) > 0:
+            total = sum(expected.values())
+            return {phase: value / total for phase, value in expected.items()}
+        return DEFAULT_WEIGHTS
+
+    def _publish(self):
+        if self.phase is None:
+            return
+        weights = self._weights()
+        fraction = min(max(self.fraction, 0.0), 1.0)
+        percent = sum(weights[p] for p in PHASES[:self.position + 1])
+        if self.phase != "hooks" or self.position == PHASES.index("hooks"):
+            percent -= weights[self.phase] * (1 - fraction)
+        percent = int(min(max(percent, 0.0), 1.0) * 100)
+        eta, partial = self._eta(fraction)
+        state = TransactionState(self.phase, self.done, self.total, percent, eta, self.rate, partial)
+        if state != self.state:
+            self.state = state
+            if self.on_update:
+                self.on_update(state)
+
+    def _eta(self, fraction):
+        """(секунд до конца транзакции, частичная ли оценка) или (None, False)"""
+        elapsed = self.clock() - self.phase_start
+        known = True
+        if fraction >= MIN_FRACTION:
+            remaining = elapsed * (1 - fraction) / fraction
+        else:
+            expected = self._expected(self.phase)
+            known = expected is not None
+            remaining = max(expected - elapsed, 0.0) if known else 0.0
+        later = PHASES[self.position + 1:]
+        if self.phase == "hooks" and self.position < PHASES.index("hooks"):
+            later = PHASES[PHASES.index("install"):]
+        partial = not known
+        for phase in later:
+            expected = self._expected(phase)
+            if expected is None:
+                partial = True
+            else:
+                known = True
+                remaining += expected
+        if not known:
+            return None, False
+        return remaining, partial
+
+    def finish(self):
+        """Закрыть текущую фазу и вернуть {фаза: секунды}"""
+        with self.lock:
+            if self.phase is not None:
+                self.times[self.phase] = (self.times.get(self.phase, 0.0)
+                                          + self.clock() - self.phase_start)
+                self.phase = None
+            return dict(self.times)
+
+    def units(self):
+        """Единицы фаз для скоростей в телеметрии"""
+        return {phase: self._units(phase) for phase in self.times}
+
+
+def format_timings(timings):
+    """Строка «Загрузка 120.0 с, Установка 300.5 с, ...» в порядке фаз"""
+    return ", ".join(f"{PHASE_TITLES[phase]} {timings[phase]:.1f} с"
+                     for phase in PHASES if phase in timings)
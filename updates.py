@@ -0,0 +1,298 @@
+"""Предпросмотр обновлений по базам репозиториев без изменения системы.
+
+Как checkupdates, базы репозиториев скачиваются в собственный каталог
+(а не в /var/lib/pacman/sync), поэтому системная база не меняется и
+права root не нужны. Файлы .db читаются потоком через tarfile без
+распаковки на диск, версии сравниваются с локальной базой функцией
+vercmp. Разобранные базы кэшируются по ETag/Last-Modified и mtime файла:
+если зеркало ответило 304, повторный предпросмотр почти мгновенен.
+"""
+import email.utils
+import io
+import json
+import os
+import tarfile
+import urllib.error
+import urllib.request
+
+from pkgdb import dep_name, parse_sections
+from prefetch import PKG_CACHE
+from vercmp import vercmp
+
+PACMAN_CONF = "/etc/pacman.conf"
+SYNC_CACHE_VERSION = 2
+DEFAULT_TIMEOUT = 30
+CHUNK = 256 * 1024
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class SyncPackage:
+    """Пакет из базы репозитория"""
+
+    __slots__ = ("name", "version", "csize", "isize", "filename", "provides")
+
+    def __init__(self, name, version, csize, isize, filename, provides=()):
+        self.name = name
+        self.version = version
+        self.csize = csize
+        self.isize = isize
+        self.filename = filename
+        self.provides = list(provides)
+
+    @classmethod
+    def from_desc(cls, desc):
+        return cls(
+            name=desc["NAME"][0],
+            version=desc.get("VERSION", [""])[0],
+            csize=int(desc.get("CSIZE", [0])[0]),
+            isize=int(desc.get("ISIZE", [0])[0]),
+            filename=desc.get("FILENAME", [""])[0],
+            provides=[dep_name(p) for p in desc.get("PROVIDES", [])],
+        )
+
+    def to_list(self):
+        return [self.version, self.csize, self.isize, self.filename, self.provides]
+
+
+def read_pacman_conf(path=PACMAN_CONF):
+    """Репозитории в порядке pacman.conf и список IgnorePkg"""
+    repos = []
+    ignored = []
+    section = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+                if section != "options":
+                    repos.append(section)
+            elif section == "options" and "=" in line:
+                key, value = (part.strip() for part in line.split("=", 1))
+                if key == "IgnorePkg":
+                    ignored.extend(value.split())
+    return repos, ignored
+
+
+def _open_db(path):
+    """Открыть .db потоком; zstd - только если его поддерживает tarfile"""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == _ZSTD_MAGIC:
+        try:
+            return tarfile.open(path, "r|zst")
+        except tarfile.CompressionError:
+            raise RuntimeError(f"{path}: база сжата zstd, а этот Python его не поддерживает")
+    return tarfile.open(path, "r|*")
+
+
+def parse_sync_db(path):
+    """Разобрать базу репозитория: {имя: SyncPackage}"""
+    packages = {}
+    with _open_db(path) as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith("/desc"):
+                continue
+            data = tar.extractfile(member).read()
+            desc = parse_sections(io.StringIO(data.decode("utf-8", "surrogateescape")))
+            if "NAME" in desc:
+                package = SyncPackage.from_desc(desc)
+                packages[package.name] = package
+    return packages
+
+
+class SyncCache:
+    """Разобранные базы и заголовки HTTP для условных запросов"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.repos = {}
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == SYNC_CACHE_VERSION:
+                    self.repos = data.get("repos", {})
+            except (OSError, ValueError):
+                self.repos = {}
+
+    def headers(self, repo, db_path):
+        """Заголовки условного запроса, если файл на диске соответствует кэшу"""
+        entry = self.repos.get(repo)
+        if not entry or not os.path.exists(db_path):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, repo, db_path):
+        """{имя: SyncPackage} из кэша или заново разобранной базы"""
+        st = os.stat(db_path)
+        entry = self.repos.get(repo)
+        if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+            return {name: SyncPackage(name, *fields) for name, fields in entry["packages"].items()}
+        packages = parse_sync_db(db_path)
+        entry = dict(entry or {}, mtime_ns=st.st_mtime_ns, size=st.st_size,
+                     packages={name: p.to_list() for name, p in packages.items()})
+        self.repos[repo] = entry
+        return packages
+
+    def remember(self, repo, etag, last_modified):
+        entry = self.repos.setdefault(repo, {})
+        entry["etag"] = etag
+        entry["last_modified"] = last_modified
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SYNC_CACHE_VERSION, "repos": self.repos}, f,
+                      separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def db_url(server, repo, arch=None):
+    arch = arch or os.uname().machine
+    return server.replace("$repo", repo).replace("$arch", arch).rstrip("/") + f"/{repo}.db"
+
+
+def fetch_db(url, path, headers, timeout=DEFAULT_TIMEOUT):
+    """Скачать базу в path; вернуть (изменилась ли, ETag, Last-Modified)"""
+    request = urllib.request.Request(url, headers=dict(headers, **{"User-Agent": "manjaro_updater"}))
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return False, headers.get("If-None-Match"), headers.get("If-Modified-Since")
+        raise
+    tmp = path + ".part"
+    with response, open(tmp, "wb") as f:
+        while True:
+            chunk = response.read(CHUNK)
+            if not chunk:
+                break
+            f.write(chunk)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+    if last_modified:
+        # mtime файла - время изменения на зеркале, как у pacman
+        try:
+            stamp = email.utils.parsedate_to_datetime(last_modified).timestamp()
+            os.utime(tmp, (stamp, stamp))
+        except (TypeError, ValueError):
+            pass
+    os.replace(tmp, path)
+    return True, etag, last_modified
+
+
+def sync_databases(dbpath, repos, servers, cache, timeout=DEFAULT_TIMEOUT, arch=None):
+    """Обновить базы repos в dbpath/sync с первого ответившего зеркала.
+
+    Возвращает ({репозиторий: путь к .db}, {репозиторий: ошибка}).
+    """
+    sync_dir = os.path.join(dbpath, "sync")
+    os.makedirs(sync_dir, exist_ok=True)
+    paths, errors = {}, {}
+    for repo in repos:
+        path = os.path.join(sync_dir, f"{repo}.db")
+        for server in servers:
+            try:
+                _, etag, last_modified = fetch_db(db_url(server, repo, arch), path,
+                                                  cache.headers(repo, path), timeout)
+            except (OSError, ValueError) as e:
+                errors[repo] = f"{server}: {e}"
+                continue
+            cache.remember(repo, etag, last_modified)
+            paths[repo] = path
+            errors.pop(repo, None)
+            break
+        else:
+            # Зеркала недоступны: показать хотя бы по прошлой загрузке
+            if os.path.exists(path):
+                paths[repo] = path
+    return paths, errors
+
+
+class PendingUpdate:
+    """Пакет, который обновится"""
+
+    def __init__(self, name, repo, old, new, download, isize_delta):
+        self.name = name
+        self.repo = repo
+        self.old = old
+        self.new = new
+        self.download = download
+        self.isize_delta = isize_delta
+
+
+class UpdatePreview:
+    """Список обновлений, размер загрузки и изменение занятого места"""
+
+    def __init__(self, updates, errors=None):
+        self.updates = updates
+        self.errors = errors or {}
+
+    @property
+    def download_size(self):
+        return sum(u.download for u in self.updates)
+
+    @property
+    def installed_delta(self):
+        return sum(u.isize_delta for u in self.updates)
+
+    def report(self, format_size, limit=None):
+        lines = [f"{u.repo}/{u.name} {u.old} -> {u.new}" for u in self.updates[:limit]]
+        if limit is not None and len(self.updates) > limit:
+            lines.append(f"... и ещё {len(self.updates) - limit}")
+        sign = "+" if self.installed_delta >= 0 else "-"
+        lines.append(f"Пакетов к обновлению: {len(self.updates)}, загрузка: "
+                     f"{format_size(self.download_size)}, изменение размера: "
+                     f"{sign}{format_size(abs(self.installed_delta))}")
+        for repo, error in sorted(self.errors.items()):
+            lines.append(f"⚠ {repo}: {error}")
+        return lines
+
+
+def compute_updates(installed, sync_dbs, repos, ignored=(), pkg_cache=None):
+    """Сравнить установленные пакеты с базами репозиториев.
+
+    installed - {имя: pkgdb.Package}, sync_dbs - {репозиторий: {имя: SyncPackage}};
+    пакет берется из первого по порядку repos репозитория, где он есть.
+    Уже скачанные в кэш пакеты в размер загрузки не входят.
+    """
+    pkg_cache = pkg_cache or PKG_CACHE
+    updates = []
+    ignored = set(ignored)
+    for name, local in sorted(installed.items()):
+        if name in ignored:
+            continue
+        for repo in repos:
+            sync = sync_dbs.get(repo, {}).get(name)
+            if sync is None:
+                continue
+            if vercmp(sync.version, local.version) > 0:
+                cached = sync.filename and os.path.exists(os.path.join(pkg_cache, sync.filename))
+                updates.append(PendingUpdate(name, repo, local.version, sync.version,
+                                             0 if cached else sync.csize, sync.isize - local.size))
+            break
+    return updates
+
+
+def preview_updates(installed, dbpath, servers, cache_file=None, conf=PACMAN_CONF,
+                    timeout=DEFAULT_TIMEOUT, arch=None):
+    """Синхронизировать базы в dbpath и вернуть UpdatePreview"""
+    repos, ignored = read_pacman_conf(conf)
+    cache = SyncCache(cache_file)
+    paths, errors = sync_databases(dbpath, repos, servers, cache, timeout, arch)
+    sync_dbs = {}
+    for repo, path in paths.items():
+        try:
+            sync_dbs[repo] = cache.load(repo, path)
+        except (OSError, tarfile.TarError, RuntimeError) as e:
+            errors[repo] = str(e)
+    cache.save()
+    return UpdatePreview(compute_updates(installed, sync_dbs, repos, ignored), errors)
@@ -0,0 +1,81 @@
+"""Сравнение версий пакетов, совместимое с vercmp из libalpm"""
+import functools
+
+
+def _split_evr(evr):
+    """Разбить 'epoch:version-release' на части"""
+    epoch, sep, rest = evr.partition(":")
+    if not sep or not epoch.isdigit():
+        epoch, rest = "0", evr
+    version, sep, release = rest.rpartition("-")
+    if not sep:
+        version, release = rest, None
+    return epoch or "0", version, release
+
+
+def rpmvercmp(a, b):
+    """Сравнить две строки версии по алгоритму rpmvercmp: -1, 0 или 1"""
+    if a == b:
+        return 0
+    one = two = 0
+    len_a, len_b = len(a), len(b)
+    while one < len_a and two < len_b:
+        start_a, start_b = one, two
+        while one < len_a and not a[one].isalnum():
+            one += 1
+        while two < len_b and not b[two].isalnum():
+            two += 1
+        if one >= len_a or two >= len_b:
+            break
+        # Разная длина разделителей решает сравнение
+        if one - start_a != two - start_b:
+            return -1 if one - start_a < two - start_b else 1
+        end_a, end_b = one, two
+        if a[one].isdigit():
+            while end_a < len_a and a[end_a].isdigit():
+                end_a += 1
+            while end_b < len_b and b[end_b].isdigit():
+                end_b += 1
+            numeric = True
+        else:
+            while end_a < len_a and a[end_a].isalpha():
+                end_a += 1
+            while end_b < len_b and b[end_b].isalpha():
+                end_b += 1
+            numeric = False
+        seg_a, seg_b = a[one:end_a], b[two:end_b]
+        if not seg_b:
+            # Числовой сегмент новее буквенного
+            return 1 if numeric else -1
+        if numeric:
+            seg_a, seg_b = seg_a.lstrip("0"), seg_b.lstrip("0")
+            if len(seg_a) != len(seg_b):
+                return 1 if len(seg_a) > len(seg_b) else -1
+        if seg_a != seg_b:
+            return 1 if seg_a > seg_b else -1
+        one, two = end_a, end_b
+    rest_a, rest_b = a[one:], b[two:]
+    if not rest_a and not rest_b:
+        return 0
+    # Оставшийся буквенный хвост никогда не новее пустой строки
+    if (not rest_a and not rest_b[:1].isalpha()) or rest_a[:1].isalpha():
+        return -1
+    return 1
+
+
+@functools.lru_cache(maxsize=65536)
+def vercmp(a, b):
+    """Сравнить полные версии пакетов ('1:2.0-3'): -1, 0 или 1"""
+    if a == b:
+        return 0
+    epoch_a, ver_a, rel_a = _split_evr(a)
+    epoch_b, ver_b, rel_b = _split_evr(b)
+    result = rpmvercmp(epoch_a, epoch_b)
+    if result == 0:
+        result = rpmvercmp(ver_a, ver_b)
+        if result == 0 and rel_a is not None and rel_b is not None:
+            result = rpmvercmp(rel_a, rel_b)
+    return result
+
+
+version_key = functools.cmp_to_key(vercmp)
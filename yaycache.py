@@ -0,0 +1,358 @@
+"""Анализ и очистка кэша сборок yay (~/.cache/yay).
+
+yay -Sc удаляет кэш сборок целиком и ничего не сообщает. Здесь каталог
+каждой PackageBase разбирается по категориям:
+    git      - клон AUR (.git, PKGBUILD, .SRCINFO)
+    src      - деревья сборки makepkg (src/, pkg/)
+    pkg      - собранные пакеты *.pkg.tar.* и подписи
+    logs     - журналы makepkg *.log
+    sources  - скачанные исходники и всё остальное
+Размеры считаются по занятому на диске месту. Поддеревья обходятся
+os.scandir в нескольких потоках; снимок (mtime, размер файлов и
+подкаталоги каждого каталога) сохраняется, и при следующем анализе
+каталог, mtime которого не изменился, не перечитывается. Изменение
+размера файла без добавления или удаления файлов mtime каталога не
+меняет, поэтому снимок дает оценку, а не точный du.
+
+Политика решает, что удалить: клоны установленных пакетов остаются,
+деревья сборки и журналы старше N дней удаляются, из собранных пакетов
+остается установленная версия, каталоги неустановленных пакетов
+удаляются целиком. Перед удалением каждый путь проверяется: он должен
+лежать внутри кэша сборок, а при запуске через sudo удаление идет от
+пользователя, которому кэш принадлежит.
+"""
+import json
+import os
+import time
+
+import privileged
+from console import format_size
+from pkgcache import parse_filename
+
+SNAPSHOT_VERSION = 1
+DAY = 86400
+
+GIT = "git"
+SRC = "src"
+PKG = "pkg"
+LOGS = "logs"
+SOURCES = "sources"
+CATEGORIES = (GIT, SRC, PKG, LOGS, SOURCES)
+
+_GIT_FILES = {".git", "PKGBUILD", ".SRCINFO"}
+_SRC_DIRS = {"src", "pkg"}
+
+
+class Policy:
+    """Что сохранять в кэше сборок"""
+
+    def __init__(self, src_max_age_days=7, log_max_age_days=7, sources_max_age_days=30,
+                 keep_installed_git=True, keep_installed_pkg=True, drop_uninstalled=True):
+        self.src_max_age_days = src_max_age_days
+        self.log_max_age_days = log_max_age_days
+        self.sources_max_age_days = sources_max_age_days
+        self.keep_installed_git = keep_installed_git
+        self.keep_installed_pkg = keep_installed_pkg
+        self.drop_uninstalled = drop_uninstalled
+
+
+DEFAULT_POLICY = Policy()
+
+
+def category(name, is_dir):
+    """Категория элемента верхнего уровня каталога сборки"""
+    if name in _GIT_FILES:
+        return GIT
+    if is_dir and name in _SRC_DIRS:
+        return SRC
+    if not is_dir:
+        if parse_filename(name[:-4] if name.endswith(".sig") else name):
+            return PKG
+        if name.endswith(".log"):
+            return LOGS
+    return SOURCES
+
+
+class Item:
+    """Элемент верхнего уровня каталога сборки"""
+
+    __slots__ = ("path", "name", "category", "size", "mtime")
+
+    def __init__(self, path, name, category, size, mtime):
+        self.path = path
+        self.name = name
+        self.category = category
+        self.size = size
+        # Для каталогов - самый новый mtime в поддереве
+        self.mtime = mtime
+
+
+class BuildDir:
+    """Каталог одной PackageBase в кэше yay"""
+
+    def __init__(self, base, path):
+        self.base = base
+        self.path = path
+        self.items = []
+        # Имена пакетов из .SRCINFO
+        self.packages = set()
+        self.remove = []
+        self.remove_all = False
+
+    @property
+    def size(self):
+        return sum(item.size for item in self.items)
+
+    @property
+    def freed(self):
+        return sum(item.size for item in self.remove)
+
+    def sizes(self):
+        """{категория: байт}"""
+        result = dict.fromkeys(CATEGORIES, 0)
+        for item in self.items:
+            result[item.category] += item.size
+        return result
+
+
+def read_srcinfo(path):
+    """pkgbase и имена пакетов из .SRCINFO"""
+    names = set()
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                key, _, value = line.strip().partition(" = ")
+                if key in ("pkgname", "pkgbase"):
+                    names.add(value)
+    except OSError:
+        pass
+    return names
+
+
+def _walk(root, rel, old_dirs):
+    """Обойти поддерево root/rel: (байт, новейший mtime, {каталог: запись снимка}, перечитано)"""
+    total = 0
+    newest = 0
+    dirs = {}
+    rescanned = 0
+    stack = [rel]
+    while stack:
+        current = stack.pop()
+        try:
+            st = os.lstat(os.path.join(root, current))
+        except OSError:
+            continue
+        old = old_dirs.get(current)
+        if old is not None and old[0] == st.st_mtime_ns:
+            own, children = old[1], old[2]
+        else:
+            rescanned += 1
+            own, children = 0, []
+            try:
+                with os.scandir(os.path.join(root, current)) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                children.append(entry.name)
+                            else:
+                                own += entry.stat(follow_symlinks=False).st_blocks * 512
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        dirs[current] = [st.st_mtime_ns, own, children]
+        total += own
+        newest = max(newest, st.st_mtime_ns)
+        stack.extend(os.path.join(current, child) for child in children)
+    return total, newest / 1e9, dirs, rescanned
+
+
+class Analysis:
+    """Итог обхода кэша: каталоги сборок и статистика обхода"""
+
+    def __init__(self, root, builds, dirs, rescanned):
+        self.root = root
+        self.builds = builds
+        self.dirs = dirs
+        self.rescanned = rescanned
+
+    @property
+    def size(self):
+        return sum(build.size for build in self.builds)
+
+    def sizes(self):
+        result = dict.fromkeys(CATEGORIES, 0)
+        for build in self.builds:
+            for name, size in build.sizes().items():
+                result[name] += size
+        return result
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "root": self.root, "dirs": self.dirs},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+
+def load_snapshot(path, root):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != SNAPSHOT_VERSION or data.get("root") != root:
+        return {}
+    return data.get("dirs", {})
+
+
+def analyze(root, snapshot_file=None, workers=None):
+    """Обойти кэш сборок root, вернуть Analysis (и обновить снимок)"""
+    from concurrent.futures import ThreadPoolExecutor
+    root = os.path.abspath(root)
+    old_dirs = load_snapshot(snapshot_file, root) if snapshot_file else {}
+    builds = []
+    tasks = []
+    try:
+        bases = sorted(os.scandir(root), key=lambda e: e.name)
+    except FileNotFoundError:
+        bases = []
+    for base_entry in bases:
+        if not base_entry.is_dir(follow_symlinks=False):
+            continue
+        build = BuildDir(base_entry.name, base_entry.path)
+        build.packages = read_srcinfo(os.path.join(base_entry.path, ".SRCINFO")) or {build.base}
+        builds.append(build)
+        try:
+            with os.scandir(base_entry.path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        item = Item(entry.path, entry.name, category(entry.name, is_dir), 0, 0)
+                        if is_dir:
+                            tasks.append((item, os.path.join(build.base, entry.name)))
+                        else:
+                            st = entry.stat(follow_symlinks=False)
+                            item.size, item.mtime = st.st_blocks * 512, st.st_mtime
+                    except OSError:
+                        continue
+                    build.items.append(item)
+        except OSError:
+            continue
+
+    dirs = {}
+    rescanned = 0
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    if tasks:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda task: _walk(root, task[1], old_dirs), tasks)
+            for (item, _), (size, newest, part, count) in zip(tasks, results):
+                item.size, item.mtime = size, newest
+                dirs.update(part)
+                rescanned += count
+    analysis = Analysis(root, builds, dirs, rescanned)
+    if snapshot_file:
+        analysis.save(snapshot_file)
+    return analysis
+
+
+def select_removals(build, installed, policy, now):
+    """Отметить элементы каталога сборки, которые политика не сохраняет.
+
+    installed - {имя пакета: версия}.
+    """
+    versions = {name: installed[name] for name in build.packages if name in installed}
+    if not versions and policy.drop_uninstalled:
+        build.remove_all = True
+        build.remove = list(build.items)
+        return
+    limits = {
+        SRC: policy.src_max_age_days,
+        LOGS: policy.log_max_age_days,
+        SOURCES: policy.sources_max_age_days,
+    }
+    for item in build.items:
+        if item.category == GIT:
+            remove = not (versions and policy.keep_installed_git)
+        elif item.category == PKG:
+            parsed = parse_filename(item.name[:-4] if item.name.endswith(".sig") else item.name)
+            keep = policy.keep_installed_pkg and parsed and versions.get(parsed[0]) == parsed[1]
+            remove = not keep
+        else:
+            days = limits[item.category]
+            remove = days is not None and now - item.mtime > days * DAY
+        if remove:
+            build.remove.append(item)
+
+
+class PrunePlan:
+    """Что удалить из кэша сборок и отчет по категориям"""
+
+    def __init__(self, analysis):
+        self.analysis = analysis
+
+    def files(self):
+        """Пути для удаления: каталог целиком или отдельные элементы.
+
+        Путь вне кэша сборок (в том числе через ссылку в родительском
+        каталоге) - privileged.UnsafePath.
+        """
+        roots = [self.analysis.root]
+        for build in self.analysis.builds:
+            paths = [build.path] if build.remove_all else [item.path for item in build.remove]
+            for path in paths:
+                yield privileged.check_path(path, roots)
+
+    @property
+    def count(self):
+        return sum(1 if build.remove_all else len(build.remove) for build in self.analysis.builds)
+
+    @property
+    def total(self):
+        return sum(build.freed for build in self.analysis.builds)
+
+    def freed_by_category(self):
+        result = dict.fromkeys(CATEGORIES, 0)
+        for build in self.analysis.builds:
+            for item in build.remove:
+                result[item.category] += item.size
+        return result
+
+    def report(self, limit=10):
+        analysis = self.analysis
+        sizes = analysis.sizes()
+        freed = self.freed_by_category()
+        lines = [f"Кэш сборок {analysis.root}: {format_size(analysis.size)}, "
+                 f"каталогов сборки: {len(analysis.builds)}, "
+                 f"перечитано каталогов: {analysis.rescanned} из {len(analysis.dirs)}"]
+        for name in CATEGORIES:
+            if sizes[name]:
+                lines.append(f"  {name:<8} {format_size(sizes[name]):>12}  "
+                             f"освободится {format_size(freed[name])}")
+        largest = sorted(analysis.builds, key=lambda b: -b.size)[:limit]
+        if largest:
+            lines.append("Крупнейшие:")
+        for build in largest:
+            action = "удаляется" if build.remove_all else f"освободится {format_size(build.freed)}"
+            lines.append(f"  {build.base:<40} {format_size(build.size):>12}  {action}")
+        lines.append(f"Итого освободится: {format_size(self.total)}")
+        return lines
+
+
+def plan_prune(analysis, installed, policy=DEFAULT_POLICY, now=None):
+    """Применить политику ко всем каталогам сборки"""
+    now = now or time.time()
+    for build in analysis.builds:
+        build.remove = []
+        build.remove_all = False
+        select_removals(build, installed, policy, now)
+    return PrunePlan(analysis)
+
+
+def remove_command(list_path, user=None):
+    """Удалить пути из списка (кэш принадлежит пользователю, sudo не нужен).
+
+    user - запись pwd владельца кэша, если программа работает от root
+    (privileged.invoking_user).
+    """
+    return privileged.as_user(["xargs", "-0", "-r", "-a", list_path, "rm", "-rf", "--"], user)